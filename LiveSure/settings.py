@@ -57,6 +57,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'doctor.middleware.MetricsMiddleware',
+    'doctor.middleware.CompressionMiddleware',
+    'doctor.middleware.QueryInstrumentationMiddleware',
+    'doctor.middleware.ProfilingMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -67,7 +71,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-
+# Per-request SQL instrumentation (query count, DB time, N+1 detection); off unless enabled.
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'False') == 'True'
+QUERY_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', '5'))
+# On-demand request profiling for staff tokens from `manage.py profile_token`; off unless a directory is set.
+PROFILING_DIR = os.getenv('PROFILING_DIR', '')
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', '3600'))
+# Per-view Prometheus metrics at /api/doctor/metrics/; METRICS_MULTIPROCESS_DIR aggregates across workers.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
 
 ROOT_URLCONF = 'LiveSure.urls'
 
@@ -96,7 +110,7 @@ CORS_ALLOWED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'doctor.authentication.DoctorJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -107,6 +121,11 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Rows fetched per database round trip by the streaming export endpoints.
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+# Size of the pieces sync streaming bodies are sent in under ASGI.
+STREAMING_CHUNK_BYTES = int(os.getenv('STREAMING_CHUNK_BYTES', str(64 * 1024)))
+
 WSGI_APPLICATION = 'LiveSure.wsgi.application'
 
 
@@ -124,10 +143,110 @@ DATABASES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 'local' (MEDIA_ROOT) or 's3' (an S3-compatible bucket; MEDIA_S3_ENDPOINT_URL for e.g. MinIO).
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'local')
+MEDIA_S3_BUCKET = os.getenv('MEDIA_S3_BUCKET', 'livesure-media')
+MEDIA_S3_ENDPOINT_URL = os.getenv('MEDIA_S3_ENDPOINT_URL') or None
+MEDIA_S3_REGION = os.getenv('MEDIA_S3_REGION') or None
+# Lifetime in seconds of presigned download URLs.
+MEDIA_URL_EXPIRY = int(os.getenv('MEDIA_URL_EXPIRY', '300'))
+# Image size and JPEG quality used by `manage.py process_uploads`.
+MEDIA_IMAGE_MAX_DIMENSION = int(os.getenv('MEDIA_IMAGE_MAX_DIMENSION', '2000'))
+MEDIA_IMAGE_QUALITY = int(os.getenv('MEDIA_IMAGE_QUALITY', '80'))
+# Files left processing this long by a worker that died are claimed again.
+MEDIA_PROCESSING_TIMEOUT_MINUTES = int(os.getenv('MEDIA_PROCESSING_TIMEOUT_MINUTES', '30'))
+# Uploads larger than this are sent to the bucket in parts of the same size.
+MEDIA_S3_MULTIPART_CHUNK_SIZE = int(os.getenv('MEDIA_S3_MULTIPART_CHUNK_SIZE', str(8 * 1024 * 1024)))
+
+# Resumable uploads; idle sessions are purged by `manage.py purge_uploads`.
+UPLOAD_SESSION_DIR = os.getenv('UPLOAD_SESSION_DIR', str(BASE_DIR / 'uploads_tmp'))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv('UPLOAD_CHUNK_MAX_BYTES', str(1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', '24'))
+# New upload sessions per user or client IP, counted per worker.
+UPLOAD_SESSION_RATE = os.getenv('UPLOAD_SESSION_RATE', '30/hour')
+# Anonymous callers get 429 while this many of their sessions are still open.
+UPLOAD_ANONYMOUS_OPEN_MAX = int(os.getenv('UPLOAD_ANONYMOUS_OPEN_MAX', '100'))
+
+# How long a stored Idempotency-Key response is replayed.
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# Response compression; 'br' and 'zstd' need the brotli and zstandard packages.
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_ENCODINGS = ['br', 'zstd', 'gzip']
+COMPRESSION_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_CACHE = 'default'
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv('COMPRESSION_CACHE_MAX_BYTES', str(1024 * 1024)))
+COMPRESSION_CACHE_TIMEOUT = int(os.getenv('COMPRESSION_CACHE_TIMEOUT', '300'))
+
+# Delta sync page size and change log retention.
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+SYNC_LOG_RETENTION_DAYS = int(os.getenv('SYNC_LOG_RETENTION_DAYS', '30'))
+
+# Server-sent event stream timings (seconds) and per-client queue length.
+EVENT_STREAM_POLL_INTERVAL = float(os.getenv('EVENT_STREAM_POLL_INTERVAL', '1.0'))
+EVENT_STREAM_HEARTBEAT_SECONDS = float(os.getenv('EVENT_STREAM_HEARTBEAT_SECONDS', '15'))
+EVENT_STREAM_QUEUE_SIZE = int(os.getenv('EVENT_STREAM_QUEUE_SIZE', '100'))
+EVENT_STREAM_MAX_SECONDS = float(os.getenv('EVENT_STREAM_MAX_SECONDS', '300'))
+EVENT_STREAM_RETRY_MS = int(os.getenv('EVENT_STREAM_RETRY_MS', '2000'))
+
+# Batch endpoint size and worker threads.
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '20'))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '4'))
+
+# Most patients one bulk consent request may name.
+CONSENT_BULK_MAX_PATIENTS = int(os.getenv('CONSENT_BULK_MAX_PATIENTS', '1000'))
+
+# Appointment slots per day, for utilization, and the longest stats range served.
+DOCTOR_DAILY_CAPACITY = int(os.getenv('DOCTOR_DAILY_CAPACITY', '16'))
+DOCTOR_STATS_MAX_DAYS = int(os.getenv('DOCTOR_STATS_MAX_DAYS', '366'))
+
+# Appointments older than this are moved to the archive tables by `manage.py archive_appointments`.
+APPOINTMENT_HOT_DAYS = int(os.getenv('APPOINTMENT_HOT_DAYS', '180'))
+
+# Admin changelists count at most this many matching rows; larger tables show an estimate.
+ADMIN_COUNT_LIMIT = int(os.getenv('ADMIN_COUNT_LIMIT', '10000'))
+
+# Closed months of AccessLog are moved here by `manage.py archive_access_logs`.
+ACCESS_LOG_ARCHIVE_DIR = os.getenv('ACCESS_LOG_ARCHIVE_DIR', str(BASE_DIR / 'archives' / 'access_logs'))
+ACCESS_LOG_HOT_MONTHS = int(os.getenv('ACCESS_LOG_HOT_MONTHS', '3'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'doctor.authentication.DoctorTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'doctor.authentication.DoctorTokenRefreshSerializer',
+}
+
+# TOKEN_REVOCATION_CACHE is shared by all workers and fronts the TokenRevocation table.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'token_revocations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('TOKEN_REVOCATION_CACHE_DIR', str(BASE_DIR / 'cache' / 'token_revocations')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+TOKEN_REVOCATION_CACHE = 'token_revocations'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'doctor': {
+            'handlers': ['console'],
+            'level': os.getenv('DOCTOR_LOG_LEVEL', 'INFO'),
+        },
+    },
 }
 
 
@@ -167,7 +286,35 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+if MEDIA_STORAGE == 's3':
+    from boto3.s3.transfer import TransferConfig
+
+    MEDIA_STORAGE_BACKEND = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': MEDIA_S3_BUCKET,
+            'endpoint_url': MEDIA_S3_ENDPOINT_URL,
+            'region_name': MEDIA_S3_REGION,
+            'access_key': os.getenv('MEDIA_S3_ACCESS_KEY_ID'),
+            'secret_key': os.getenv('MEDIA_S3_SECRET_ACCESS_KEY'),
+            'default_acl': 'private',
+            'file_overwrite': False,
+            'querystring_auth': True,
+            'querystring_expire': MEDIA_URL_EXPIRY,
+            'transfer_config': TransferConfig(
+                multipart_threshold=MEDIA_S3_MULTIPART_CHUNK_SIZE,
+                multipart_chunksize=MEDIA_S3_MULTIPART_CHUNK_SIZE,
+            ),
+        },
+    }
+else:
+    MEDIA_STORAGE_BACKEND = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+
+STORAGES = {
+    'default': MEDIA_STORAGE_BACKEND,
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
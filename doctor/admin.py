@@ -1,5 +1,67 @@
+import uuid
+
+from django.conf import settings
 from django.contrib import admin
-from .models import Doctor, DoctorProfile, Appointment, Consent, PatientHistory, AccessLog, MedicalNote, PrescriptionUpload
+from django.db.models import Q
+from .authentication import revoke_tokens
+from .models import (
+    Doctor, DoctorProfile, Appointment, Consent, PatientHistory, AccessLog, AccessLogArchive, MedicalNote,
+    PrescriptionUpload, MediaVariant, ArchivedAppointment,
+)
+from .pagination import EstimatedCountPaginator
+from .search import fts_available, matching_note_ids
+
+# Most related rows (doctors, users) a search term is resolved to.
+RELATED_SEARCH_LIMIT = 100
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables with millions of rows: estimated counts,
+    and search that matches UUIDs and ids exactly, ``related_search_fields``
+    through ids looked up on the small related table, and
+    ``text_search_fields`` with ``icontains``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    uuid_search_fields = ()
+    id_search_fields = ()
+    related_search_fields = {}
+    text_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            value = uuid.UUID(term)
+        except ValueError:
+            value = None
+        if value is not None and self.uuid_search_fields:
+            return queryset.filter(_any(self.uuid_search_fields, value)), False
+        if term.isdigit() and self.id_search_fields:
+            return queryset.filter(_any(self.id_search_fields, int(term))), False
+        return self.search_text(queryset, term), False
+
+    def search_text(self, queryset, term):
+        if not self.related_search_fields and not self.text_search_fields:
+            return queryset.none()
+        condition = Q()
+        for field, lookup in self.related_search_fields.items():
+            related = queryset.model._meta.get_field(field).related_model
+            ids = related.objects.filter(**{lookup: term}).order_by('pk').values_list('pk', flat=True)
+            condition |= Q(**{f'{field}__in': list(ids[:RELATED_SEARCH_LIMIT])})
+        if self.text_search_fields:
+            words = Q()
+            for word in term.split():
+                words &= _any([f'{field}__icontains' for field in self.text_search_fields], word)
+            condition |= words
+        return queryset.filter(condition)
+
+def _any(lookups, value):
+    condition = Q()
+    for lookup in lookups:
+        condition |= Q(**{lookup: value})
+    return condition
 
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
@@ -7,46 +69,103 @@ class DoctorAdmin(admin.ModelAdmin):
     list_filter = ('status', 'specialty')
     search_fields = ('name', 'email', 'reg_id')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            revoke_tokens(obj.user_id)
+
 @admin.register(DoctorProfile)
 class DoctorProfileAdmin(admin.ModelAdmin):
     list_display = ('doctor', 'bio', 'fees', 'created_at')
     search_fields = ('doctor__name', 'bio')
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(LargeTableAdmin):
     list_display = ('doctor', 'patient_id', 'date', 'time', 'mode', 'status', 'created_at')
     list_filter = ('status', 'mode', 'date')
-    search_fields = ('doctor__name', 'patient_id')
+    list_select_related = ('doctor',)
+    search_fields = ('doctor__name', 'patient_id', 'id')
+    uuid_search_fields = ('patient_id',)
+    id_search_fields = ('id',)
+    related_search_fields = {'doctor': 'name__istartswith'}
+    raw_id_fields = ('doctor',)
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(LargeTableAdmin):
+    list_display = ('doctor', 'patient_id', 'date', 'time', 'status', 'archived_at')
+    list_filter = ('status', 'date')
+    list_select_related = ('doctor',)
+    search_fields = ('doctor__name', 'patient_id', 'id')
+    uuid_search_fields = ('patient_id',)
+    id_search_fields = ('id',)
+    related_search_fields = {'doctor': 'name__istartswith'}
+    raw_id_fields = ('doctor',)
 
 @admin.register(Consent)
-class ConsentAdmin(admin.ModelAdmin):
+class ConsentAdmin(LargeTableAdmin):
     list_display = ('doctor', 'patient_id', 'status', 'created_at', 'updated_at')
     list_filter = ('status',)
-    search_fields = ('doctor__name', 'patient_id')
+    list_select_related = ('doctor',)
+    search_fields = ('doctor__name', 'patient_id', 'id')
+    uuid_search_fields = ('patient_id',)
+    id_search_fields = ('id',)
+    related_search_fields = {'doctor': 'name__istartswith'}
+    raw_id_fields = ('doctor',)
 
 @admin.register(PatientHistory)
-class PatientHistoryAdmin(admin.ModelAdmin):
+class PatientHistoryAdmin(LargeTableAdmin):
     list_display = ('patient_id', 'created_at', 'updated_at')
     search_fields = ('patient_id',)
+    uuid_search_fields = ('patient_id',)
     readonly_fields = ('created_at', 'updated_at')
 
 @admin.register(AccessLog)
-class AccessLogAdmin(admin.ModelAdmin):
+class AccessLogAdmin(LargeTableAdmin):
     list_display = ('user', 'patient_id', 'action', 'accessed_at')
     list_filter = ('action', 'accessed_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'patient_id')
+    uuid_search_fields = ('patient_id',)
+    related_search_fields = {'user': 'username__istartswith'}
     readonly_fields = ('accessed_at',)
 
+@admin.register(AccessLogArchive)
+class AccessLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'path', 'row_count', 'size', 'created_at')
+    readonly_fields = ('period_start', 'period_end', 'path', 'row_count', 'first_log_id', 'last_log_id', 'size', 'sha256', 'created_at')
+
+@admin.register(MediaVariant)
+class MediaVariantAdmin(admin.ModelAdmin):
+    list_display = ('original', 'status', 'original_size', 'size', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('original',)
+    readonly_fields = ('original', 'name', 'status', 'original_size', 'size', 'error', 'created_at', 'processed_at')
+
 @admin.register(MedicalNote)
-class MedicalNoteAdmin(admin.ModelAdmin):
+class MedicalNoteAdmin(LargeTableAdmin):
     list_display = ('appointment', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('appointment__doctor',)
     search_fields = ('appointment__id', 'notes')
+    id_search_fields = ('appointment_id',)
+    text_search_fields = ('notes',)
     readonly_fields = ('created_at',)
+    raw_id_fields = ('appointment',)
+
+    def search_text(self, queryset, term):
+        # Words are looked up in the FTS5 index rather than scanned with LIKE.
+        if not fts_available():
+            return super().search_text(queryset, term)
+        return queryset.filter(id__in=matching_note_ids(term, settings.ADMIN_COUNT_LIMIT))
 
 @admin.register(PrescriptionUpload)
-class PrescriptionUploadAdmin(admin.ModelAdmin):
+class PrescriptionUploadAdmin(LargeTableAdmin):
     list_display = ('doctor', 'patient_id', 'appointment', 'file', 'timestamp')
     list_filter = ('timestamp',)
+    list_select_related = ('doctor', 'appointment__doctor')
     search_fields = ('doctor__name', 'patient_id', 'appointment__id')
-    readonly_fields = ('timestamp',)
\ No newline at end of file
+    uuid_search_fields = ('patient_id',)
+    id_search_fields = ('id', 'appointment_id')
+    related_search_fields = {'doctor': 'name__istartswith'}
+    readonly_fields = ('timestamp',)
+    raw_id_fields = ('doctor', 'appointment')
\ No newline at end of file
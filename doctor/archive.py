@@ -0,0 +1,101 @@
+import heapq
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedMedicalNote, ArchivedPrescription, MedicalNote, PrescriptionUpload,
+)
+from .signals import muted
+
+APPOINTMENT_FIELDS = [
+    'id', 'doctor_id', 'patient_id', 'date', 'time', 'mode', 'status', 'rejection_reason', 'created_at', 'updated_at',
+]
+NOTE_FIELDS = ['id', 'appointment_id', 'notes', 'created_at']
+PRESCRIPTION_FIELDS = ['id', 'doctor_id', 'patient_id', 'appointment_id', 'file', 'timestamp']
+
+
+def horizon(hot_days, today=None):
+    """Appointments dated before this day belong in the archive."""
+    return (today or timezone.localdate()) - timedelta(days=hot_days)
+
+
+@transaction.atomic
+def archive_batch(ids):
+    """
+    Copy the appointments ``ids`` with their notes and prescriptions into
+    the archive tables and delete the hot rows, in one transaction. Ids are
+    kept, so a batch repeated after a crash cannot duplicate anything.
+    """
+    ArchivedAppointment.objects.bulk_create([
+        ArchivedAppointment(**row)
+        for row in Appointment.objects.filter(id__in=ids).values(*APPOINTMENT_FIELDS)
+    ], ignore_conflicts=True)
+    ArchivedMedicalNote.objects.bulk_create([
+        ArchivedMedicalNote(**row)
+        for row in MedicalNote.objects.filter(appointment_id__in=ids).values(*NOTE_FIELDS)
+    ], ignore_conflicts=True, batch_size=1000)
+    ArchivedPrescription.objects.bulk_create([
+        ArchivedPrescription(**row)
+        for row in PrescriptionUpload.objects.filter(appointment_id__in=ids).values(*PRESCRIPTION_FIELDS)
+    ], ignore_conflicts=True)
+    # The rows still exist, so no sync deletes, stats decrements or file tombstones.
+    with muted():
+        PrescriptionUpload.objects.filter(appointment_id__in=ids).delete()
+        MedicalNote.objects.filter(appointment_id__in=ids).delete()
+        Appointment.objects.filter(id__in=ids).delete()
+
+
+def archive_appointments(before, batch_size=500):
+    """
+    Move appointments dated before ``before`` into the archive, oldest id
+    first, committing each batch. Interrupting it loses nothing; the next
+    run carries on with what is left. Yields the size of each batch.
+    """
+    while True:
+        ids = list(
+            Appointment.objects.filter(date__lt=before).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        archive_batch(ids)
+        yield len(ids)
+
+
+def get(hot, cold, **lookups):
+    """
+    The row matching ``lookups`` in the ``hot`` queryset, or else in ``cold``,
+    the same query on the archive table. Raises the archive model's
+    ``DoesNotExist`` when neither has it.
+    """
+    try:
+        return hot.get(**lookups)
+    except hot.model.DoesNotExist:
+        return cold.get(**lookups)
+
+
+def _in_range(model, start, end, columns, filters):
+    queryset = model.objects.filter(**filters)
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    if columns:
+        # The date and time are always loaded; the merge of both tables sorts on them.
+        queryset = queryset.only(*columns, 'date', 'time')
+    return queryset.order_by('date', 'time', 'id')
+
+
+def appointments(start=None, end=None, hot_days=0, columns=None, **filters):
+    """
+    Appointments matching ``filters`` dated in ``[start, end]``, ordered by
+    date and time. Without a date range only the hot table is read; the
+    archive is merged in when the range reaches back past the horizon.
+    ``columns`` limits the columns loaded from both.
+    """
+    hot = _in_range(Appointment, start, end, columns, filters)
+    if (start is None and end is None) or (start is not None and start >= horizon(hot_days)):
+        return list(hot)
+    cold = _in_range(ArchivedAppointment, start, end, columns, filters)
+    return list(heapq.merge(cold, hot, key=lambda row: (row.date, row.time, row.id)))
@@ -0,0 +1,316 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AccessLog, AccessLogArchive, PatientAccessDaily, UserAccessDaily
+
+ARCHIVE_FIELDS = ['id', 'user_id', 'user__username', 'patient_id', 'action', 'accessed_at']
+READ_CHUNK = 1024 * 1024
+
+
+class ArchiveIntegrityError(Exception):
+    """An archive file is missing or does not match its manifest."""
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def archive_dir():
+    return str(settings.ACCESS_LOG_ARCHIVE_DIR)
+
+
+def _serialize(row):
+    return json.dumps({
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'username': row['user__username'],
+        'patient_id': str(row['patient_id']),
+        'action': row['action'],
+        'accessed_at': row['accessed_at'].isoformat(),
+    }, separators=(',', ':'))
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(READ_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def archive_period(period_start, chunk_size=2000):
+    """
+    Move one closed month of access logs into a checksummed, gzipped NDJSON
+    file and its ``AccessLogArchive`` row. The rows are deleted in the same
+    transaction that records the file. Returns the row, or ``None`` when the
+    month has no logs.
+    """
+    period_end = next_month(period_start)
+    rows = AccessLog.objects.filter(accessed_at__gte=period_start, accessed_at__lt=period_end)
+    bounds = rows.order_by('id').values_list('id', flat=True)
+    first_id = bounds.first()
+    if first_id is None:
+        return None
+    last_id = bounds.last()
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    part = AccessLogArchive.objects.filter(period_start=period_start).count() + 1
+    name = f'access_logs-{period_start:%Y-%m}-part{part}.ndjson.gz'
+    path = os.path.join(archive_dir(), name)
+    tmp_path = f'{path}.tmp'
+
+    archived = rows.filter(id__lte=last_id)
+    row_count = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as handle:
+        for row in archived.order_by('id').values(*ARCHIVE_FIELDS).iterator(chunk_size=chunk_size):
+            handle.write(_serialize(row))
+            handle.write('\n')
+            row_count += 1
+
+    linked = False
+    try:
+        with transaction.atomic():
+            manifest = AccessLogArchive.objects.create(
+                period_start=period_start,
+                period_end=period_end,
+                path=name,
+                row_count=row_count,
+                first_log_id=first_id,
+                last_log_id=last_id,
+                size=os.path.getsize(tmp_path),
+                sha256=_file_digest(tmp_path),
+            )
+            archived.delete()
+            # A hard link fails rather than replace a file an earlier run left behind.
+            os.link(tmp_path, path)
+            linked = True
+    except BaseException:
+        if linked:
+            os.remove(path)
+        raise
+    finally:
+        os.remove(tmp_path)
+    return manifest
+
+
+def closed_periods(keep_months, now=None):
+    """Month starts with hot access logs that fall before the retention window."""
+    now = now or timezone.now()
+    cutoff = month_start(now)
+    for _ in range(keep_months):
+        cutoff = month_start(cutoff - timedelta(days=1))
+    oldest = AccessLog.objects.order_by('accessed_at').values_list('accessed_at', flat=True).first()
+    if oldest is None:
+        return []
+    periods = []
+    period = month_start(oldest)
+    while period < cutoff:
+        periods.append(period)
+        period = next_month(period)
+    return periods
+
+
+class _HashingReader:
+    def __init__(self, handle):
+        self.handle = handle
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.handle.read(size)
+        self.digest.update(data)
+        return data
+
+
+def read_archive(manifest):
+    """Yield the rows of one archive file, verifying its checksum as it is read."""
+    try:
+        raw = open(os.path.join(archive_dir(), manifest.path), 'rb')
+    except FileNotFoundError:
+        raise ArchiveIntegrityError(f'Access log archive {manifest.path} is missing from {archive_dir()}.')
+    with raw:
+        reader = _HashingReader(raw)
+        with gzip.open(reader, 'rt', encoding='utf-8') as handle:
+            for line in handle:
+                row = json.loads(line)
+                row['accessed_at'] = parse_datetime(row['accessed_at'])
+                yield row
+        # Drain anything past the gzip trailer so the digest covers the whole file.
+        while reader.read(READ_CHUNK):
+            pass
+    if reader.digest.hexdigest() != manifest.sha256:
+        raise ArchiveIntegrityError(f'Checksum mismatch for access log archive {manifest.path}.')
+
+
+def _matches(row, start, end, patient_id, user_id):
+    if start and row['accessed_at'] < start:
+        return False
+    if end and row['accessed_at'] >= end:
+        return False
+    if patient_id and row['patient_id'] != str(patient_id):
+        return False
+    if user_id and row['user_id'] != user_id:
+        return False
+    return True
+
+
+def access_logs(start=None, end=None, patient_id=None, user_id=None):
+    """
+    Access log entries in ``[start, end)`` from both the archives and the
+    hot table, oldest period first, as dicts with the keys written to archives.
+    """
+    manifests = AccessLogArchive.objects.order_by('period_start', 'first_log_id')
+    if start:
+        manifests = manifests.filter(period_end__gt=start)
+    if end:
+        manifests = manifests.filter(period_start__lt=end)
+    for manifest in manifests:
+        for row in read_archive(manifest):
+            if _matches(row, start, end, patient_id, user_id):
+                yield row
+
+    hot = AccessLog.objects.order_by('accessed_at', 'id')
+    if start:
+        hot = hot.filter(accessed_at__gte=start)
+    if end:
+        hot = hot.filter(accessed_at__lt=end)
+    if patient_id:
+        hot = hot.filter(patient_id=patient_id)
+    if user_id:
+        hot = hot.filter(user_id=user_id)
+    for row in hot.values(*ARCHIVE_FIELDS).iterator(chunk_size=2000):
+        row['username'] = row.pop('user__username')
+        row['patient_id'] = str(row['patient_id'])
+        yield row
+
+
+def _bump(model, **key):
+    if model.objects.filter(**key).update(views=F('views') + 1):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(views=1, **key)
+    except IntegrityError:
+        model.objects.filter(**key).update(views=F('views') + 1)
+
+
+@transaction.atomic
+def record_access(user, patient_id, action='viewed'):
+    """Write an access log entry and fold it into the daily rollups."""
+    log = AccessLog.objects.create(user=user, patient_id=patient_id, action=action)
+    day = timezone.localdate(log.accessed_at)
+    _bump(PatientAccessDaily, patient_id=patient_id, user_id=user.pk, day=day)
+    _bump(UserAccessDaily, user_id=user.pk, day=day)
+    return log
+
+
+def bulk_create_rollups(rows, batch_size=1000):
+    """
+    Create rollup rows for ``(user_id, patient_id, accessed_at)`` triples.
+    Only valid when none of the affected (patient, user, day) keys exist yet,
+    as after ``clear_rollups`` or for freshly seeded users.
+    """
+    per_patient = Counter()
+    per_user = Counter()
+    for user_id, patient_id, accessed_at in rows:
+        day = timezone.localdate(accessed_at)
+        per_patient[(patient_id, user_id, day)] += 1
+        per_user[(user_id, day)] += 1
+    PatientAccessDaily.objects.bulk_create([
+        PatientAccessDaily(patient_id=patient_id, user_id=user_id, day=day, views=views)
+        for (patient_id, user_id, day), views in per_patient.items()
+    ], batch_size=batch_size)
+    UserAccessDaily.objects.bulk_create([
+        UserAccessDaily(user_id=user_id, day=day, views=views)
+        for (user_id, day), views in per_user.items()
+    ], batch_size=batch_size)
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Recompute both rollup tables from every archived and hot access log."""
+    PatientAccessDaily.objects.all().delete()
+    UserAccessDaily.objects.all().delete()
+    bulk_create_rollups(
+        (row['user_id'], row['patient_id'], row['accessed_at']) for row in access_logs()
+    )
+
+
+def patient_report(patient_id, start, end):
+    """Daily view counts and viewers of one patient's history for days in ``[start, end]``."""
+    rollups = PatientAccessDaily.objects.filter(patient_id=patient_id, day__gte=start, day__lte=end)
+    days = [
+        {'day': row['day'], 'views': row['views']}
+        for row in rollups.values('day').annotate(views=Sum('views')).order_by('day')
+    ]
+    viewers = [
+        {
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'views': row['views'],
+            'first_day': row['first_day'],
+            'last_day': row['last_day'],
+        }
+        for row in rollups.values('user_id', 'user__username')
+        .annotate(views=Sum('views'), first_day=Min('day'), last_day=Max('day'))
+        .order_by('-views', 'user_id')
+    ]
+    return {
+        'patient_id': patient_id,
+        'start': start,
+        'end': end,
+        'total_views': sum(day['views'] for day in days),
+        'days': days,
+        'viewers': viewers,
+    }
+
+
+def patient_entries(patient_id, start, end):
+    """
+    Every access to one patient's history for days in ``[start, end]``,
+    oldest first, read from the archive files for months no longer hot.
+    """
+    entries = access_logs(
+        start=timezone.make_aware(datetime.combine(start, time.min)),
+        end=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+        patient_id=patient_id,
+    )
+    return [
+        {key: row[key] for key in ('id', 'user_id', 'username', 'action', 'accessed_at')}
+        for row in entries
+    ]
+
+
+def top_viewers(start, end, limit=10):
+    """Users who viewed the most patient histories for days in ``[start, end]``."""
+    rows = (
+        UserAccessDaily.objects.filter(day__gte=start, day__lte=end)
+        .values('user_id', 'user__username', 'user__doctor__id', 'user__doctor__name')
+        .annotate(views=Sum('views'))
+        .order_by('-views', 'user_id')[:limit]
+    )
+    return [
+        {
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'doctor_id': row['user__doctor__id'],
+            'doctor_name': row['user__doctor__name'],
+            'views': row['views'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,157 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import Doctor, TokenRevocation
+
+PRINCIPAL_CLAIM = 'principal'
+# Issue time with sub-second precision; ``iat`` is whole seconds and cannot order a token against a revocation.
+ISSUED_CLAIM = 'issued'
+REVOCATION_KEY = 'doctor-token-revocation:{}'
+
+
+def principal_claims(user):
+    """Identity and approval state embedded in tokens issued to ``user``."""
+    try:
+        doctor = user.doctor
+    except Doctor.DoesNotExist:
+        doctor = None
+    return {
+        'username': user.username,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'is_active': user.is_active,
+        'doctor_id': doctor.id if doctor else None,
+        'doctor_status': doctor.status if doctor else None,
+        'doctor_name': doctor.name if doctor else None,
+    }
+
+
+def _from_db(model, values):
+    """Build a model instance from known column values; every other field stays deferred."""
+    fields = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, fields, [values[name] for name in fields])
+
+
+def principal_user(user_id, claims):
+    """
+    A ``User`` carrying the token's claims, with ``user.doctor`` already
+    resolved, built without touching the database. Fields not carried in
+    the token are deferred and load on first access.
+    """
+    user = _from_db(User, {
+        'id': user_id,
+        'username': claims['username'],
+        'is_staff': claims['is_staff'],
+        'is_superuser': claims['is_superuser'],
+        'is_active': claims['is_active'],
+    })
+    doctor = None
+    if claims['doctor_id'] is not None:
+        doctor = _from_db(Doctor, {
+            'id': claims['doctor_id'],
+            'user_id': user_id,
+            'name': claims['doctor_name'],
+            'status': claims['doctor_status'],
+        })
+        doctor._state.fields_cache['user'] = user
+    # A cached None makes ``user.doctor`` raise Doctor.DoesNotExist, as a real lookup would.
+    user._state.fields_cache['doctor'] = doctor
+    return user
+
+
+def _revocations():
+    return caches[settings.TOKEN_REVOCATION_CACHE]
+
+
+def _cache_timeout():
+    # Tokens older than an access token lifetime are expired anyway.
+    return int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def revoke_tokens(user_id):
+    """
+    Invalidate every token issued to ``user_id`` until now. Called when a
+    doctor's approval status or the user's active, staff or superuser flag
+    changes, so stale claims stop working at once.
+    """
+    revoked_at = time.time()
+    TokenRevocation.objects.bulk_create(
+        [TokenRevocation(user_id=user_id, revoked_at=revoked_at)],
+        update_conflicts=True, unique_fields=['user_id'], update_fields=['revoked_at'],
+    )
+    _revocations().set(REVOCATION_KEY.format(user_id), revoked_at, timeout=_cache_timeout())
+
+
+def revoked_at(user_id):
+    """
+    When ``user_id``'s tokens were last revoked, ``0`` if never. The cache
+    only saves the query: a miss, evicted or not, reads the database.
+    """
+    key = REVOCATION_KEY.format(user_id)
+    value = _revocations().get(key)
+    if value is None:
+        value = TokenRevocation.objects.filter(user_id=user_id).values_list('revoked_at', flat=True).first() or 0
+        # ``add`` never overwrites a revocation stored while the row was being read.
+        _revocations().add(key, value, timeout=_cache_timeout())
+        value = _revocations().get(key, value)
+    return value
+
+
+def is_revoked(user_id, issued_at):
+    return issued_at <= revoked_at(user_id)
+
+
+class DoctorJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the principal claims in the token instead
+    of loading the user and doctor rows on every request. Tokens issued
+    before the doctor's last status change are rejected.
+    """
+
+    def get_user(self, validated_token):
+        claims = validated_token.get(PRINCIPAL_CLAIM)
+        if claims is None:
+            return super().get_user(validated_token)
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if is_revoked(user_id, validated_token.get(ISSUED_CLAIM, validated_token.get('iat', 0))):
+            raise AuthenticationFailed('Account status changed; please sign in again.', code='token_revoked')
+        if not claims['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return principal_user(user_id, claims)
+
+
+class DoctorTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[PRINCIPAL_CLAIM] = principal_claims(user)
+        token[ISSUED_CLAIM] = time.time()
+        return token
+
+
+class DoctorTokenRefreshSerializer(TokenRefreshSerializer):
+    """Re-reads the principal claims on refresh so new access tokens reflect the current status."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        try:
+            user = User.objects.select_related('doctor').get(pk=access[api_settings.USER_ID_CLAIM])
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        access[PRINCIPAL_CLAIM] = principal_claims(user)
+        access[ISSUED_CLAIM] = time.time()
+        access.set_iat()
+        data['access'] = str(access)
+        return data
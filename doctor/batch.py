@@ -0,0 +1,179 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.http import Http404
+from django.urls import Resolver404, resolve, reverse
+
+METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+# Reads that can run concurrently; any other method is a barrier run on its own, in order.
+CONCURRENT_METHODS = {'GET'}
+UNBATCHABLE = {'batch', 'event-stream', 'doctor-export'}
+# Credentials come from the batch request itself, never from a sub-request.
+IGNORED_HEADERS = {'HTTP_AUTHORIZATION', 'HTTP_COOKIE'}
+RESPONSE_HEADERS = ('Location', 'ETag', 'Last-Modified', 'Retry-After')
+
+_executor = None
+logger = logging.getLogger('doctor.batch')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _api_prefix():
+    return reverse('batch')[:-len('batch/')]
+
+
+def parse(payload):
+    """Validate a batch body and return its sub-requests as dicts with every key filled in."""
+    items = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('Provide a non-empty "requests" list.')
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f'A batch may contain at most {settings.BATCH_MAX_REQUESTS} requests.')
+
+    prefix = _api_prefix()
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchError(f'Request {index} needs a "path".')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in METHODS:
+            raise BatchError(f'Request {index} has unsupported method {method}.')
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f'Request {index} has invalid headers.')
+        url = urlsplit(item['path'])
+        if not url.path.startswith(prefix):
+            raise BatchError(f'Request {index} must target a path under {prefix}.')
+        try:
+            match = resolve('/' + url.path[len(prefix):], urlconf='doctor.urls')
+        except Resolver404:
+            raise BatchError(f'Request {index} path {url.path} was not found.')
+        if match.url_name in UNBATCHABLE or iscoroutinefunction(match.func):
+            raise BatchError(f'Request {index} path {url.path} cannot be batched.')
+        parsed.append({
+            'id': item.get('id', index),
+            'method': method,
+            'path': url.path,
+            'query': url.query,
+            'headers': headers,
+            'body': item.get('body'),
+            'match': match,
+        })
+    return parsed
+
+
+def _sub_request(outer, item, user):
+    body = b'' if item['body'] is None else json.dumps(item['body']).encode()
+    environ = {
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': item['path'],
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': item['query'],
+        'CONTENT_TYPE': 'application/json' if body else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': outer.scheme,
+        'SERVER_NAME': outer.META.get('SERVER_NAME', 'localhost'),
+        'SERVER_PORT': outer.META.get('SERVER_PORT', '80'),
+        'REMOTE_ADDR': outer.META.get('REMOTE_ADDR', ''),
+        'HTTP_HOST': outer.META.get('HTTP_HOST', ''),
+        'HTTP_ACCEPT': 'application/json',
+    }
+    for name, value in item['headers'].items():
+        key = 'HTTP_' + str(name).upper().replace('-', '_')
+        if key not in IGNORED_HEADERS:
+            environ[key] = str(value)
+    request = WSGIRequest(environ)
+    request.resolver_match = item['match']
+    # DRF authenticates a request carrying this as the given user without running the authenticators.
+    request._force_auth_user = user
+    return request
+
+
+def _body(response):
+    data = getattr(response, 'data', None)
+    if data is not None:
+        return data
+    if response.get('Content-Type', '').startswith('application/json') and response.content:
+        return json.loads(response.content)
+    return None
+
+
+def _execute(outer, item, user):
+    match = item['match']
+    request = _sub_request(outer, item, user)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return {'id': item['id'], 'status': 404, 'headers': {}, 'body': {'error': 'Not found.'}}
+    except PermissionDenied:
+        return {'id': item['id'], 'status': 403, 'headers': {}, 'body': {'error': 'Permission denied.'}}
+    if response.streaming:
+        response.close()
+        return {
+            'id': item['id'], 'status': 400, 'headers': {},
+            'body': {'error': 'Streaming responses cannot be batched.'},
+        }
+    if hasattr(response, 'render') and getattr(response, 'data', None) is None:
+        response.render()
+    return {
+        'id': item['id'],
+        'status': response.status_code,
+        'headers': {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)},
+        'body': _body(response),
+    }
+
+
+def _execute_safely(outer, item, user):
+    # One failing sub-request must not lose the results of the others.
+    try:
+        return _execute(outer, item, user)
+    except Exception:
+        logger.exception('Batch sub-request %s %s failed', item['method'], item['path'])
+        return {'id': item['id'], 'status': 500, 'headers': {}, 'body': {'error': 'Internal server error.'}}
+
+
+def _execute_in_thread(outer, item, user):
+    try:
+        return _execute_safely(outer, item, user)
+    finally:
+        close_old_connections()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS, thread_name_prefix='batch')
+    return _executor
+
+
+def run(outer, items, user):
+    """
+    Execute parsed sub-requests as ``user`` and return their results in
+    request order. Consecutive GETs run together on a thread pool; any other
+    method runs alone after what came before it. The views are called
+    directly, so metrics, query instrumentation and profiling see only the batch.
+    """
+    results = []
+    index = 0
+    while index < len(items):
+        group = [items[index]]
+        if items[index]['method'] in CONCURRENT_METHODS:
+            while index + len(group) < len(items) and items[index + len(group)]['method'] in CONCURRENT_METHODS:
+                group.append(items[index + len(group)])
+        if len(group) > 1 and settings.BATCH_MAX_WORKERS > 1:
+            results.extend(_pool().map(lambda item: _execute_in_thread(outer, item, user), group))
+        else:
+            results.extend(_execute_safely(outer, item, user) for item in group)
+        index += len(group)
+    return results
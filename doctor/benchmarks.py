@@ -0,0 +1,397 @@
+import hashlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.core.management import call_command
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import urls as doctor_urls
+from . import compression, uploads
+from .models import Doctor, Appointment, Consent, PatientHistory, PrescriptionUpload, UploadSession
+from .seeding import seed
+
+SIZES = {
+    'small': dict(doctors=5, appointments_per_doctor=20, patients_per_doctor=5, history_entries=20,
+                  access_logs_per_patient=5, prescriptions_per_doctor=5),
+    'medium': dict(doctors=25, appointments_per_doctor=100, patients_per_doctor=20, history_entries=100,
+                   access_logs_per_patient=10, prescriptions_per_doctor=20),
+    'large': dict(doctors=100, appointments_per_doctor=300, patients_per_doctor=50, history_entries=400,
+                  access_logs_per_patient=20, prescriptions_per_doctor=50),
+}
+
+PDF_BYTES = b'%PDF-1.4\n% benchmark upload\n' + b'0' * 2048
+
+
+def _pdf(name):
+    return SimpleUploadedFile(name, PDF_BYTES, content_type='application/pdf')
+
+
+class BenchContext:
+    """Users and rows a benchmark route needs, picked from the seeded data."""
+
+    def __init__(self):
+        self.counter = 0
+        self.admin = User.objects.create_superuser('bench-admin', 'bench-admin@livesure.test', 'bench-password')
+        consent = (
+            Consent.objects.filter(status='granted', doctor__status='approved')
+            .select_related('doctor__user').order_by('id').first()
+        )
+        self.doctor = consent.doctor
+        self.patient_id = consent.patient_id
+        if not PatientHistory.objects.filter(patient_id=self.patient_id).exists():
+            PatientHistory.objects.create(patient_id=self.patient_id)
+        self.appointment = Appointment.objects.filter(doctor=self.doctor).order_by('id').first()
+
+    def unique(self):
+        self.counter += 1
+        return self.counter
+
+    def pending_doctor(self):
+        n = self.unique()
+        user = User.objects.create_user(f'bench-pending-{n}', f'bench-pending-{n}@livesure.test', 'x')
+        return Doctor.objects.create(
+            user=user, name=f'Bench Pending {n}', email=user.email, mobile=f'8{n:09d}',
+            specialty='General Medicine', govt_id='bench/govt_id.pdf',
+            medical_certificate='bench/medical_certificate.pdf', reg_id=f'BENCH-{n}',
+        )
+
+    def pending_consent(self):
+        return Consent.objects.create(doctor=self.doctor, patient_id=uuid.uuid4(), status='pending')
+
+    def appointment_for_update(self):
+        return Appointment.objects.create(
+            doctor=self.doctor, date=timezone.now().date() + timedelta(days=7), time='10:00', status='pending',
+        )
+
+    def prescription(self):
+        return PrescriptionUpload.objects.create(
+            doctor=self.doctor, patient_id=self.appointment.patient_id,
+            appointment=self.appointment, file='bench/prescription.pdf',
+        )
+
+    def upload_session(self, complete=False):
+        session = UploadSession.objects.create(
+            user=self.doctor.user, filename='prescription.pdf', size=len(PDF_BYTES),
+            sha256=hashlib.sha256(PDF_BYTES).hexdigest(),
+        )
+        uploads.start(session)
+        if complete:
+            uploads.write_chunk(session, 0, len(PDF_BYTES), io.BytesIO(PDF_BYTES))
+        return session
+
+
+class Route:
+    """
+    One timed call against a named route. ``prepare`` runs untimed before
+    each call and returns its URL kwargs and request body.
+    """
+
+    def __init__(self, name, method, prepare=None, auth='doctor', format='json', headers=None):
+        self.name = name
+        self.method = method
+        self.prepare = prepare or (lambda ctx: ({}, None))
+        self.auth = auth
+        self.format = format
+        self.headers = headers or {}
+
+    @property
+    def label(self):
+        return f'{self.method} {self.name}'
+
+
+def _onboarding(ctx):
+    n = ctx.unique()
+    return {}, {
+        'username': f'bench-onboard-{n}', 'password': 'bench-password', 'name': f'Bench {n}',
+        'email': f'bench-onboard-{n}@livesure.test', 'mobile': f'7{n:09d}', 'specialty': 'Cardiology',
+        'clinic_address': 'Bench Street', 'govt_id': _pdf('govt_id.pdf'),
+        'medical_certificate': _pdf('certificate.pdf'), 'reg_id': f'BENCH-ONBOARD-{n}',
+    }
+
+
+def _prescription_upload(ctx):
+    return {}, {
+        'appointment': ctx.appointment.id,
+        'patient_id': str(ctx.appointment.patient_id),
+        'file': _pdf('prescription.pdf'),
+    }
+
+
+ROUTES = [
+    Route('api-root', 'GET'),
+    Route('doctor-public-preview-list', 'GET', auth=None),
+    Route('doctor-public-preview', 'GET', lambda ctx: ({'pk': ctx.doctor.id}, None), auth=None),
+    Route('doctor-onboarding', 'POST', _onboarding, auth=None, format='multipart'),
+    Route('doctor-admin-list', 'GET', auth='admin'),
+    Route('doctor-export', 'GET', lambda ctx: ({'resource': 'appointments', 'fmt': 'ndjson'}, None)),
+    Route('sync', 'GET', lambda ctx: ({}, {'since': 0})),
+    Route('batch', 'POST', lambda ctx: ({}, {'requests': [
+        {'path': reverse('doctor-profile')},
+        {'path': reverse('appointment-list'), 'method': 'GET'},
+        {'path': reverse('consent-list')},
+        {'path': reverse('patient-history', kwargs={'patient_id': ctx.patient_id})},
+    ]})),
+    Route('doctor-stats', 'GET'),
+    Route('metrics', 'GET', auth='admin'),
+    Route('audit-patient', 'GET', lambda ctx: ({'patient_id': ctx.patient_id}, None), auth='admin'),
+    Route('audit-patient-logs', 'GET', lambda ctx: ({'patient_id': ctx.patient_id}, None), auth='admin'),
+    Route('audit-top-viewers', 'GET', auth='admin'),
+    Route('doctor-admin', 'PATCH', lambda ctx: ({'pk': ctx.pending_doctor().id}, {'status': 'approved'}), auth='admin'),
+    Route('doctor-profile', 'PUT', lambda ctx: ({}, {'bio': f'Updated bio {ctx.unique()}', 'languages': ['English']})),
+    Route('patient-history', 'GET', lambda ctx: ({'patient_id': ctx.patient_id}, None)),
+    Route('patient-timeline', 'GET', lambda ctx: ({'patient_id': ctx.patient_id}, None)),
+    Route('appointment-list', 'GET'),
+    Route('appointment-list', 'POST', lambda ctx: ({}, {
+        'date': (timezone.now().date() + timedelta(days=3)).isoformat(), 'time': '11:30', 'mode': 'online',
+    })),
+    Route('appointment-detail', 'PUT', lambda ctx: ({'pk': ctx.appointment_for_update().id}, {
+        'date': (timezone.now().date() + timedelta(days=10)).isoformat(),
+    })),
+    Route('appointment-detail', 'PATCH', lambda ctx: ({'pk': ctx.appointment_for_update().id}, {'status': 'no-show'})),
+    Route('appointment-notes', 'GET', lambda ctx: ({'pk': ctx.appointment.id}, None)),
+    Route('appointment-notes', 'POST', lambda ctx: ({'pk': ctx.appointment.id}, {
+        'notes': f'Follow-up note {ctx.unique()}: blood pressure stable, continue medication.',
+    })),
+    Route('medical-note-search', 'GET', lambda ctx: ({}, {'q': 'pressure'})),
+    Route('consent-list', 'GET'),
+    Route('consent-list', 'POST', lambda ctx: ({}, {'patient_id': str(uuid.uuid4())})),
+    Route('consent-bulk', 'POST', lambda ctx: ({}, {
+        'patient_ids': [str(ctx.patient_id)] + [str(uuid.uuid4()) for _ in range(100)],
+    })),
+    Route('consent-detail', 'PUT', lambda ctx: ({'pk': ctx.pending_consent().id}, {'status': 'granted'})),
+    Route('prescription-upload', 'POST', _prescription_upload, format='multipart'),
+    Route('upload-session-list', 'POST', lambda ctx: ({}, {
+        'filename': 'prescription.pdf', 'size': len(PDF_BYTES), 'sha256': hashlib.sha256(PDF_BYTES).hexdigest(),
+    })),
+    Route('upload-session', 'GET', lambda ctx: ({'pk': ctx.upload_session().id}, None)),
+    Route('upload-session', 'PUT', lambda ctx: ({'pk': ctx.upload_session().id}, PDF_BYTES),
+          format='raw', headers={'HTTP_UPLOAD_OFFSET': '0'}),
+    Route('upload-session-complete', 'POST', lambda ctx: ({'pk': ctx.upload_session(complete=True).id}, None)),
+    Route('prescription-detail', 'GET', lambda ctx: ({'pk': ctx.prescription().id}, None)),
+    Route('prescription-download', 'GET', lambda ctx: ({'pk': ctx.prescription().id}, None)),
+    Route('doctor-document', 'GET', lambda ctx: ({'pk': ctx.doctor.id, 'document': 'govt_id'}, None), auth='admin'),
+    Route('prescription-detail', 'DELETE', lambda ctx: ({'pk': ctx.prescription().id}, None)),
+]
+
+
+def route_names(patterns=None):
+    """Every named route reachable from ``doctor/urls.py``."""
+    names = set()
+    for pattern in patterns if patterns is not None else doctor_urls.urlpatterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+# Long-lived streams have no per-request latency to time.
+UNTIMED_ROUTES = {'event-stream'}
+
+
+def uncovered_routes(routes=ROUTES):
+    return sorted(route_names() - UNTIMED_ROUTES - {route.name for route in routes})
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def time_route(route, ctx, iterations, warmup=0):
+    """
+    Call ``route`` ``warmup`` times unrecorded, then ``iterations`` times
+    timed. Warm-up calls absorb one-off work such as the first write of a
+    day's audit rollup rows, so query counts reflect the steady state.
+    """
+    clients = {
+        None: APIClient(),
+        'doctor': APIClient(),
+        'admin': APIClient(),
+    }
+    clients['doctor'].force_authenticate(user=ctx.doctor.user)
+    clients['admin'].force_authenticate(user=ctx.admin)
+    client = clients[route.auth]
+
+    timings = []
+    queries = []
+    statuses = set()
+    for index in range(warmup + iterations):
+        kwargs, data = route.prepare(ctx)
+        url = reverse(route.name, kwargs=kwargs)
+        call = getattr(client, route.method.lower())
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            if route.format == 'raw':
+                response = call(url, data, content_type='application/octet-stream', **route.headers)
+            elif data is not None:
+                response = call(url, data, format=route.format, **route.headers)
+            else:
+                response = call(url, **route.headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if index < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+
+    timings.sort()
+    return {
+        'status': sorted(statuses),
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p90_ms': round(percentile(timings, 90), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(timings[-1], 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': max(queries),
+    }
+
+
+@contextmanager
+def benchmark_environment():
+    """
+    A throwaway test database and media directory, so benchmarks never touch
+    the configured database or MEDIA_ROOT, with the upload session throttle
+    off. Yields a ``reset`` callable that empties the database between data
+    sets.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, UPLOAD_SESSION_DIR=os.path.join(media_root, 'uploads_tmp'),
+                UPLOAD_SESSION_RATE=None):
+            yield lambda: call_command('flush', interactive=False, verbosity=0)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def run_size(size, iterations, seed_value=0, routes=ROUTES, warmup=0):
+    summary = seed(seed=seed_value, **SIZES[size])
+    ctx = BenchContext()
+    return {
+        'data': {key: value for key, value in summary.items() if isinstance(value, int)},
+        'routes': {route.label: time_route(route, ctx, iterations, warmup) for route in routes},
+    }
+
+
+COMPRESSION_PAYLOADS = [
+    Route('patient-history', 'GET', lambda ctx: ({'patient_id': ctx.patient_id}, None)),
+    Route('appointment-list', 'GET'),
+    Route('doctor-public-preview-list', 'GET', auth=None),
+    Route('doctor-export', 'GET', lambda ctx: ({'resource': 'appointments', 'fmt': 'ndjson'}, None)),
+]
+
+
+def uncompressed_bodies(ctx, routes=COMPRESSION_PAYLOADS):
+    """Response bodies of ``routes`` as sent to a client that accepts no compression."""
+    bodies = {}
+    for route in routes:
+        client = APIClient()
+        if route.auth == 'doctor':
+            client.force_authenticate(user=ctx.doctor.user)
+        elif route.auth == 'admin':
+            client.force_authenticate(user=ctx.admin)
+        kwargs, _ = route.prepare(ctx)
+        response = client.get(reverse(route.name, kwargs=kwargs), HTTP_ACCEPT_ENCODING='identity')
+        bodies[route.name] = b''.join(response.streaming_content) if response.streaming else response.content
+    return bodies
+
+
+def time_compression(data, encoding, compresslevel, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        compressed = compression.compress(data, encoding, compresslevel)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p50 = percentile(timings, 50)
+    return {
+        'bytes': len(compressed),
+        'ratio': round(len(data) / len(compressed), 2) if compressed else 0,
+        'saved_bytes': len(data) - len(compressed),
+        'p50_ms': round(p50, 3),
+        'mb_per_s': round(len(data) / 1e6 / (p50 / 1000), 1) if p50 else 0,
+    }
+
+
+def compression_report(bodies, levels, iterations):
+    """
+    CPU time against bytes saved for every body, encoding and level, so the
+    defaults in ``COMPRESSION_LEVELS`` can be picked from measurements.
+    """
+    return {
+        name: {
+            'bytes': len(data),
+            'encodings': {
+                f'{encoding}-{compresslevel}': time_compression(data, encoding, compresslevel, iterations)
+                for encoding, compresslevels in levels.items()
+                for compresslevel in compresslevels
+            },
+        }
+        for name, data in bodies.items()
+    }
+
+
+def report_meta(iterations, seed_value):
+    return {
+        'created_at': timezone.now().isoformat(),
+        'iterations': iterations,
+        'seed': seed_value,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Regressions of ``report`` against ``baseline``: a grown query count, or
+    p50 latency grown by more than ``tolerance`` plus 1 ms.
+    """
+    regressions = []
+    for size, result in report['sizes'].items():
+        base_routes = baseline.get('sizes', {}).get(size, {}).get('routes', {})
+        for label, current in result['routes'].items():
+            base = base_routes.get(label)
+            if base is None:
+                continue
+            if current['queries'] > base['queries']:
+                regressions.append(f"[{size}] {label}: queries {base['queries']} -> {current['queries']}")
+            limit = base['p50_ms'] * (1 + tolerance) + 1
+            if current['p50_ms'] > limit:
+                regressions.append(f"[{size}] {label}: p50 {base['p50_ms']}ms -> {current['p50_ms']}ms")
+    return regressions
+
+
+def load_report(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_report(report, path):
+    with open(path, 'w') as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+        handle.write('\n')
@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/',
+)
+CACHE_KEY = 'doctor-compressed:{}:{}:{}'
+
+
+def available_encodings():
+    """Encodings this process can produce, in server preference order."""
+    installed = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return [name for name in settings.COMPRESSION_ENCODINGS if installed.get(name)]
+
+
+def negotiate(accept_encoding, encodings=None):
+    """
+    Pick the encoding for an ``Accept-Encoding`` header: the highest q-value
+    the client gives among ``encodings``, ties going to server preference.
+    Returns ``None`` when nothing acceptable is available.
+    """
+    encodings = available_encodings() if encodings is None else encodings
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+    best = None
+    for rank, encoding in enumerate(encodings):
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > 0 and (best is None or q > best[0]):
+            best = (q, rank, encoding)
+    return best[2] if best else None
+
+
+def level(encoding):
+    return settings.COMPRESSION_LEVELS[encoding]
+
+
+def compress(data, encoding, compresslevel=None):
+    compresslevel = level(encoding) if compresslevel is None else compresslevel
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=compresslevel, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=compresslevel)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=compresslevel).compress(data)
+    raise ValueError(f'Unsupported encoding {encoding}')
+
+
+def compress_cached(data, encoding):
+    """
+    Compress ``data``, reusing an earlier result for identical bytes. Large
+    repetitive payloads (patient histories, directory listings) are served
+    many times unchanged, so their compressed form is kept in the
+    ``COMPRESSION_CACHE`` cache keyed by content digest.
+    """
+    if len(data) > settings.COMPRESSION_CACHE_MAX_BYTES:
+        return compress(data, encoding)
+    cache = caches[settings.COMPRESSION_CACHE]
+    key = CACHE_KEY.format(encoding, level(encoding), hashlib.sha256(data).hexdigest())
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(data, encoding)
+        cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+    return compressed
+
+
+class _GzipStream:
+    def __init__(self, compresslevel):
+        self.compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, compresslevel):
+        self.compressor = brotli.Compressor(quality=compresslevel)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, compresslevel):
+        self.compressor = zstandard.ZstdCompressor(level=compresslevel).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+STREAMS = {'gzip': _GzipStream, 'br': _BrotliStream, 'zstd': _ZstdStream}
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks incrementally, yielding output as the compressor emits it."""
+    stream = STREAMS[encoding](level(encoding))
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+async def acompress_stream(chunks, encoding):
+    """``compress_stream`` for async content, as served over ASGI."""
+    stream = STREAMS[encoding](level(encoding))
+    async for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+def compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    # Server-sent events must reach the client as they are written, not when a compressor block fills.
+    return content_type.startswith(COMPRESSIBLE_TYPES) and content_type != 'text/event-stream'
@@ -0,0 +1,53 @@
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .models import Consent
+from .notifications import send_consent_requests
+from .sync import record_changes
+
+
+def _insert_pending(consents):
+    """
+    Insert ``consents``, skipping pairs that already exist, and return the
+    ids of the rows these statements created. Rows inserted concurrently
+    by other requests are never among them.
+    """
+    fields = [field for field in Consent._meta.concrete_fields if not field.primary_key]
+    batch_size = max(connection.ops.bulk_batch_size(fields, consents), 1)
+    created_ids = set()
+    for start in range(0, len(consents), batch_size):
+        # bulk_create returns no ids when it ignores conflicts; this is the insert it runs, with RETURNING kept.
+        rows = Consent.objects._insert(
+            consents[start:start + batch_size], fields=fields, returning_fields=[Consent._meta.pk],
+            on_conflict=OnConflict.IGNORE, using=Consent.objects.db,
+        )
+        created_ids.update(row[0] for row in rows if row)
+    return created_ids
+
+
+def request_consents(doctor, patient_ids):
+    """
+    Create pending consent requests from ``doctor`` for every patient in
+    ``patient_ids``, relying on the unique constraint to skip existing ones.
+    Returns ``(created, existing)`` lists of consents.
+    """
+    patient_ids = list(dict.fromkeys(patient_ids))
+    consents = [Consent(doctor=doctor, patient_id=patient_id) for patient_id in patient_ids]
+    returning = connection.features.can_return_rows_from_bulk_insert
+    with transaction.atomic():
+        if returning:
+            created_ids = _insert_pending(consents)
+        else:
+            started = timezone.now()
+            Consent.objects.bulk_create(consents, ignore_conflicts=True)
+        rows = list(Consent.objects.filter(doctor=doctor, patient_id__in=patient_ids).order_by('id'))
+        if not returning:
+            created_ids = {row.id for row in rows if row.created_at >= started}
+        created = [row for row in rows if row.id in created_ids]
+        existing = [row for row in rows if row.id not in created_ids]
+        # These inserts send no post_save, so the sync change log is written here.
+        record_changes(created)
+    if created:
+        transaction.on_commit(lambda: send_consent_requests(doctor, [row.patient_id for row in created]))
+    return created, existing
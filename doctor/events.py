@@ -0,0 +1,176 @@
+import asyncio
+import json
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Appointment, ChangeLog, Consent
+from .serializers import AppointmentSerializer, ConsentSerializer
+from .sync import token_expired
+
+# Change log model label -> (model, serializer); the label doubles as the SSE event name.
+STREAMED = {
+    'appointment': (Appointment, AppointmentSerializer),
+    'consent': (Consent, ConsentSerializer),
+}
+
+Event = namedtuple('Event', 'id doctor_id kind action data')
+
+
+def read_events(after, doctor_id=None, limit=None):
+    """
+    Streamed change log entries after ``after``, oldest first, each with the
+    current state of its row. Rows gone by the time they are read are
+    reported as deleted.
+    """
+    entries = ChangeLog.objects.filter(id__gt=after, model__in=STREAMED).order_by('id')
+    if doctor_id is not None:
+        entries = entries.filter(doctor_id=doctor_id)
+    entries = list(
+        entries.values_list('id', 'doctor_id', 'model', 'object_id', 'action')[:limit or settings.SYNC_PAGE_SIZE]
+    )
+    rows = {}
+    for label, (model, _) in STREAMED.items():
+        ids = {object_id for _, _, kind, object_id, action in entries if kind == label and action == 'upsert'}
+        rows[label] = model.objects.in_bulk(ids) if ids else {}
+
+    events = []
+    for entry_id, owner_id, kind, object_id, action in entries:
+        row = rows[kind].get(object_id)
+        if row is None:
+            events.append(Event(entry_id, owner_id, kind, 'delete', {'id': object_id}))
+        else:
+            events.append(Event(entry_id, owner_id, kind, 'upsert', STREAMED[kind][1](row).data))
+    return events
+
+
+def latest_id():
+    return ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def format_event(event):
+    data = json.dumps({'action': event.action, event.kind: event.data}, cls=DjangoJSONEncoder)
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n'
+
+
+class Subscription:
+    """One open stream: a bounded queue owned by the event loop serving it."""
+
+    def __init__(self, doctor_id):
+        self.doctor_id = doctor_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # A client too slow to keep up is told to resync instead of holding an unbounded backlog.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = None
+        self.queue.put_nowait(event)
+
+
+class Broker:
+    """
+    Per-process fan-out of appointment and consent changes to the event
+    streams open in this worker. One task polls the change log while anyone
+    is subscribed, whatever the number of streams.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._task = None
+
+    def subscribe(self, doctor_id):
+        subscription = Subscription(doctor_id)
+        with self._lock:
+            self._subscribers.setdefault(doctor_id, set()).add(subscription)
+            task = self._task
+            if task is None or task.done() or task.get_loop().is_closed():
+                self._task = subscription.loop.create_task(self._tail())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.doctor_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.doctor_id, None)
+
+    def publish(self, events):
+        with self._lock:
+            targets = [(event, list(self._subscribers.get(event.doctor_id, ()))) for event in events]
+        for event, subscribers in targets:
+            for subscription in subscribers:
+                if not subscription.loop.is_closed():
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    async def _tail(self):
+        position = await sync_to_async(latest_id)()
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._task = None
+                    return
+            events = await sync_to_async(read_events)(position)
+            if events:
+                position = events[-1].id
+                self.publish(events)
+            if len(events) < settings.SYNC_PAGE_SIZE:
+                await asyncio.sleep(settings.EVENT_STREAM_POLL_INTERVAL)
+
+
+broker = Broker()
+
+
+async def event_stream(doctor_id, last_event_id=None):
+    """
+    Server-sent events for one doctor: ``appointment`` and ``consent`` events
+    whose ``id`` is the change log sequence number (the same value as a
+    delta sync token), comment heartbeats, and a ``resync`` event when the
+    client has fallen too far behind and should call the sync endpoint.
+    The stream ends after ``EVENT_STREAM_MAX_SECONDS``; browsers reconnect
+    with ``Last-Event-ID`` and miss nothing.
+    """
+    subscription = broker.subscribe(doctor_id)
+    try:
+        yield f'retry: {settings.EVENT_STREAM_RETRY_MS}\n\n'
+        seen = 0
+        if last_event_id is not None:
+            # Subscribed first, so anything committed while catching up is queued rather than lost.
+            if await sync_to_async(token_expired)(last_event_id):
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            backlog = await sync_to_async(read_events)(last_event_id, doctor_id=doctor_id)
+            if len(backlog) >= settings.SYNC_PAGE_SIZE:
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            for event in backlog:
+                yield format_event(event)
+            seen = backlog[-1].id if backlog else last_event_id
+
+        deadline = time.monotonic() + settings.EVENT_STREAM_MAX_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), min(settings.EVENT_STREAM_HEARTBEAT_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event is None:
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            if event.id > seen:
+                seen = event.id
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
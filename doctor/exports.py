@@ -0,0 +1,86 @@
+import csv
+import heapq
+import json
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Appointment, ArchivedAppointment, ArchivedPrescription, Consent, PrescriptionUpload
+
+EXPORTS = {
+    'appointments': (
+        Appointment,
+        ['id', 'patient_id', 'date', 'time', 'mode', 'status', 'rejection_reason', 'created_at', 'updated_at'],
+    ),
+    'consents': (
+        Consent,
+        ['id', 'patient_id', 'status', 'created_at', 'updated_at'],
+    ),
+    'prescriptions': (
+        PrescriptionUpload,
+        ['id', 'patient_id', 'appointment_id', 'file', 'timestamp'],
+    ),
+}
+
+# Resources whose older rows ``manage.py archive_appointments`` moves to another table, ids unchanged.
+ARCHIVES = {
+    'appointments': ArchivedAppointment,
+    'prescriptions': ArchivedPrescription,
+}
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(resource, doctor, after=None):
+    """
+    Yield one dict per row of a doctor's ``resource`` in primary key order,
+    starting after the ``after`` cursor. Rows are fetched in chunks of
+    ``EXPORT_CHUNK_SIZE``, so memory use does not grow with the row count.
+    Archived rows are merged in by id.
+    """
+    model, fields = EXPORTS[resource]
+    models = [ARCHIVES[resource], model] if resource in ARCHIVES else [model]
+    sources = []
+    for source in models:
+        queryset = source.objects.filter(doctor=doctor).order_by('pk')
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        sources.append(queryset.values(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE))
+    for row in heapq.merge(*sources, key=itemgetter('id')):
+        if 'file' in row:
+            row['file'] = default_storage.url(row['file']) if row['file'] else None
+        yield row
+
+
+def ndjson_stream(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (row[field] for field in fields)
+        ])
+
+
+def export_stream(resource, fmt, doctor, after=None):
+    rows = export_rows(resource, doctor, after)
+    if fmt == 'csv':
+        return csv_stream(rows, EXPORTS[resource][1])
+    return ndjson_stream(rows)
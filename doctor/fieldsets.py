@@ -0,0 +1,74 @@
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def _select(declared, sections, query_params):
+    requested = query_params.get('fields')
+    include = query_params.get('include')
+    if requested is None and include is None:
+        return None
+    available = [name for name, field in declared.items() if not field.write_only]
+    selected = set(available)
+    if requested is not None:
+        selected = _names(requested)
+        unknown = selected - set(available)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}. "
+                             f"Available: {', '.join(available)}.")
+    if include is not None:
+        included = _names(include)
+        unknown = included - sections
+        if unknown:
+            raise ValueError(f"Unknown section(s): {', '.join(sorted(unknown))}. "
+                             f"Available: {', '.join(sorted(sections))}.")
+        selected = (selected - sections) | included
+    return [name for name in available if name in selected]
+
+
+def _columns(meta, declared, names, prefix=''):
+    model = meta.model
+    concrete = {field.name for field in model._meta.concrete_fields}
+    sources = getattr(meta, 'field_sources', {})
+    columns = [model._meta.pk.name] + list(getattr(meta, 'required_columns', []))
+    for name in names:
+        field = declared[name]
+        if field.write_only:
+            continue
+        if name in sources:
+            columns += sources[name]
+        elif isinstance(field, SparseFieldsMixin):
+            columns += _columns(field.Meta, field.fields, field.fields.keys(), prefix=f'{field.source}__')
+            continue
+        elif field.source.split('.')[0] in concrete:
+            columns.append(field.source.split('.')[0])
+    return [f'{prefix}{column}' for column in dict.fromkeys(columns)]
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for ``?fields=`` and ``?include=``. ``Meta.sections``
+    lists the heavy fields only ``?include=`` picks, and ``Meta.field_sources``
+    the columns computed fields read.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def fieldset(cls, query_params):
+        """
+        Resolve ``?fields=`` and ``?include=`` against one instance of the
+        serializer. Returns ``(fields, columns, related)``: the field names
+        (``None`` when neither is given), the ``.only()`` arguments rendering
+        them reads (``None`` for all) and the nested serializers among them as
+        ``select_related`` arguments. Raises ``ValueError`` for unknown names.
+        """
+        declared = cls().fields
+        fields = _select(declared, set(getattr(cls.Meta, 'sections', [])), query_params)
+        names = declared.keys() if fields is None else fields
+        related = [declared[name].source for name in names if isinstance(declared[name], SparseFieldsMixin)]
+        columns = None if fields is None else _columns(cls.Meta, declared, fields)
+        return fields, columns, related
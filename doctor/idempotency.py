@@ -0,0 +1,139 @@
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+# Conflicts and throttling are transient, so a retry with the same key should run again.
+UNSTORED_STATUSES = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+class IdempotentResponse(Exception):
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def _error(message, status_code):
+    return HttpResponse(JSONRenderer().render({'error': message}), status=status_code, content_type='application/json')
+
+
+def fingerprint(request):
+    """
+    Hash of the method, target, media type, length and body of ``request``.
+    Multipart bodies are left out: their boundary differs between retries of
+    the same upload, and reading them here would parse the files early.
+    """
+    content_type = request.META.get('CONTENT_TYPE', '').split(';')[0].strip().lower()
+    digest = hashlib.sha256(f'{request.method} {request.get_full_path()} {content_type} '
+                            f"{request.META.get('CONTENT_LENGTH') or 0} ".encode())
+    if not content_type.startswith('multipart/'):
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def anonymous_key_valid(key):
+    """Anonymous callers share a scope, so their keys must be random UUIDs no other client can guess or reuse."""
+    try:
+        return uuid.UUID(key).version == 4
+    except ValueError:
+        return False
+
+
+def claim(request, key):
+    """
+    Reserve ``key`` for this request, or return the response a retry should
+    get: the stored result, 409 while the first attempt is still running,
+    or 422 when the key was used for a different request.
+    """
+    scope = f'user:{request.user.pk}' if request.user.is_authenticated else 'anonymous'
+    now = timezone.now()
+    IdempotencyRecord.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint(request),
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+            ), None
+    except IntegrityError:
+        pass
+    record = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+    if record is None:
+        return None, _error('Idempotency key was released; retry the request.', status.HTTP_409_CONFLICT)
+    if record.fingerprint != fingerprint(request):
+        return None, _error('Idempotency key was already used for a different request.',
+                            status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return None, _error('A request with this idempotency key is still in progress.', status.HTTP_409_CONFLICT)
+    response = HttpResponse(bytes(record.response or b''), status=record.status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return None, response
+
+
+def store(record, response):
+    """Keep the outcome of a claimed request, or release the key when a retry should run it again."""
+    if response.status_code >= 500 or response.status_code in UNSTORED_STATUSES:
+        IdempotencyRecord.objects.filter(id=record.id).delete()
+        return
+    content = response.rendered_content if hasattr(response, 'rendered_content') else response.content
+    IdempotencyRecord.objects.filter(id=record.id).update(status_code=response.status_code, response=content)
+
+
+class IdempotencyMixin:
+    """
+    Honour an ``Idempotency-Key`` header on POST requests to an API view.
+    The key is claimed after authentication but before the body is parsed.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = None
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key:
+            return
+        if len(key) > 255:
+            raise IdempotentResponse(_error('Idempotency-Key must be at most 255 characters.',
+                                            status.HTTP_400_BAD_REQUEST))
+        if not request.user.is_authenticated and not anonymous_key_valid(key):
+            raise IdempotentResponse(_error('Unauthenticated requests need a random (version 4) UUID as '
+                                            'Idempotency-Key.', status.HTTP_400_BAD_REQUEST))
+        self.idempotency_record, replay = claim(request, key)
+        if replay is not None:
+            raise IdempotentResponse(replay)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, IdempotentResponse):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # An unhandled error never reaches finalize_response; free the key for the retry.
+            record = getattr(self, 'idempotency_record', None)
+            if record is not None:
+                IdempotencyRecord.objects.filter(id=record.id).delete()
+                self.idempotency_record = None
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, 'idempotency_record', None)
+        if record is not None:
+            self.idempotency_record = None
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            store(record, response)
+        return response
+
+
+def purge(now=None):
+    """Delete expired records; returns how many were removed."""
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,105 @@
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+NUMBER_RE = re.compile(r'(?<![\w"])\d+(?![\w"])')
+
+
+def sql_template(sql):
+    """
+    Reduce a SQL statement to its shape so that calls differing only in
+    parameters (including the length of ``IN`` lists) group together.
+    """
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return sql.replace('%s', '?')
+
+
+class QueryRecord:
+    __slots__ = ('alias', 'sql', 'params', 'many', 'started', 'duration')
+
+    def __init__(self, alias, sql, params, many, started, duration):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.started = started
+        self.duration = duration
+
+    @property
+    def template(self):
+        return sql_template(self.sql)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that records every statement run while it is
+    installed, with its parameters and wall-clock duration.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.origin = time.perf_counter()
+
+    def _wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append(QueryRecord(
+                    alias, sql, params, many, started - self.origin, time.perf_counter() - started
+                ))
+        return wrapper
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self._wrapper(connection.alias)))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(query.duration for query in self.queries)
+
+    def by_template(self):
+        groups = defaultdict(list)
+        for query in self.queries:
+            groups[query.template].append(query)
+        return groups
+
+    def duplicates(self):
+        """Templates run more than once, most frequent first."""
+        return sorted(
+            (
+                {
+                    'template': template,
+                    'count': len(queries),
+                    'distinct_params': len({repr(query.params) for query in queries}),
+                    'time_ms': round(sum(query.duration for query in queries) * 1000, 3),
+                }
+                for template, queries in self.by_template().items()
+                if len(queries) > 1
+            ),
+            key=lambda item: item['count'],
+            reverse=True,
+        )
+
+    def n_plus_one(self, threshold):
+        """
+        Templates run more than ``threshold`` times with differing parameters,
+        the signature of a per-row lookup inside a loop.
+        """
+        return [
+            item for item in self.duplicates()
+            if item['count'] > threshold and item['distinct_params'] > 1
+        ]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doctor.audit import archive_period, closed_periods
+
+
+class Command(BaseCommand):
+    help = (
+        'Move access logs of closed months out of the hot table into gzipped NDJSON archives '
+        'recorded in a checksummed manifest (AccessLogArchive).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=settings.ACCESS_LOG_HOT_MONTHS,
+            help='Complete months to keep in the hot table besides the current one.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        periods = closed_periods(options['keep_months'])
+        if not periods:
+            self.stdout.write('No closed periods to archive.')
+            return
+        for period in periods:
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {period:%Y-%m}.')
+                continue
+            manifest = archive_period(period, chunk_size=options['chunk_size'])
+            if manifest is None:
+                continue
+            self.stdout.write(
+                f'Archived {manifest.row_count} logs for {period:%Y-%m} to {manifest.path} '
+                f'({manifest.size} bytes, sha256 {manifest.sha256[:12]}).'
+            )
+        self.stdout.write(self.style.SUCCESS('Access log archival complete.'))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doctor.archive import archive_appointments, horizon
+from doctor.models import Appointment
+
+
+class Command(BaseCommand):
+    help = (
+        'Move appointments older than the hot horizon, with their medical notes and prescriptions, '
+        'into the archive tables. Each batch commits on its own, so an interrupted run can simply be repeated.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hot-days', type=int, default=settings.APPOINTMENT_HOT_DAYS,
+            help='Keep appointments dated within this many days before today in the hot table.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        before = horizon(options['hot_days'])
+        if options['dry_run']:
+            count = Appointment.objects.filter(date__lt=before).count()
+            self.stdout.write(f'Would archive {count} appointments dated before {before}.')
+            return
+        total = 0
+        for moved in archive_appointments(before, batch_size=options['batch_size']):
+            total += moved
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{total} appointments archived...')
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} appointments dated before {before}.'))
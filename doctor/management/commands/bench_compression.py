@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor import benchmarks, compression
+from doctor.seeding import seed
+
+DEFAULT_LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 6, 11], 'zstd': [1, 3, 9, 19]}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure compression time against bytes saved for typical large responses (patient '
+        'history, unpaginated lists, exports) at several encodings and levels, on seeded data '
+        'in a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='medium', choices=list(benchmarks.SIZES))
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report as JSON to this path.')
+
+    def handle(self, *args, **options):
+        available = set(compression.available_encodings()) | {'gzip'}
+        levels = {encoding: values for encoding, values in DEFAULT_LEVELS.items() if encoding in available}
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        with benchmarks.benchmark_environment():
+            seed(seed=options['seed'], **benchmarks.SIZES[options['size']])
+            bodies = benchmarks.uncompressed_bodies(benchmarks.BenchContext())
+        report = benchmarks.compression_report(bodies, levels, options['iterations'])
+
+        for name, result in report.items():
+            self.stdout.write(f"{name} ({result['bytes']} bytes)")
+            for label, row in result['encodings'].items():
+                self.stdout.write(
+                    f"  {label:<8} {row['bytes']:>10} bytes  ratio {row['ratio']:>6.2f}  "
+                    f"p50 {row['p50_ms']:>8.3f}ms  {row['mb_per_s']:>7.1f} MB/s"
+                )
+        if options['output']:
+            benchmarks.write_report({
+                'meta': benchmarks.report_meta(options['iterations'], options['seed']),
+                'size': options['size'],
+                'payloads': report,
+            }, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
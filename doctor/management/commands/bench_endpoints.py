@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every route in doctor/urls.py against seeded data sets of several sizes and '
+        'record latency percentiles and query counts as a JSON baseline. Runs in a throwaway '
+        'test database, so the configured database is never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Comma separated, from: {', '.join(benchmarks.SIZES)}.")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=0, help='Untimed calls per route before the timed ones.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench_baseline.json')
+        parser.add_argument('--compare', help='Baseline JSON to check this run against.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 growth as a fraction.')
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in benchmarks.SIZES]
+        if unknown:
+            raise CommandError(f"Unknown size(s): {', '.join(unknown)}")
+
+        for name in benchmarks.uncovered_routes():
+            self.stderr.write(self.style.WARNING(f'Route {name} has no benchmark.'))
+
+        report = {'meta': benchmarks.report_meta(options['iterations'], options['seed']), 'sizes': {}}
+        with benchmarks.benchmark_environment() as reset:
+            for size in sizes:
+                reset()
+                self.stdout.write(f'Benchmarking {size}...')
+                report['sizes'][size] = benchmarks.run_size(
+                    size, options['iterations'], options['seed'], warmup=options['warmup'],
+                )
+                for label, result in report['sizes'][size]['routes'].items():
+                    self.stdout.write(
+                        f"  {label:<40} p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                        f"queries {result['queries']:>4}  status {result['status']}"
+                    )
+
+        benchmarks.write_report(report, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['output']}."))
+
+        if options['compare']:
+            regressions = benchmarks.compare(report, benchmarks.load_report(options['compare']), options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
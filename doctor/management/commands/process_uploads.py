@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from doctor.models import MediaVariant
+from doctor.normalization import claim_pending, process_variant, queue_variants
+from doctor.storage import FILE_REFERENCES
+
+
+class Command(BaseCommand):
+    help = (
+        'Build optimized variants of uploaded documents: images are stripped of metadata, '
+        'scaled down and recompressed, PDFs are rewritten compactly. Originals are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--backfill', action='store_true', help='Queue every stored upload that has no variant row yet.')
+        parser.add_argument('--retry-failed', action='store_true', help='Queue failed files again.')
+        parser.add_argument('--watch', action='store_true', help='Keep polling for new uploads instead of exiting.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --watch.')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            for model, field in FILE_REFERENCES:
+                if model is MediaVariant:
+                    continue
+                names = model.objects.exclude(**{field: ''}).values_list(field, flat=True).iterator(chunk_size=2000)
+                queue_variants(names)
+        if options['retry_failed']:
+            MediaVariant.objects.filter(status='failed').update(status='pending', error='')
+
+        totals = {'done': 0, 'skipped': 0, 'failed': 0}
+        while True:
+            batch = claim_pending(options['batch_size'])
+            for variant in batch:
+                result = process_variant(variant)
+                totals[result] += 1
+                if result == 'failed':
+                    self.stdout.write(self.style.WARNING(f'Failed to optimize {variant.original}'))
+            if not batch:
+                if not options['watch']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed uploads: {totals['done']} optimized, {totals['skipped']} skipped, {totals['failed']} failed."
+        ))
@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'Issue a signed token that enables profiling of the staff user\'s own requests (X-Profile-Token header).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Staff user the token is issued to.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} not found.")
+        if not user.is_staff:
+            raise CommandError('Profiling tokens can only be issued to staff users.')
+        self.stdout.write(make_token(user))
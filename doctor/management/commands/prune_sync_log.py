@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doctor.sync import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete delta-sync change log entries older than the retention window. Clients holding older tokens must resync.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_LOG_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Pruned {prune(options['days'])} change log entries."))
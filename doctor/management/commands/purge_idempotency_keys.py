@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from doctor.idempotency import purge
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Purged {purge()} idempotency records.'))
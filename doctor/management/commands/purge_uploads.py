@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doctor.uploads import purge
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned and consumed resumable upload sessions along with their temporary files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-hours', type=float, default=settings.UPLOAD_SESSION_TTL_HOURS,
+            help='Sessions idle for longer than this are abandoned.',
+        )
+
+    def handle(self, *args, **options):
+        count = purge(timedelta(hours=options['max_age_hours']))
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} upload sessions.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor.audit import ArchiveIntegrityError, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily access rollups from all archived and hot access logs.'
+
+    def handle(self, *args, **options):
+        try:
+            rebuild_rollups()
+        except ArchiveIntegrityError as exc:
+            raise CommandError(f'{exc} Rollups were left unchanged.')
+        self.stdout.write(self.style.SUCCESS('Access rollups rebuilt.'))
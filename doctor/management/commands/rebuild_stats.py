@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from doctor.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-doctor and daily statistics from all appointments and prescriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Doctors recomputed per transaction.')
+
+    def handle(self, *args, **options):
+        total = 0
+        for count in rebuild(batch_size=options['batch_size']):
+            total += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{total} doctors rebuilt...')
+        self.stdout.write(self.style.SUCCESS(f'Statistics rebuilt for {total} doctors.'))
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from doctor.storage import MEDIA_PREFIXES, process_tombstones, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete files queued by row deletes, then diff the media tree against the file references '
+        'in the database and remove orphaned files and report missing ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Leave orphaned files younger than this alone; their rows may not have committed yet.',
+        )
+        parser.add_argument('--prefix', action='append', choices=MEDIA_PREFIXES, dest='prefixes')
+        parser.add_argument('--tombstones-only', action='store_true', help='Only drain the delete queue.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        deleted, kept, failed = process_tombstones(batch_size=options['batch_size'], dry_run=dry_run)
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(f'{verb} {deleted} queued files; {kept} still referenced, {failed} failed.')
+        if options['tombstones_only']:
+            return
+
+        totals = {'orphan': 0, 'missing': 0}
+        batches = reconcile(
+            grace=timedelta(hours=options['grace_hours']),
+            batch_size=options['batch_size'],
+            dry_run=dry_run,
+            prefixes=options['prefixes'],
+        )
+        for kind, names in batches:
+            totals[kind] += len(names)
+            for name in names:
+                if kind == 'orphan':
+                    self.stdout.write(f'{verb} orphan {name}')
+                else:
+                    self.stdout.write(self.style.WARNING(f'Missing file {name}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciliation complete: {totals['orphan']} orphaned, {totals['missing']} missing."
+        ))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor.seeding import SEED_USERNAME_PREFIX, clear_seed_data, seed
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic data set (doctors, appointments, histories, logs, files).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=10)
+        parser.add_argument('--appointments', type=int, default=20, help='Appointments per doctor.')
+        parser.add_argument('--patients', type=int, default=10, help='Patients (with consent and history) per doctor.')
+        parser.add_argument('--history-entries', type=int, default=50, help='Entries per PatientHistory section.')
+        parser.add_argument('--access-logs', type=int, default=5, help='Access log rows per patient.')
+        parser.add_argument('--prescriptions', type=int, default=5, help='Prescription uploads per doctor.')
+        parser.add_argument('--notes', type=int, default=1, help='Medical notes per appointment.')
+        parser.add_argument('--file-kb', type=int, default=4, help='Size of generated files; 0 skips writing files.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--flush', action='store_true', help='Remove previously seeded data first.')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            clear_seed_data()
+        elif User.objects.filter(username__startswith=f"{SEED_USERNAME_PREFIX}{options['seed']}-").exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists; pass --flush to replace it.")
+        summary = seed(
+            doctors=options['doctors'],
+            appointments_per_doctor=options['appointments'],
+            patients_per_doctor=options['patients'],
+            history_entries=options['history_entries'],
+            access_logs_per_patient=options['access_logs'],
+            prescriptions_per_doctor=options['prescriptions'],
+            notes_per_appointment=options['notes'],
+            file_size_kb=options['file_kb'],
+            seed=options['seed'],
+        )
+        for key in ['doctors', 'approved_doctors', 'patients', 'appointments', 'consents',
+                    'histories', 'access_logs', 'medical_notes', 'prescriptions']:
+            self.stdout.write(f'{key}: {summary[key]}')
+        self.stdout.write(self.style.SUCCESS('Seed data created.'))
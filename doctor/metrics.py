@@ -0,0 +1,201 @@
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+class Shard:
+    """Counters written by exactly one thread, so updates need no lock."""
+
+    def __init__(self):
+        self.requests = {}
+        self.latency = {}
+        self.db = {}
+
+    def observe(self, view, method, status, duration, db_time, db_queries):
+        key = (view, method, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+        histogram = self.latency.get((view, method))
+        if histogram is None:
+            histogram = self.latency[(view, method)] = [[0] * len(LATENCY_BUCKETS), 0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += duration
+
+        db = self.db.get((view, method))
+        if db is None:
+            db = self.db[(view, method)] = [0.0, 0]
+        db[0] += db_time
+        db[1] += db_queries
+
+
+def empty_snapshot():
+    return {'requests': {}, 'latency': {}, 'db': {}}
+
+
+def merge_into(target, snapshot):
+    """Add a snapshot (keys joined with ``|``) into ``target`` in place."""
+    for key, value in snapshot['requests'].items():
+        target['requests'][key] = target['requests'].get(key, 0) + value
+    for key, (buckets, total) in snapshot['latency'].items():
+        current = target['latency'].setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0])
+        current[0] = [a + b for a, b in zip(current[0], buckets)]
+        current[1] += total
+    for key, (seconds, queries) in snapshot['db'].items():
+        current = target['db'].setdefault(key, [0.0, 0])
+        current[0] += seconds
+        current[1] += queries
+    return target
+
+
+class Registry:
+    """
+    Per-process metrics registry, sharded per thread. With a ``directory``
+    every process writes its totals to ``metrics-<pid>-<token>.json`` there
+    and ``collect`` adds up all the files.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._shards = []
+        self._last_flush = 0.0
+        self._path = None
+        if directory:
+            self._path = os.path.join(directory, f'metrics-{os.getpid()}-{uuid.uuid4().hex}.json')
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            self._shards.append(shard)
+        return shard
+
+    def observe(self, view, method, status, duration, db_time=0.0, db_queries=0):
+        self.shard().observe(view, method, status, duration, db_time, db_queries)
+        if self.directory:
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._last_flush = now
+                self.flush()
+
+    def snapshot(self):
+        snapshot = empty_snapshot()
+        for shard in list(self._shards):
+            merge_into(snapshot, {
+                'requests': {'|'.join(key): value for key, value in list(shard.requests.items())},
+                'latency': {'|'.join(key): value for key, value in list(shard.latency.items())},
+                'db': {'|'.join(key): value for key, value in list(shard.db.items())},
+            })
+        return snapshot
+
+    def flush(self):
+        tmp_path = f'{self._path}.tmp'
+        with open(tmp_path, 'w') as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(tmp_path, self._path)
+
+    def collect(self):
+        if not self.directory:
+            return self.snapshot()
+        total = self.snapshot()
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == self._path:
+                continue
+            try:
+                with open(path) as handle:
+                    merge_into(total, json.load(handle))
+            except (OSError, ValueError):
+                continue
+        return total
+
+
+def clear_directory(directory):
+    """
+    Remove the files left in a multiprocess ``directory`` by an earlier run.
+    Call it once per server start, before any worker records.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json*')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+
+
+def render_prometheus(snapshot, prefix='livesure'):
+    """Render a snapshot in the Prometheus text exposition format (0.0.4)."""
+    lines = [
+        f'# HELP {prefix}_http_requests_total Requests handled, by resolved view, method and status.',
+        f'# TYPE {prefix}_http_requests_total counter',
+    ]
+    for key in sorted(snapshot['requests']):
+        view, method, status = key.split('|')
+        lines.append(f"{prefix}_http_requests_total{{{_labels(view=view, method=method, status=status)}}} "
+                     f"{snapshot['requests'][key]}")
+
+    lines += [
+        f'# HELP {prefix}_http_request_duration_seconds Request latency, by resolved view and method.',
+        f'# TYPE {prefix}_http_request_duration_seconds histogram',
+    ]
+    for key in sorted(snapshot['latency']):
+        view, method = key.split('|')
+        buckets, total = snapshot['latency'][key]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, buckets):
+            cumulative += count
+            le = '+Inf' if bound == math.inf else repr(bound)
+            lines.append(f'{prefix}_http_request_duration_seconds_bucket{{{_labels(view=view, method=method, le=le)}}} '
+                         f'{cumulative}')
+        lines.append(f'{prefix}_http_request_duration_seconds_sum{{{_labels(view=view, method=method)}}} {total}')
+        lines.append(f'{prefix}_http_request_duration_seconds_count{{{_labels(view=view, method=method)}}} {cumulative}')
+
+    lines += [
+        f'# HELP {prefix}_db_seconds_total Time spent in database queries, by resolved view and method.',
+        f'# TYPE {prefix}_db_seconds_total counter',
+    ]
+    for key in sorted(snapshot['db']):
+        view, method = key.split('|')
+        lines.append(f"{prefix}_db_seconds_total{{{_labels(view=view, method=method)}}} {snapshot['db'][key][0]}")
+    lines += [
+        f'# HELP {prefix}_db_queries_total Database queries issued, by resolved view and method.',
+        f'# TYPE {prefix}_db_queries_total counter',
+    ]
+    for key in sorted(snapshot['db']):
+        view, method = key.split('|')
+        lines.append(f"{prefix}_db_queries_total{{{_labels(view=view, method=method)}}} {snapshot['db'][key][1]}")
+    return '\n'.join(lines) + '\n'
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        from django.conf import settings
+        _registry = Registry(
+            directory=getattr(settings, 'METRICS_MULTIPROCESS_DIR', None) or None,
+            flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0),
+        )
+    return _registry
@@ -0,0 +1,201 @@
+import json
+import logging
+import threading
+import time
+
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics, profiling
+from .instrumentation import QueryRecorder
+
+query_logger = logging.getLogger('doctor.queries')
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Opt-in per-request SQL instrumentation: query count and database time in
+    a ``Server-Timing`` header and a ``doctor.queries`` log line, with a
+    warning for N+1 query shapes. Batch sub-requests on worker threads and
+    queries run while a streaming body is sent are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        db_ms = recorder.total_time * 1000
+        n_plus_one = recorder.n_plus_one(self.threshold)
+        timing = [
+            f'db;dur={db_ms:.2f};desc="{recorder.count} queries"',
+            f'app;dur={duration * 1000:.2f}',
+        ]
+        if n_plus_one:
+            timing.append(f'n1;desc="{len(n_plus_one)} repeated query shapes"')
+        response['Server-Timing'] = ', '.join(
+            filter(None, [response.get('Server-Timing')] + timing)
+        )
+
+        record = {
+            'event': 'request_queries',
+            'method': request.method,
+            'path': request.path,
+            'view': view_name(request),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'queries': recorder.count,
+            'db_ms': round(db_ms, 3),
+            'duplicates': recorder.duplicates(),
+        }
+        if n_plus_one:
+            record['n_plus_one'] = n_plus_one
+            query_logger.warning(json.dumps(record))
+        else:
+            query_logger.info(json.dumps(record))
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Sample one request when it carries an ``X-Profile-Token`` from
+    ``manage.py profile_token`` and is authenticated as that staff user.
+    Stacks and the SQL timeline go to ``PROFILING_DIR``.
+    """
+
+    def __init__(self, get_response):
+        self.directory = getattr(settings, 'PROFILING_DIR', None)
+        if not self.directory:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.interval = getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000
+        self.max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+
+    def __call__(self, request):
+        user = profiling.profiling_user(request, self.max_age)
+        if user is None:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with profiling.StackSampler(threading.get_ident(), self.interval) as sampler, recorder.record():
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        basename = profiling.profile_basename(request)
+        profiling.write_profile(self.directory, basename, sampler, recorder, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view_name(request),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'profiled_by': user.username,
+        })
+        response['X-Profile-Id'] = basename
+        return response
+
+
+class _QueryTimer:
+    __slots__ = ('seconds', 'count')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, status codes, latency and database time per
+    resolved view name into the process metrics registry, served in
+    Prometheus format by ``MetricsView``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.registry = metrics.get_registry()
+
+    def __call__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        self.registry.observe(
+            view_name(request) or metrics.UNRESOLVED_VIEW,
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            timer.seconds,
+            timer.count,
+        )
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least ``COMPRESSION_MIN_BYTES`` with the best
+    encoding the client accepts, in ``COMPRESSION_ENCODINGS`` order.
+    Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding') or not compression.compressible(response):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compress = compression.acompress_stream if response.is_async else compression.compress_stream
+            response.streaming_content = compress(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            compressed = compression.compress_cached(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
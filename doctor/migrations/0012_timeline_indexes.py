@@ -0,0 +1,25 @@
+# Generated by Django 4.2.21 on 2026-10-18 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0011_useraccessdaily_patientaccessdaily'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'patient_id', 'date', 'time'], name='doctor_appo_doctor__382ed0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalnote',
+            index=models.Index(fields=['appointment', 'created_at'], name='doctor_medi_appoint_1627e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescriptionupload',
+            index=models.Index(fields=['doctor', 'patient_id', 'timestamp'], name='doctor_pres_doctor__d5d80b_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+FTS_TABLE = 'doctor_medicalnote_fts'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        notes, doctor_key, tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, notes, doctor_key)
+    SELECT n.id, n.notes, 'd' || a.doctor_id
+    FROM doctor_medicalnote n JOIN doctor_appointment a ON a.id = n.appointment_id
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON doctor_medicalnote BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, notes, doctor_key)
+        SELECT NEW.id, NEW.notes, 'd' || a.doctor_id FROM doctor_appointment a WHERE a.id = NEW.appointment_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON doctor_medicalnote BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF notes ON doctor_medicalnote BEGIN
+        UPDATE {FTS_TABLE} SET notes = NEW.notes WHERE rowid = NEW.id;
+    END
+    """,
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def create_fts(apps, schema_editor):
+    # The FTS5 index only exists on SQLite; other databases fall back to doctor.search's LIKE query.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0012_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0019_doctor_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('patient_id', models.UUIDField()),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('mode', models.CharField(choices=[('online', 'Online'), ('in-person', 'In-Person')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('no-show', 'No-Show')], max_length=10)),
+                ('rejection_reason', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='doctor.doctor')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMedicalNote',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('notes', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medical_notes', to='doctor.archivedappointment')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPrescription',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('patient_id', models.UUIDField()),
+                ('file', models.FileField(upload_to='prescriptions/%Y/%m/%d/')),
+                ('timestamp', models.DateTimeField()),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='doctor.archivedappointment')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_prescriptions', to='doctor.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'patient_id', 'timestamp'], name='doctor_arch_doctor__d75b78_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['doctor', 'date', 'time'], name='doctor_arch_doctor__b148a9_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0020_appointment_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient_id'], name='doctor_appo_patient_6104d6_idx'),
+        ),
+    ]
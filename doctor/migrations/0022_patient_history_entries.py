@@ -0,0 +1,53 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.dateparse import parse_date
+
+SECTIONS = ['reports', 'visits', 'prescriptions']
+
+
+def index_histories(apps, schema_editor):
+    PatientHistory = apps.get_model('doctor', 'PatientHistory')
+    PatientHistoryEntry = apps.get_model('doctor', 'PatientHistoryEntry')
+    entries = []
+    for history in PatientHistory.objects.only(*SECTIONS).iterator(chunk_size=200):
+        for section in SECTIONS:
+            for position, entry in enumerate(getattr(history, section) or []):
+                try:
+                    day = parse_date(str(entry.get('date', ''))) if isinstance(entry, dict) else None
+                except ValueError:
+                    day = None
+                if day is not None:
+                    entries.append(PatientHistoryEntry(
+                        history_id=history.id, section=section, position=position, date=day, data=entry,
+                    ))
+        if len(entries) >= 1000:
+            PatientHistoryEntry.objects.bulk_create(entries)
+            entries = []
+    PatientHistoryEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0021_appointment_patient_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientHistoryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(max_length=20)),
+                ('position', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('data', models.JSONField()),
+                ('history', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='doctor.patienthistory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['history', 'section', 'date', 'position'], name='doctor_pati_history_49098e_idx')],
+            },
+        ),
+        migrations.RunPython(index_histories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:39
+
+from django.db import migrations, models
+
+FTS_TABLE = 'doctor_medicalnote_fts'
+
+# Archiving copies a note before deleting the hot row, so its index entry is kept and the id it carries
+# now points at the archived note; the entry goes only when the archived note itself is deleted.
+CREATE_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON doctor_medicalnote
+    WHEN NOT EXISTS (SELECT 1 FROM doctor_archivedmedicalnote WHERE id = OLD.id) BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_archived_ad AFTER DELETE ON doctor_archivedmedicalnote BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, notes, doctor_key)
+    SELECT n.id, n.notes, 'd' || a.doctor_id
+    FROM doctor_archivedmedicalnote n JOIN doctor_archivedappointment a ON a.id = n.appointment_id
+    WHERE n.id NOT IN (SELECT rowid FROM {FTS_TABLE})
+    """,
+]
+
+DROP_SQL = [
+    f"""
+    DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM doctor_archivedmedicalnote)
+    AND rowid NOT IN (SELECT id FROM doctor_medicalnote)
+    """,
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_archived_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON doctor_medicalnote BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+]
+
+
+def index_archived_notes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def unindex_archived_notes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0022_patient_history_entries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['doctor', 'patient_id', 'date', 'time'], name='doctor_arch_doctor__b07fc2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmedicalnote',
+            index=models.Index(fields=['appointment', 'created_at'], name='doctor_arch_appoint_bc65bb_idx'),
+        ),
+        migrations.RunPython(index_archived_notes, unindex_archived_notes),
+    ]
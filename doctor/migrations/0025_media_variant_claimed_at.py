@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0024_token_revocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediavariant',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
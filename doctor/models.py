@@ -72,11 +72,21 @@ class Appointment(models.Model):
         indexes = [
             models.Index(fields=['date']),
             models.Index(fields=['status']),
+            models.Index(fields=['doctor', 'patient_id', 'date', 'time']),
+            models.Index(fields=['patient_id']),
         ]
 
     def __str__(self):
         return f"Appointment with {self.doctor.name} on {self.date} at {self.time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The loaded status and date let the stats signals count a save as a transition.
+        if 'status' in field_names and 'date' in field_names:
+            instance._stats_state = (instance.status, instance.date)
+        return instance
+
 class Consent(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -118,6 +128,27 @@ class PatientHistory(models.Model):
     def __str__(self):
         return f"History for Patient {self.patient_id}"
 
+class PatientHistoryEntry(models.Model):
+    """
+    One dated entry of a list section of a PatientHistory, rebuilt whenever
+    the history is saved, so the timeline can page through a section with
+    an indexed query instead of parsing the whole JSON document.
+    """
+    history = models.ForeignKey(PatientHistory, on_delete=models.CASCADE, related_name='entries')
+    section = models.CharField(max_length=20)
+    # Index of the entry in its section list; breaks ties between entries of the same day.
+    position = models.PositiveIntegerField()
+    date = models.DateField()
+    data = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['history', 'section', 'date', 'position']),
+        ]
+
+    def __str__(self):
+        return f"{self.section} entry {self.position} of history {self.history_id}"
+
 class AccessLog(models.Model):
     ACTION_CHOICES = [
         ('viewed', 'Viewed'),
@@ -137,6 +168,54 @@ class AccessLog(models.Model):
     def __str__(self):
         return f"{self.user.username} {self.action} history for Patient {self.patient_id} at {self.accessed_at}"
 
+class PatientAccessDaily(models.Model):
+    patient_id = models.UUIDField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='patient_access_rollups')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['patient_id', 'day', 'user']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"Patient {self.patient_id} viewed {self.views} times by {self.user_id} on {self.day}"
+
+class UserAccessDaily(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='access_rollups')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'day']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} viewed {self.views} histories on {self.day}"
+
+class AccessLogArchive(models.Model):
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    path = models.CharField(max_length=255, unique=True)
+    row_count = models.PositiveIntegerField()
+    first_log_id = models.BigIntegerField()
+    last_log_id = models.BigIntegerField()
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['period_start', 'period_end']),
+        ]
+
+    def __str__(self):
+        return f"Access logs {self.period_start:%Y-%m} ({self.row_count} rows)"
+
 class MedicalNote(models.Model):
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='medical_notes')
     notes = models.TextField()
@@ -146,6 +225,7 @@ class MedicalNote(models.Model):
         indexes = [
             models.Index(fields=['appointment']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['appointment', 'created_at']),
         ]
 
     def __str__(self):
@@ -162,7 +242,208 @@ class PrescriptionUpload(models.Model):
         indexes = [
             models.Index(fields=['patient_id']),
             models.Index(fields=['timestamp']),
+            models.Index(fields=['doctor', 'patient_id', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"Prescription for Patient {self.patient_id} by {self.doctor.name} at {self.timestamp}"
+
+class MediaTombstone(models.Model):
+    name = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"Pending delete of {self.name}"
+
+class TokenRevocation(models.Model):
+    """When the tokens of a user were last revoked; kept in the database so no cache eviction can undo it."""
+    user_id = models.IntegerField(primary_key=True)
+    revoked_at = models.FloatField()
+
+    def __str__(self):
+        return f"Tokens of user {self.user_id} revoked at {self.revoked_at}"
+
+class MediaVariant(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    original = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    original_size = models.PositiveBigIntegerField(null=True, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Optimized variant of {self.original} ({self.status})"
+
+class UploadSession(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+        ('consumed', 'Consumed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.filename} ({self.offset}/{self.size})"
+
+class IdempotencyRecord(models.Model):
+    scope = models.CharField(max_length=40)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.scope})"
+
+class ChangeLog(models.Model):
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    # The auto-incrementing id is the sync sequence number.
+    id = models.BigAutoField(primary_key=True)
+    # A plain column rather than a foreign key, so entries written while a doctor is being deleted stay valid.
+    doctor_id = models.BigIntegerField()
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor_id', 'id']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model} {self.object_id}"
+
+class AppointmentCounters(models.Model):
+    appointments = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    accepted = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    no_show = models.IntegerField(default=0)
+    prescriptions = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+class DoctorStats(AppointmentCounters):
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for doctor {self.doctor_id}"
+
+class DoctorDailyStats(AppointmentCounters):
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_stats')
+    # Appointment counters use the appointment date; prescriptions the day they were uploaded.
+    date = models.DateField()
+
+    class Meta:
+        unique_together = ['doctor', 'date']
+
+    def __str__(self):
+        return f"Stats for doctor {self.doctor_id} on {self.date}"
+
+class ArchivedAppointment(models.Model):
+    """An appointment moved out of the hot table by ``manage.py archive_appointments``; ids are kept."""
+    id = models.BigIntegerField(primary_key=True)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_appointments')
+    patient_id = models.UUIDField()
+    date = models.DateField()
+    time = models.TimeField()
+    mode = models.CharField(max_length=10, choices=Appointment.MODE_CHOICES)
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    rejection_reason = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'time']),
+            models.Index(fields=['doctor', 'patient_id', 'date', 'time']),
+        ]
+
+    def __str__(self):
+        return f"Archived appointment {self.id} on {self.date} at {self.time}"
+
+class ArchivedMedicalNote(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    appointment = models.ForeignKey(ArchivedAppointment, on_delete=models.CASCADE, related_name='medical_notes')
+    notes = models.TextField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['appointment', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived note for appointment {self.appointment_id}"
+
+class ArchivedPrescription(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_prescriptions')
+    patient_id = models.UUIDField()
+    appointment = models.ForeignKey(ArchivedAppointment, on_delete=models.CASCADE, related_name='prescriptions')
+    file = models.FileField(upload_to='prescriptions/%Y/%m/%d/')
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'patient_id', 'timestamp']),
         ]
 
     def __str__(self):
-        return f"Prescription for Patient {self.patient_id} by {self.doctor.name} at {self.timestamp}"
\ No newline at end of file
+        return f"Archived prescription {self.id} for patient {self.patient_id}"
@@ -0,0 +1,151 @@
+import io
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import MediaVariant
+
+IMAGE_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+
+
+class Unsupported(Exception):
+    """The file cannot be optimized here; the original is served as is."""
+
+
+def queue_variants(names):
+    """Queue stored files for optimization; names already queued are ignored."""
+    MediaVariant.objects.bulk_create(
+        [MediaVariant(original=name) for name in names if name],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def variant_name(original):
+    root, ext = os.path.splitext(original)
+    return f'{root}.opt{ext.lower()}'
+
+
+def optimize_image(data, ext):
+    """
+    Re-encode an image without its metadata, rotated upright and scaled down
+    to fit ``MEDIA_IMAGE_MAX_DIMENSION``.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise Unsupported('Pillow is not installed.')
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        limit = settings.MEDIA_IMAGE_MAX_DIMENSION
+        image.thumbnail((limit, limit), Image.LANCZOS)
+        out = io.BytesIO()
+        if IMAGE_FORMATS[ext] == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(out, 'JPEG', quality=settings.MEDIA_IMAGE_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(out, 'PNG', optimize=True)
+    return out.getvalue()
+
+
+def optimize_pdf(data):
+    """Rewrite a PDF with compressed content streams, shared duplicate objects and no document info."""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise Unsupported('pypdf is not installed.')
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(data)))
+    for page in writer.pages:
+        page.compress_content_streams()
+    writer.compress_identical_objects()
+    writer.metadata = None
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def optimize(data, ext):
+    if ext in IMAGE_FORMATS:
+        return optimize_image(data, ext)
+    if ext == '.pdf':
+        return optimize_pdf(data)
+    raise Unsupported(f'No optimizer for {ext} files.')
+
+
+def claim_pending(limit):
+    """
+    Mark up to ``limit`` pending rows as processing and return them, along
+    with rows a worker claimed more than ``MEDIA_PROCESSING_TIMEOUT_MINUTES``
+    ago and never finished. A row is only returned to the worker whose
+    update flipped it, so concurrent workers never process the same file.
+    """
+    now = timezone.now()
+    stale = now - timedelta(minutes=settings.MEDIA_PROCESSING_TIMEOUT_MINUTES)
+    claimable = Q(status='pending') | Q(status='processing', claimed_at__lt=stale)
+    claimed = []
+    for variant in MediaVariant.objects.filter(claimable).order_by('id')[:limit]:
+        if MediaVariant.objects.filter(claimable, id=variant.id).update(status='processing', claimed_at=now):
+            claimed.append(variant)
+    return claimed
+
+
+def _finish(variant, **fields):
+    fields['processed_at'] = timezone.now()
+    MediaVariant.objects.filter(id=variant.id).update(**fields)
+
+
+def process_variant(variant, storage=None):
+    """
+    Build the optimized copy of one original. The original is never
+    modified. When optimization does not shrink the file the row is marked
+    skipped and downloads keep serving the original.
+    """
+    storage = storage or default_storage
+    ext = os.path.splitext(variant.original)[1].lower()
+    try:
+        with storage.open(variant.original, 'rb') as handle:
+            data = handle.read()
+        optimized = optimize(data, ext)
+    except Unsupported as exc:
+        _finish(variant, status='skipped', error=str(exc))
+        return 'skipped'
+    except Exception as exc:
+        _finish(variant, status='failed', error=f'{type(exc).__name__}: {exc}'[:1000])
+        return 'failed'
+
+    if len(optimized) >= len(data):
+        _finish(variant, status='skipped', original_size=len(data), error='Optimized file was not smaller.')
+        return 'skipped'
+    name = storage.save(variant_name(variant.original), ContentFile(optimized))
+    _finish(variant, status='done', name=name, original_size=len(data), size=len(optimized), error='')
+    return 'done'
+
+
+def with_served_names(queryset, *fields):
+    """Annotate ``queryset`` with the optimized variant of each file field, for ``served_name``."""
+    return queryset.annotate(**{
+        f'served_{field}': Subquery(
+            MediaVariant.objects.filter(original=OuterRef(field), status='done').values('name')[:1]
+        )
+        for field in fields
+    })
+
+
+def served_name(field_file):
+    """
+    Storage name to serve for ``field_file``: its optimized variant when one
+    exists. Rows loaded through ``with_served_names`` need no query.
+    """
+    attribute = f'served_{field_file.field.name}'
+    if hasattr(field_file.instance, attribute):
+        return getattr(field_file.instance, attribute) or field_file.name
+    variant = (
+        MediaVariant.objects.filter(original=field_file.name, status='done').values_list('name', flat=True).first()
+    )
+    return variant or field_file.name
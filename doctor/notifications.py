@@ -5,4 +5,10 @@ def send_notification(doctor, status):
     
     message = f"Notification: Doctor {doctor.name} ({doctor.email}) status updated to {status}."
     print(message)  # Log to console
-    # Future: Replace with email/SMS service integration (e.g., SendGrid, Twilio)
\ No newline at end of file
+    # Future: Replace with email/SMS service integration (e.g., SendGrid, Twilio)
+
+
+def send_consent_requests(doctor, patient_ids):
+    """Notify patients of consent requests from ``doctor`` as one batch rather than a call per patient."""
+    print(f"Notification: Consent requests sent to {len(patient_ids)} patients from {doctor.name}")
+    # Future: hand the whole list to the email/SMS provider's batch API
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import IntegerField, Max, Min
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class MedicalNotePagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+def estimated_rows(model):
+    """
+    A cheap row count estimate for ``model``'s table: the planner statistics
+    on PostgreSQL, otherwise the span of its integer primary key (read from
+    the index ends). ``None`` when neither is available.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    if isinstance(model._meta.pk, IntegerField):
+        bounds = model._default_manager.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['high'] is None:
+            return 0
+        return bounds['high'] - bounds['low'] + 1
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that never counts a large table row by row. Unfiltered
+    changelists use ``estimated_rows``; filtered ones count at most
+    ``ADMIN_COUNT_LIMIT`` matches, so later pages of a huge result are
+    reached by narrowing the filter rather than by paging.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by().values('pk')[:limit].count()
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+TOKEN_SALT = 'doctor.profiling'
+HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+
+def make_token(user):
+    return signing.dumps({'u': user.pk}, salt=TOKEN_SALT, compress=True)
+
+
+def user_for_token(token, max_age):
+    """Return the active staff user a profiling token was issued to, or None."""
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=payload.get('u'), is_staff=True, is_active=True).first()
+
+
+def request_user(request):
+    """The user the API authenticators resolve for ``request``; anonymous when the credentials are missing or bad."""
+    authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        return Request(request, authenticators=authenticators).user
+    except APIException:
+        return None
+
+
+def profiling_user(request, max_age):
+    """The staff user profiling ``request``: the token's owner, who must also be the one making it."""
+    token = request.META.get(HEADER)
+    if not token:
+        return None
+    user = user_for_token(token, max_age)
+    if user is None:
+        return None
+    caller = request_user(request)
+    if caller is None or not caller.is_staff or caller.pk != user.pk:
+        return None
+    return user
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval from a background
+    thread and aggregates identical stacks, so the profiled code itself runs
+    uninstrumented.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='doctor-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        return ''.join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def profile_basename(request):
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match else request.path
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', name).strip('-') or 'root'
+    return f"{timezone.now().strftime('%Y%m%dT%H%M%S%f')}-{slug}-{os.getpid()}"
+
+
+def write_profile(directory, basename, sampler, recorder, meta):
+    os.makedirs(directory, exist_ok=True)
+    collapsed_path = os.path.join(directory, f'{basename}.collapsed')
+    with open(collapsed_path, 'w') as handle:
+        handle.write(sampler.collapsed())
+    timeline = {
+        **meta,
+        'samples': sampler.samples,
+        'interval_ms': sampler.interval * 1000,
+        'queries': recorder.count,
+        'db_ms': round(recorder.total_time * 1000, 3),
+        'sql': [
+            {
+                'offset_ms': round(query.started * 1000, 3),
+                'duration_ms': round(query.duration * 1000, 3),
+                'alias': query.alias,
+                # Parameters carry patient data; only the statements are written.
+                'sql': query.sql,
+            }
+            for query in recorder.queries
+        ],
+    }
+    with open(os.path.join(directory, f'{basename}.sql.json'), 'w') as handle:
+        json.dump(timeline, handle, indent=2)
+    return collapsed_path
+
@@ -0,0 +1,78 @@
+import heapq
+import re
+from itertools import islice
+from operator import attrgetter
+
+from django.db import connection
+
+from .models import ArchivedMedicalNote, MedicalNote
+
+FTS_TABLE = 'doctor_medicalnote_fts'
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(doctor_id, query):
+    """
+    Build an FTS5 MATCH expression restricted to one doctor's notes, or to
+    no doctor when ``doctor_id`` is ``None``. Every word of ``query`` must
+    match; the last one also matches as a prefix so results update while
+    the user is typing.
+    """
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    expression = f'notes : ({" AND ".join(quoted)})'
+    if doctor_id is None:
+        return expression
+    return f'doctor_key : "d{doctor_id}" AND {expression}'
+
+
+def search_notes(doctor, query, limit=20):
+    """
+    Return ``(note, snippet)`` pairs of the doctor's medical notes matching
+    ``query``, best match first. Uses the FTS5 index maintained by triggers
+    on SQLite and falls back to a LIKE scan on other databases. Notes of
+    archived appointments are found too; archiving keeps their ids.
+    """
+    if not fts_available():
+        notes = heapq.merge(*(
+            model.objects.filter(appointment__doctor=doctor, notes__icontains=query).order_by('-created_at')[:limit]
+            for model in (MedicalNote, ArchivedMedicalNote)
+        ), key=attrgetter('created_at'), reverse=True)
+        return [(note, note.notes[:200]) for note in islice(notes, limit)]
+
+    expression = match_expression(doctor.id, query)
+    if expression is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, 0, '[', ']', '...', 16) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}, 1.0, 0.0) LIMIT %s",
+            [expression, limit],
+        )
+        hits = cursor.fetchall()
+    notes = MedicalNote.objects.in_bulk([note_id for note_id, _ in hits])
+    missing = [note_id for note_id, _ in hits if note_id not in notes]
+    if missing:
+        notes.update(ArchivedMedicalNote.objects.in_bulk(missing))
+    return [(notes[note_id], snippet) for note_id, snippet in hits if note_id in notes]
+
+
+def matching_note_ids(query, limit):
+    """Ids of the best ``limit`` notes of any doctor matching ``query`` in the FTS5 index."""
+    expression = match_expression(None, query)
+    if expression is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 1.0, 0.0) LIMIT %s",
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,266 @@
+import random
+import uuid
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import stats
+from .audit import bulk_create_rollups
+from .timeline import index_histories
+from .models import (
+    Doctor, DoctorProfile, Appointment, ArchivedAppointment, Consent, PatientHistory,
+    AccessLog, MedicalNote, PrescriptionUpload
+)
+
+SEED_USERNAME_PREFIX = 'seed-'
+SEED_PASSWORD = 'seed-password'
+
+SPECIALTIES = [
+    'Cardiology', 'Dermatology', 'General Medicine', 'Neurology',
+    'Orthopedics', 'Pediatrics', 'Psychiatry', 'Radiology',
+]
+LANGUAGES = ['English', 'Hindi', 'Tamil', 'Telugu', 'Kannada', 'Marathi', 'Bengali']
+CONDITIONS = ['diabetes', 'hypertension', 'asthma', 'cancer', 'arthritis', 'migraine']
+MEDICINES = ['Metformin', 'Amlodipine', 'Atorvastatin', 'Paracetamol', 'Salbutamol', 'Ibuprofen']
+NOTE_WORDS = [
+    'patient', 'reports', 'mild', 'severe', 'pain', 'fever', 'cough', 'follow-up',
+    'prescribed', 'review', 'blood', 'pressure', 'sugar', 'levels', 'stable',
+    'improving', 'referred', 'scan', 'advised', 'rest', 'diet', 'exercise',
+]
+
+
+class SeedSummary(dict):
+    """Counts and identifiers of the rows created by a seeding run."""
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _words(rng, count):
+    return ' '.join(rng.choice(NOTE_WORDS) for _ in range(count))
+
+
+def _document_bytes(rng, size_kb):
+    header = b'%PDF-1.4\n% seeded document\n'
+    return header + rng.randbytes(max(size_kb * 1024 - len(header), 0))
+
+
+def _store(name, rng, size_kb):
+    if not size_kb:
+        return name
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(_document_bytes(rng, size_kb)))
+
+
+def _history_blob(rng, patient_id, entries, today):
+    reports = []
+    visits = []
+    prescriptions = []
+    for i in range(entries):
+        day = (today - timedelta(days=rng.randint(0, 3 * 365))).isoformat()
+        reports.append({
+            'id': i,
+            'date': day,
+            'type': rng.choice(['blood', 'urine', 'x-ray', 'mri', 'ecg']),
+            'result': _words(rng, 12),
+        })
+        visits.append({
+            'id': i,
+            'date': day,
+            'reason': _words(rng, 6),
+            'notes': _words(rng, 20),
+        })
+        prescriptions.append({
+            'id': i,
+            'date': day,
+            'medicine': rng.choice(MEDICINES),
+            'dosage': f'{rng.choice([250, 500, 650])}mg',
+            'duration_days': rng.randint(3, 30),
+        })
+    return PatientHistory(
+        patient_id=patient_id,
+        reports=reports,
+        visits=visits,
+        prescriptions=prescriptions,
+        vitals={
+            'height_cm': rng.randint(140, 195),
+            'weight_kg': rng.randint(40, 120),
+            'blood_pressure': f'{rng.randint(100, 160)}/{rng.randint(60, 100)}',
+            'pulse': rng.randint(55, 110),
+        },
+        flags={'conditions': rng.sample(CONDITIONS, rng.randint(0, 3))},
+    )
+
+
+def clear_seed_data():
+    """Delete every user created by a previous seeding run, cascading to its rows."""
+    seeded_users = User.objects.filter(username__startswith=SEED_USERNAME_PREFIX)
+    # Every seeded patient has a consent; archived appointments no longer show up among the hot ones.
+    patients = Q()
+    for model in (Consent, Appointment, ArchivedAppointment):
+        patients |= Q(patient_id__in=model.objects.filter(doctor__user__in=seeded_users).values('patient_id'))
+    PatientHistory.objects.filter(patients).delete()
+    seeded_users.delete()
+
+
+@transaction.atomic
+def seed(doctors=10, appointments_per_doctor=20, patients_per_doctor=10,
+         history_entries=50, access_logs_per_patient=5, prescriptions_per_doctor=5,
+         notes_per_appointment=1, file_size_kb=4, pending_ratio=0.1, seed=0):
+    """
+    Generate a deterministic data set for load and benchmark runs; the same
+    ``seed`` and sizes always produce the same rows.
+    """
+    rng = random.Random(seed)
+    # File bytes come from their own stream so toggling files leaves the rows unchanged.
+    file_rng = random.Random(f'{seed}-files')
+    today = timezone.now().date()
+    now = timezone.now()
+    password = make_password(SEED_PASSWORD, salt=f'seed{seed}')
+    prefix = f'{SEED_USERNAME_PREFIX}{seed}-'
+
+    users = User.objects.bulk_create([
+        User(
+            username=f'{prefix}doctor-{i}',
+            email=f'doctor{i}.s{seed}@seed.livesure.test',
+            password=password,
+        )
+        for i in range(doctors)
+    ])
+
+    doctor_rows = []
+    for i, user in enumerate(users):
+        documents = f'doctor_documents/seed/{seed}/{i}'
+        doctor_rows.append(Doctor(
+            user=user,
+            name=f'Dr. Seed {i}',
+            email=user.email,
+            mobile=f'9{seed % 1000:03d}{i:07d}',
+            specialty=rng.choice(SPECIALTIES),
+            clinic_address=f'{rng.randint(1, 999)} Seed Street, Block {rng.randint(1, 50)}',
+            govt_id=_store(f'{documents}/govt_id.pdf', file_rng, file_size_kb),
+            medical_certificate=_store(f'{documents}/medical_certificate.pdf', file_rng, file_size_kb),
+            reg_id=f'SEED-{seed}-{i:06d}',
+            status='pending' if rng.random() < pending_ratio else 'approved',
+        ))
+    doctor_rows = Doctor.objects.bulk_create(doctor_rows)
+
+    DoctorProfile.objects.bulk_create([
+        DoctorProfile(
+            doctor=doctor,
+            bio=_words(rng, 40),
+            specialties=rng.sample(SPECIALTIES, 2),
+            certifications=[
+                {'name': f'Certification {j}', 'date': f'{rng.randint(1995, 2024)}-01-01'}
+                for j in range(rng.randint(1, 4))
+            ],
+            clinic_timings={day: '09:00-17:00' for day in ['mon', 'tue', 'wed', 'thu', 'fri']},
+            languages=rng.sample(LANGUAGES, rng.randint(1, 3)),
+            fees=Decimal(rng.randint(200, 2000)),
+        )
+        for doctor in doctor_rows
+    ])
+
+    patients = {
+        doctor.id: [_uuid(rng) for _ in range(patients_per_doctor)]
+        for doctor in doctor_rows
+    }
+
+    appointment_rows = []
+    for doctor in doctor_rows:
+        for _ in range(appointments_per_doctor):
+            day = today + timedelta(days=rng.randint(-180, 30))
+            appointment_status = rng.choices(
+                ['pending', 'accepted', 'rejected', 'no-show'], weights=[3, 10, 2, 1]
+            )[0]
+            appointment_rows.append(Appointment(
+                doctor=doctor,
+                patient_id=rng.choice(patients[doctor.id]),
+                date=day,
+                time=time(rng.randint(9, 16), rng.choice([0, 15, 30, 45])),
+                mode=rng.choice(['online', 'in-person']),
+                status=appointment_status,
+                rejection_reason=_words(rng, 5) if appointment_status == 'rejected' else None,
+            ))
+    appointment_rows = Appointment.objects.bulk_create(appointment_rows)
+
+    Consent.objects.bulk_create([
+        Consent(
+            doctor=doctor,
+            patient_id=patient_id,
+            status=rng.choices(['granted', 'pending', 'denied'], weights=[8, 1, 1])[0],
+        )
+        for doctor in doctor_rows
+        for patient_id in patients[doctor.id]
+    ])
+
+    all_patients = [patient_id for ids in patients.values() for patient_id in ids]
+    histories = PatientHistory.objects.bulk_create(
+        [_history_blob(rng, patient_id, history_entries, today) for patient_id in all_patients],
+        batch_size=200,
+    )
+    index_histories(histories)
+
+    access_logs = AccessLog.objects.bulk_create([
+        AccessLog(user_id=doctor.user_id, patient_id=patient_id, action='viewed')
+        for doctor in doctor_rows
+        for patient_id in patients[doctor.id]
+        for _ in range(access_logs_per_patient)
+    ], batch_size=1000)
+    # accessed_at is auto_now_add, so spread the stamps over the past year afterwards.
+    for log in access_logs:
+        log.accessed_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+    AccessLog.objects.bulk_update(access_logs, ['accessed_at'], batch_size=500)
+    bulk_create_rollups((log.user_id, log.patient_id, log.accessed_at) for log in access_logs)
+
+    MedicalNote.objects.bulk_create([
+        MedicalNote(appointment=appointment, notes=_words(rng, rng.randint(20, 80)))
+        for appointment in appointment_rows
+        for _ in range(notes_per_appointment)
+    ], batch_size=1000)
+
+    by_doctor = {}
+    for appointment in appointment_rows:
+        by_doctor.setdefault(appointment.doctor_id, []).append(appointment)
+
+    prescription_rows = []
+    for doctor in doctor_rows:
+        doctor_appointments = by_doctor.get(doctor.id, [])
+        if not doctor_appointments:
+            continue
+        for j in range(prescriptions_per_doctor):
+            appointment = rng.choice(doctor_appointments)
+            name = _store(f'prescriptions/{doctor.id}/seed-{seed}-{j}.pdf', file_rng, file_size_kb)
+            prescription_rows.append(PrescriptionUpload(
+                doctor=doctor,
+                patient_id=appointment.patient_id,
+                appointment=appointment,
+                file=name,
+            ))
+    PrescriptionUpload.objects.bulk_create(prescription_rows)
+    # bulk_create skips the signals that keep the stats tables current.
+    for _ in stats.rebuild(doctor_ids=[doctor.id for doctor in doctor_rows]):
+        pass
+
+    return SeedSummary(
+        doctors=len(doctor_rows),
+        approved_doctors=sum(1 for doctor in doctor_rows if doctor.status == 'approved'),
+        patients=len(all_patients),
+        appointments=len(appointment_rows),
+        consents=len(all_patients),
+        histories=len(all_patients),
+        access_logs=len(access_logs),
+        medical_notes=len(appointment_rows) * notes_per_appointment,
+        prescriptions=len(prescription_rows),
+        doctor_ids=[doctor.id for doctor in doctor_rows],
+        patient_ids={doctor.id: patients[doctor.id] for doctor in doctor_rows},
+    )
@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Doctor, DoctorProfile, Appointment, Consent, PatientHistory, PrescriptionUpload 
+from .models import Doctor, DoctorProfile, Appointment, Consent, PatientHistory, PrescriptionUpload, MedicalNote, UploadSession
+from .fieldsets import SparseFieldsMixin
+from .validators import validate_document_file
+from django.conf import settings
 from django.utils import timezone
+from types import SimpleNamespace
+import re
 import uuid
 
 class DoctorOnboardingSerializer(serializers.ModelSerializer):
@@ -51,7 +56,7 @@ class DoctorAdminSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Status must be 'approved' or 'rejected'.")
         return value
 
-class DoctorProfileSerializer(serializers.ModelSerializer):
+class DoctorProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     completeness_percentage = serializers.SerializerMethodField()
 
     class Meta:
@@ -60,6 +65,9 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
             'bio', 'specialties', 'certifications', 'clinic_timings',
             'languages', 'fees', 'completeness_percentage'
         ]
+        field_sources = {
+            'completeness_percentage': ['bio', 'specialties', 'certifications', 'clinic_timings', 'languages', 'fees'],
+        }
 
     def validate_specialties(self, value):
         if not isinstance(value, list):
@@ -106,20 +114,23 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
         percentage = (filled_fields / total_fields) * 100 if total_fields > 0 else 0
         return round(percentage, 2)
 
-class DoctorPublicPreviewSerializer(serializers.ModelSerializer):
+class DoctorPublicPreviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     profile = DoctorProfileSerializer(read_only=True)
     specialty = serializers.CharField()
 
     class Meta:
         model = Doctor
         fields = ['id', 'name', 'specialty', 'clinic_address', 'profile']
+        sections = ['profile']
+        # to_representation hides doctors that are not approved.
+        required_columns = ['status']
 
     def to_representation(self, instance):
         if instance.status != 'approved':
             return {}
         return super().to_representation(instance)
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     doctor_id = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), source='doctor')
     rejection_reason = serializers.CharField(max_length=255, write_only=True, required=False)
 
@@ -144,7 +155,18 @@ class AppointmentSerializer(serializers.ModelSerializer):
             instance.rejection_reason = validated_data.pop('rejection_reason')
         return super().update(instance, validated_data)
 
-class ConsentSerializer(serializers.ModelSerializer):
+class MedicalNoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = MedicalNote
+        fields = ['id', 'appointment', 'notes', 'created_at']
+        read_only_fields = ['id', 'appointment', 'created_at']
+
+    def validate_notes(self, value):
+        if not value.strip():
+            raise serializers.ValidationError("Notes cannot be blank.")
+        return value
+
+class ConsentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     doctor_id = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), source='doctor')
     patient_id = serializers.UUIDField(required=True)
 
@@ -177,13 +199,20 @@ class ConsentSerializer(serializers.ModelSerializer):
 
         return data
 
-class PatientHistorySerializer(serializers.ModelSerializer):
+class BulkConsentSerializer(serializers.Serializer):
+    patient_ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=settings.CONSENT_BULK_MAX_PATIENTS
+    )
+
+class PatientHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     summary = serializers.SerializerMethodField()
 
     class Meta:
         model = PatientHistory
         fields = ['patient_id', 'reports', 'vitals', 'prescriptions', 'visits', 'flags', 'summary', 'created_at', 'updated_at']
         read_only_fields = ['patient_id', 'created_at', 'updated_at']
+        sections = ['reports', 'vitals', 'prescriptions', 'visits', 'flags', 'summary']
+        field_sources = {'summary': ['reports', 'vitals', 'prescriptions', 'visits', 'flags']}
 
     def get_summary(self, obj):
         summary = {
@@ -201,7 +230,9 @@ class PatientHistorySerializer(serializers.ModelSerializer):
             )
         return summary
     
-class PrescriptionUploadSerializer(serializers.ModelSerializer):
+class PrescriptionUploadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    patient_id = serializers.UUIDField(required=True)
+
     class Meta:
         model = PrescriptionUpload
         fields = ['id', 'doctor', 'patient_id', 'appointment', 'file', 'timestamp']
@@ -211,10 +242,26 @@ class PrescriptionUploadSerializer(serializers.ModelSerializer):
         appointment = data.get('appointment')
         doctor = self.context['request'].user.doctor
 
-        if appointment.doctor != doctor:
+        if appointment.doctor_id != doctor.id:
             raise serializers.ValidationError({"appointment": "Appointment does not belong to this doctor."})
 
         if data.get('patient_id') != appointment.patient_id:
             raise serializers.ValidationError({"patient_id": "Patient ID does not match the appointment's patient ID."})
 
-        return data
\ No newline at end of file
+        return data
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'sha256', 'offset', 'status', 'created_at']
+        read_only_fields = ['id', 'offset', 'status', 'created_at']
+
+    def validate_sha256(self, value):
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("sha256 must be the hex SHA-256 digest of the whole file.")
+        return value.lower()
+
+    def validate(self, data):
+        # Reject files the upload fields would refuse before any bytes are sent.
+        validate_document_file(SimpleNamespace(name=data['filename'], size=data['size']))
+        return data
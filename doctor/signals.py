@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Appointment, ArchivedPrescription, Consent, Doctor, MediaTombstone, MediaVariant, PatientHistory,
+    PrescriptionUpload,
+)
+from . import stats
+from .authentication import revoke_tokens
+from .normalization import queue_variants
+from .sync import record_changes
+from .timeline import index_histories
+
+# User flags copied into access tokens and trusted for authorization.
+PRINCIPAL_FLAGS = ('is_active', 'is_staff', 'is_superuser')
+
+_muted = ContextVar('doctor_signals_muted', default=False)
+
+
+@contextmanager
+def muted():
+    """
+    Skip the change log, stats and media side effects of saves and deletes
+    in this block, for moves that leave the data itself in place (archival).
+    """
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def unless_muted(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _muted.get():
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+def queue_file_deletes(*field_files):
+    """
+    Queue stored files, and their optimized variants, for deletion by
+    ``manage.py reconcile_media``. The tombstones commit or roll back with
+    the delete that produced them, and no storage call happens inside the
+    request.
+    """
+    names = [field_file.name for field_file in field_files if field_file]
+    variants = MediaVariant.objects.filter(original__in=names)
+    names += [name for name in variants.values_list('name', flat=True) if name]
+    variants.delete()
+    MediaTombstone.objects.bulk_create([MediaTombstone(name=name) for name in names])
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, created, **kwargs):
+    if created:
+        queue_variants([instance.govt_id.name, instance.medical_certificate.name])
+
+
+@receiver(post_save, sender=PrescriptionUpload)
+@unless_muted
+def prescription_saved(sender, instance, created, **kwargs):
+    if created:
+        queue_variants([instance.file.name])
+
+
+@receiver(post_delete, sender=Doctor)
+def doctor_deleted(sender, instance, **kwargs):
+    queue_file_deletes(instance.govt_id, instance.medical_certificate)
+
+
+@receiver(post_delete, sender=PrescriptionUpload)
+@unless_muted
+def prescription_deleted(sender, instance, **kwargs):
+    queue_file_deletes(instance.file)
+
+
+@receiver(post_delete, sender=ArchivedPrescription)
+def archived_prescription_deleted(sender, instance, **kwargs):
+    queue_file_deletes(instance.file)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Consent)
+@receiver(post_save, sender=PrescriptionUpload)
+@unless_muted
+def synced_row_saved(sender, instance, **kwargs):
+    record_changes([instance])
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Consent)
+@receiver(post_delete, sender=PrescriptionUpload)
+@unless_muted
+def synced_row_deleted(sender, instance, **kwargs):
+    record_changes([instance], action='delete')
+
+
+@receiver(pre_save, sender=Appointment)
+@unless_muted
+def appointment_saving(sender, instance, **kwargs):
+    # Rows loaded without status or date (e.g. via only()) have no snapshot, so read it.
+    if instance.pk and not hasattr(instance, '_stats_state'):
+        instance._stats_state = (
+            Appointment.objects.filter(pk=instance.pk).values_list('status', 'date').first()
+        )
+
+
+@receiver(post_save, sender=Appointment)
+@unless_muted
+def appointment_stats_saved(sender, instance, created, **kwargs):
+    state = (instance.status, instance.date)
+    stats.appointment_changed(instance.doctor_id, None if created else instance._stats_state, state)
+    instance._stats_state = state
+
+
+@receiver(post_delete, sender=Appointment)
+@unless_muted
+def appointment_stats_deleted(sender, instance, **kwargs):
+    stats.appointment_changed(instance.doctor_id, getattr(instance, '_stats_state', None), None)
+
+
+@receiver(post_save, sender=PrescriptionUpload)
+@unless_muted
+def prescription_stats_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.prescription_changed(instance, 1)
+
+
+@receiver(post_delete, sender=PrescriptionUpload)
+@unless_muted
+def prescription_stats_deleted(sender, instance, **kwargs):
+    stats.prescription_changed(instance, -1)
+
+
+@receiver(post_save, sender=PatientHistory)
+def patient_history_saved(sender, instance, **kwargs):
+    index_histories([instance])
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    instance._principal_flags = None
+    if not instance.pk or (update_fields is not None and not set(update_fields) & set(PRINCIPAL_FLAGS)):
+        return
+    instance._principal_flags = User.objects.filter(pk=instance.pk).values_list(*PRINCIPAL_FLAGS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    before = getattr(instance, '_principal_flags', None)
+    if before is not None and before != tuple(getattr(instance, flag) for flag in PRINCIPAL_FLAGS):
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
@@ -0,0 +1,159 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedPrescription, Doctor, DoctorDailyStats, DoctorStats, PrescriptionUpload,
+)
+
+COUNTERS = ['appointments', 'pending', 'accepted', 'rejected', 'no_show', 'prescriptions']
+STATUS_COUNTERS = {'pending': 'pending', 'accepted': 'accepted', 'rejected': 'rejected', 'no-show': 'no_show'}
+
+
+def _bump(model, key, deltas):
+    """Add ``deltas`` to the counters of the ``key`` row, creating it on the first increment."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    # Nothing to take away from a row that was never counted, e.g. while its doctor is being deleted.
+    if all(delta < 0 for delta in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **{name: max(delta, 0) for name, delta in deltas.items()})
+    except IntegrityError:
+        model.objects.filter(**key).update(**updates)
+
+
+def _apply(doctor_id, per_day):
+    total = Counter()
+    for deltas in per_day.values():
+        total.update(deltas)
+    _bump(DoctorStats, {'doctor_id': doctor_id}, total)
+    for day, deltas in per_day.items():
+        _bump(DoctorDailyStats, {'doctor_id': doctor_id, 'date': day}, deltas)
+
+
+def appointment_changed(doctor_id, before, after):
+    """
+    Move one appointment's contribution from its ``before`` to its ``after``
+    (status, date) state; ``None`` means it did not or no longer exists.
+    """
+    if before == after:
+        return
+    per_day = defaultdict(Counter)
+    if before is not None:
+        status, day = before
+        per_day[day]['appointments'] -= 1
+        per_day[day][STATUS_COUNTERS[status]] -= 1
+    if after is not None:
+        status, day = after
+        per_day[day]['appointments'] += 1
+        per_day[day][STATUS_COUNTERS[status]] += 1
+    _apply(doctor_id, per_day)
+
+
+def prescription_changed(prescription, delta):
+    _apply(prescription.doctor_id, {timezone.localdate(prescription.timestamp): {'prescriptions': delta}})
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _summary(row):
+    counters = {name: getattr(row, name) if row else 0 for name in COUNTERS}
+    held = counters['accepted'] + counters['no_show']
+    return {
+        **counters,
+        'no_show_rate': _ratio(counters['no_show'], held),
+        'acceptance_rate': _ratio(held, held + counters['rejected']),
+        'prescriptions_per_appointment': _ratio(counters['prescriptions'], counters['accepted']),
+    }
+
+
+def doctor_stats(doctor_id, start, end):
+    """Totals for ``doctor_id`` and one entry per day in ``[start, end]`` that had activity."""
+    days = []
+    rows = (
+        DoctorDailyStats.objects.filter(doctor_id=doctor_id, date__gte=start, date__lte=end)
+        .exclude(appointments=0, prescriptions=0).order_by('date')
+    )
+    for row in rows:
+        summary = _summary(row)
+        summary['utilization'] = _ratio(row.appointments - row.rejected, settings.DOCTOR_DAILY_CAPACITY)
+        days.append({'date': row.date, **summary})
+    return {
+        'doctor_id': doctor_id,
+        'totals': _summary(DoctorStats.objects.filter(doctor_id=doctor_id).first()),
+        'start': start,
+        'end': end,
+        'days': days,
+    }
+
+
+def default_range(today=None):
+    today = today or timezone.localdate()
+    return today - timedelta(days=29), today
+
+
+@transaction.atomic
+def _rebuild_batch(doctor_ids):
+    totals = defaultdict(Counter)
+    daily = defaultdict(Counter)
+    # Archived rows keep counting; archival moves them without touching the stats.
+    for model in (Appointment, ArchivedAppointment):
+        appointments = (
+            model.objects.filter(doctor_id__in=doctor_ids)
+            .values('doctor_id', 'date', 'status').annotate(count=Count('id')).order_by()
+        )
+        for row in appointments.iterator():
+            for target in (totals[row['doctor_id']], daily[(row['doctor_id'], row['date'])]):
+                target['appointments'] += row['count']
+                target[STATUS_COUNTERS[row['status']]] += row['count']
+    for model in (PrescriptionUpload, ArchivedPrescription):
+        prescriptions = (
+            model.objects.filter(doctor_id__in=doctor_ids)
+            .annotate(day=TruncDate('timestamp')).values('doctor_id', 'day').annotate(count=Count('id')).order_by()
+        )
+        for row in prescriptions.iterator():
+            totals[row['doctor_id']]['prescriptions'] += row['count']
+            daily[(row['doctor_id'], row['day'])]['prescriptions'] += row['count']
+
+    DoctorStats.objects.filter(doctor_id__in=doctor_ids).delete()
+    DoctorDailyStats.objects.filter(doctor_id__in=doctor_ids).delete()
+    DoctorStats.objects.bulk_create([
+        DoctorStats(doctor_id=doctor_id, **counters) for doctor_id, counters in totals.items()
+    ], batch_size=500)
+    DoctorDailyStats.objects.bulk_create([
+        DoctorDailyStats(doctor_id=doctor_id, date=day, **counters)
+        for (doctor_id, day), counters in daily.items()
+    ], batch_size=500)
+
+
+def rebuild(batch_size=100, doctor_ids=None):
+    """
+    Recompute the stats tables from the hot and archived appointment and prescription rows,
+    ``batch_size`` doctors at a time so memory and lock time stay bounded.
+    Yields the number of doctors rebuilt after each batch.
+    """
+    if doctor_ids is None:
+        doctor_ids = Doctor.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    batch = []
+    for doctor_id in doctor_ids:
+        batch.append(doctor_id)
+        if len(batch) == batch_size:
+            _rebuild_batch(batch)
+            yield len(batch)
+            batch = []
+    if batch:
+        _rebuild_batch(batch)
+        yield len(batch)
@@ -0,0 +1,193 @@
+import heapq
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from .models import ArchivedPrescription, Doctor, MediaTombstone, MediaVariant, PrescriptionUpload
+from .normalization import served_name
+
+# Storage prefixes owned by the upload fields below; reconciliation never looks outside them.
+MEDIA_PREFIXES = ['doctor_documents', 'prescriptions']
+FILE_REFERENCES = [
+    (Doctor, 'govt_id'),
+    (Doctor, 'medical_certificate'),
+    (PrescriptionUpload, 'file'),
+    (ArchivedPrescription, 'file'),
+    (MediaVariant, 'name'),
+]
+
+
+def serves_locally(storage):
+    return isinstance(storage, FileSystemStorage)
+
+
+def download_url(field_file, expire=None):
+    """
+    URL a client should fetch ``field_file`` from, preferring its optimized
+    variant: a presigned, expiring URL on object storage, ``MEDIA_URL`` on
+    local storage.
+    """
+    storage = field_file.storage
+    name = served_name(field_file)
+    if serves_locally(storage):
+        return storage.url(name)
+    filename = os.path.basename(name)
+    return storage.url(
+        name,
+        parameters={'ResponseContentDisposition': f'attachment; filename="{filename}"'},
+        expire=expire or settings.MEDIA_URL_EXPIRY,
+    )
+
+
+def referenced_among(names):
+    """The subset of ``names`` some row references, with one query per reference."""
+    referenced = set()
+    for model, field in FILE_REFERENCES:
+        referenced.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return referenced
+
+
+def process_tombstones(batch_size=500, storage=None, dry_run=False):
+    """
+    Delete queued files in batches of ``batch_size``, oldest first. A file
+    that a row references again is kept. Failed deletes stay queued with
+    the error recorded. Returns ``(deleted, kept, failed)``.
+    """
+    storage = storage or default_storage
+    deleted = kept = failed = 0
+    last_id = 0
+    while True:
+        batch = list(MediaTombstone.objects.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        done = []
+        referenced = referenced_among({tombstone.name for tombstone in batch})
+        for tombstone in batch:
+            if tombstone.name in referenced:
+                kept += 1
+                done.append(tombstone.id)
+                continue
+            if dry_run:
+                deleted += 1
+                continue
+            try:
+                if storage.exists(tombstone.name):
+                    storage.delete(tombstone.name)
+            except Exception as exc:
+                failed += 1
+                MediaTombstone.objects.filter(id=tombstone.id).update(
+                    attempts=F('attempts') + 1, last_error=str(exc)[:1000],
+                )
+                continue
+            deleted += 1
+            done.append(tombstone.id)
+        if not dry_run:
+            MediaTombstone.objects.filter(id__in=done).delete()
+    return deleted, kept, failed
+
+
+def _listing_key(entry):
+    name, is_dir = entry
+    return name + '/' if is_dir else name
+
+
+def stored_names(prefix, storage=None):
+    """
+    Yield every file name under ``prefix`` in plain string order, one
+    directory listing at a time. A directory sorts as if its name ended in
+    ``/`` so the walk matches a flat sort of the full names.
+    """
+    storage = storage or default_storage
+    try:
+        dirs, files = storage.listdir(prefix)
+    except FileNotFoundError:
+        return
+    entries = [(name, True) for name in dirs] + [(name, False) for name in files]
+    for name, is_dir in sorted(entries, key=_listing_key):
+        path = f'{prefix}/{name}'
+        if is_dir:
+            yield from stored_names(path, storage)
+        else:
+            yield path
+
+
+def _ordered(field):
+    # SQLite compares text byte-wise, which matches Python's ordering; PostgreSQL needs the C collation.
+    if connection.vendor == 'postgresql':
+        return Collate(F(field), 'C')
+    return F(field)
+
+
+def referenced_names():
+    """Yield every file name referenced by a row, in plain string order, without duplicates."""
+    streams = [
+        model.objects.exclude(**{field: ''}).order_by(_ordered(field).asc())
+        .values_list(field, flat=True).iterator(chunk_size=2000)
+        for model, field in FILE_REFERENCES
+    ]
+    previous = None
+    for name in heapq.merge(*streams):
+        if name != previous:
+            yield name
+            previous = name
+
+
+def diff_sorted(stored, referenced):
+    """
+    Walk two sorted name streams once, yielding ``('orphan', name)`` for
+    stored files no row references and ``('missing', name)`` for referenced
+    files absent from storage.
+    """
+    stored = iter(stored)
+    referenced = iter(referenced)
+    a = next(stored, None)
+    b = next(referenced, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a < b):
+            yield 'orphan', a
+            a = next(stored, None)
+        elif a is None or b < a:
+            yield 'missing', b
+            b = next(referenced, None)
+        else:
+            a = next(stored, None)
+            b = next(referenced, None)
+
+
+def reconcile(grace=timedelta(hours=24), batch_size=500, storage=None, dry_run=False, prefixes=None):
+    """
+    Compare the media tree against the file references in the database and
+    delete orphaned files older than ``grace`` in batches of ``batch_size``.
+    The grace period covers uploads whose row has not committed yet. Yields
+    ``(kind, names)`` batches, with kind ``'orphan'`` or ``'missing'``.
+    """
+    storage = storage or default_storage
+    cutoff = timezone.now() - grace
+    prefixes = sorted(prefixes or MEDIA_PREFIXES)
+    stored = heapq.merge(*(stored_names(prefix, storage) for prefix in prefixes))
+    referenced = (name for name in referenced_names() if name.split('/', 1)[0] in prefixes)
+    pending = {'orphan': [], 'missing': []}
+    for kind, name in diff_sorted(stored, referenced):
+        if kind == 'orphan' and storage.get_modified_time(name) > cutoff:
+            continue
+        pending[kind].append(name)
+        if len(pending[kind]) >= batch_size:
+            yield kind, _flush(kind, pending[kind], storage, dry_run)
+            pending[kind] = []
+    for kind, names in pending.items():
+        if names:
+            yield kind, _flush(kind, names, storage, dry_run)
+
+
+def _flush(kind, names, storage, dry_run):
+    if kind == 'orphan' and not dry_run:
+        for name in names:
+            storage.delete(name)
+    return names
@@ -0,0 +1,48 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+def _take(iterator, size):
+    """Join parts from ``iterator`` up to at least ``size`` bytes; ``b''`` once it is exhausted."""
+    parts = []
+    length = 0
+    for part in iterator:
+        part = part.encode() if isinstance(part, str) else bytes(part)
+        parts.append(part)
+        length += len(part)
+        if length >= size:
+            break
+    return b''.join(parts)
+
+
+async def aiterate(iterator, size=None):
+    """
+    Serve the sync ``iterator`` as async content. Parts are produced on the
+    request's thread, where its database cursor lives, and handed over
+    ``size`` bytes at a time, so memory stays bounded by one piece.
+    """
+    size = size or settings.STREAMING_CHUNK_BYTES
+    iterator = iter(iterator)
+    take = sync_to_async(_take, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await take(iterator, size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def streaming_response(request, iterator, **kwargs):
+    """
+    A ``StreamingHttpResponse`` that streams under either server. Over ASGI
+    Django reads a sync iterator with ``sync_to_async(list)``, buffering the
+    whole body, so the content is made async there; WSGI gets it as is.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        iterator = aiterate(iterator)
+    return StreamingHttpResponse(iterator, **kwargs)
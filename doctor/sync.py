@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment, ArchivedPrescription, ChangeLog, Consent, PrescriptionUpload
+from .serializers import AppointmentSerializer, ConsentSerializer, PrescriptionUploadSerializer
+
+# Change log model label -> (model, serializer, response key)
+SYNCED = {
+    'appointment': (Appointment, AppointmentSerializer, 'appointments'),
+    'consent': (Consent, ConsentSerializer, 'consents'),
+    'prescription': (PrescriptionUpload, PrescriptionUploadSerializer, 'prescriptions'),
+}
+LABELS = {model: label for label, (model, _, _) in SYNCED.items()}
+# Archiving moves rows to these tables without a change log entry; they still exist for the client.
+ARCHIVES = {
+    'appointment': ArchivedAppointment,
+    'prescription': ArchivedPrescription,
+}
+
+
+class ResyncRequired(Exception):
+    """The client's token predates the retained change log; it must download everything again."""
+
+
+def record_changes(instances, action='upsert'):
+    """Append one change log entry per instance of a synced model."""
+    ChangeLog.objects.bulk_create([
+        ChangeLog(doctor_id=instance.doctor_id, model=LABELS[type(instance)], object_id=instance.pk, action=action)
+        for instance in instances
+    ])
+
+
+def token_expired(since):
+    """Whether change log entries after ``since`` may already have been pruned."""
+    # Pruning always keeps the newest entry, so a gap below the oldest id means entries were pruned.
+    oldest = ChangeLog.objects.aggregate(oldest=Min('id'))['oldest']
+    return oldest is not None and since < oldest - 1
+
+
+def current_token():
+    """Token to take before a full download; syncing from it later returns everything changed since."""
+    last = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first()
+    return str(last or 0)
+
+
+def changes_since(doctor, since, limit=None):
+    """
+    Rows of ``doctor`` changed after sequence number ``since``: created or
+    updated rows, archived ones included, the ids of deleted ones, and the
+    token to pass next time.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    if token_expired(since):
+        raise ResyncRequired('Sync token has expired; download all records again.')
+
+    entries = list(
+        ChangeLog.objects.filter(doctor_id=doctor.id, id__gt=since)
+        .order_by('id').values_list('id', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = OrderedDict()
+    for _, label, object_id, action in entries:
+        latest.pop((label, object_id), None)
+        latest[(label, object_id)] = action
+
+    changes = {key: [] for _, _, key in SYNCED.values()}
+    deleted = {key: [] for _, _, key in SYNCED.values()}
+    for label, (model, serializer_class, key) in SYNCED.items():
+        upserted = [object_id for (kind, object_id), action in latest.items() if kind == label and action == 'upsert']
+        rows = {row.pk: row for row in model.objects.filter(pk__in=upserted, doctor=doctor)} if upserted else {}
+        missing = [pk for pk in upserted if pk not in rows]
+        if missing and label in ARCHIVES:
+            rows.update((row.pk, row) for row in ARCHIVES[label].objects.filter(pk__in=missing, doctor=doctor))
+        changes[key] = serializer_class([rows[pk] for pk in upserted if pk in rows], many=True).data
+        # Rows gone before this read count as deleted even if their delete entry is on a later page.
+        deleted[key] = [
+            object_id for (kind, object_id), action in latest.items()
+            if kind == label and (action == 'delete' or object_id not in rows)
+        ]
+
+    return {
+        'token': str(entries[-1][0] if entries else max(since, 0)),
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': deleted,
+    }
+
+
+def prune(days, now=None):
+    """
+    Delete change log entries older than ``days``, always keeping the newest
+    one so expired tokens stay detectable. Returns how many were removed.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    newest = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first()
+    if newest is None:
+        return 0
+    deleted, _ = ChangeLog.objects.filter(created_at__lt=cutoff, id__lt=newest).delete()
+    return deleted
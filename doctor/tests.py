@@ -0,0 +1,1330 @@
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest import addModuleCleanup, mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.client import encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from storages.backends.s3 import S3Storage
+
+from . import archive, audit, batch, benchmarks, compression, metrics, normalization, profiling, stats, storage, sync
+from .authentication import DoctorTokenObtainPairSerializer, is_revoked, revoke_tokens
+from .consents import request_consents
+from .middleware import CompressionMiddleware, QueryInstrumentationMiddleware
+from .serializers import DoctorPublicPreviewSerializer
+from .models import (
+    AccessLog, AccessLogArchive, Appointment, ArchivedAppointment, ArchivedMedicalNote, ArchivedPrescription, ChangeLog, Consent, Doctor,
+    DoctorDailyStats, DoctorProfile, DoctorStats, MediaTombstone, MediaVariant, MedicalNote, PatientHistory, PrescriptionUpload, UploadSession,
+)
+from .seeding import clear_seed_data, seed
+from .timeline import patient_timeline
+
+# Seeded data sets every route is measured against; query counts must match across them.
+BUDGET_SIZES = ['small', 'medium']
+BUDGET_ITERATIONS = int(os.getenv('BUDGET_ITERATIONS', '3'))
+# Written when set: the measurements in the bench_endpoints report format, plus the budgets and any violations.
+BUDGET_REPORT = os.getenv('BUDGET_REPORT')
+# Multiplies every time budget, for slow or shared CI machines.
+BUDGET_TIME_SCALE = float(os.getenv('BUDGET_TIME_SCALE', '1'))
+
+# Most queries a single call of each route may issue, at any data size.
+QUERY_BUDGETS = {
+    'GET api-root': 0,
+    'GET doctor-public-preview-list': 1,
+    'GET doctor-public-preview': 1,
+    'POST doctor-onboarding': 8,
+    'GET doctor-admin-list': 1,
+    # Appointments and prescriptions are read from the hot and archive tables.
+    'GET doctor-export': 2,
+    'GET sync': 2,
+    'POST batch': 9,
+    'GET doctor-stats': 2,
+    'GET metrics': 0,
+    'GET audit-patient': 2,
+    'GET audit-patient-logs': 2,
+    'GET audit-top-viewers': 1,
+    # The status change also upserts a token revocation row, in its own transaction.
+    'PATCH doctor-admin': 5,
+    'PUT doctor-profile': 1,
+    'GET patient-history': 7,
+    # One indexed query per source, each history section and archive table included.
+    'GET patient-timeline': 15,
+    'GET appointment-list': 1,
+    'POST appointment-list': 7,
+    'PUT appointment-detail': 7,
+    'PATCH appointment-detail': 7,
+    'GET appointment-notes': 2,
+    'POST appointment-notes': 2,
+    'GET medical-note-search': 2,
+    'GET consent-list': 1,
+    'POST consent-list': 7,
+    'POST consent-bulk': 5,
+    'PUT consent-detail': 6,
+    'POST prescription-upload': 10,
+    'POST upload-session-list': 1,
+    'GET upload-session': 1,
+    'PUT upload-session': 2,
+    'POST upload-session-complete': 2,
+    'GET prescription-detail': 1,
+    'GET prescription-download': 1,
+    'GET doctor-document': 1,
+    'DELETE prescription-detail': 10,
+}
+
+# Slowest allowed call in milliseconds; routes not listed get the default.
+TIME_BUDGET_MS = 250
+TIME_BUDGETS_MS = {
+    # Password hashing dominates.
+    'POST doctor-onboarding': 2000,
+    'POST batch': 500,
+    'POST consent-bulk': 500,
+}
+
+
+# Tests never write to the configured revocation cache, which a deployment on the same box shares.
+isolated_caches = override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'test_token_revocations': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-token-revocations',
+        },
+    },
+    TOKEN_REVOCATION_CACHE='test_token_revocations',
+)
+
+
+def setUpModule():
+    # Notifications are console prints for now; keep them out of the test output.
+    for module in ('doctor.notifications', 'doctor.views'):
+        patcher = mock.patch(f'{module}.print', create=True)
+        patcher.start()
+        addModuleCleanup(patcher.stop)
+
+
+def clear_caches():
+    # Rolled back tests hand out the same ids again; stale revocations would carry over.
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def make_doctor(n, status='approved'):
+    user = User.objects.create_user(f'test-doctor-{n}', f'test-doctor-{n}@livesure.test', 'test-password')
+    return Doctor.objects.create(
+        user=user, name=f'Test Doctor {n}', email=user.email, mobile=f'6{n:09d}', specialty='Cardiology',
+        govt_id='test/govt_id.pdf', medical_certificate='test/medical_certificate.pdf', reg_id=f'TEST-{n}',
+        status=status,
+    )
+
+
+def bearer_client(user):
+    """A client sending an access token with the principal claims of ``user``."""
+    client = APIClient()
+    access = DoctorTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    return client
+
+
+def time_budget(label):
+    return TIME_BUDGETS_MS.get(label, TIME_BUDGET_MS) * BUDGET_TIME_SCALE
+
+
+def budget_violations(report):
+    """Human-readable breaches of the query and time budgets, and of constant query counts across sizes."""
+    violations = []
+    counts = {}
+    for size, result in report['sizes'].items():
+        for label, measured in result['routes'].items():
+            counts.setdefault(label, {})[size] = measured['queries']
+            if measured['queries'] > QUERY_BUDGETS[label]:
+                violations.append(f"[{size}] {label}: {measured['queries']} queries, budget {QUERY_BUDGETS[label]}")
+            if measured['max_ms'] > time_budget(label):
+                violations.append(f"[{size}] {label}: {measured['max_ms']}ms, budget {time_budget(label):g}ms")
+            if any(code >= 500 for code in measured['status']):
+                violations.append(f"[{size}] {label}: status {measured['status']}")
+    for label, per_size in counts.items():
+        if len(set(per_size.values())) > 1:
+            violations.append(f'{label}: query count grows with data, {per_size}')
+    return violations
+
+
+# Sub-requests run inline, so their queries are counted on this connection.
+@isolated_caches
+@override_settings(BATCH_MAX_WORKERS=1)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Every route in ``benchmarks.ROUTES`` measured against seeded data sets of
+    several sizes. A route may not exceed its query or time budget, and its
+    query count may not change with the number of rows.
+    """
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(benchmarks.uncovered_routes(), [])
+        labels = {route.label for route in benchmarks.ROUTES}
+        self.assertEqual(sorted(labels - set(QUERY_BUDGETS)), [])
+        self.assertEqual(sorted(set(QUERY_BUDGETS) - labels), [])
+
+    def test_budgets_hold_at_every_size(self):
+        report = {'meta': benchmarks.report_meta(BUDGET_ITERATIONS, 0), 'sizes': {}}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, UPLOAD_SESSION_DIR=os.path.join(media_root, 'uploads_tmp'),
+                UPLOAD_SESSION_RATE=None):
+            for size in BUDGET_SIZES:
+                call_command('flush', interactive=False, verbosity=0)
+                report['sizes'][size] = benchmarks.run_size(size, BUDGET_ITERATIONS, warmup=1)
+
+        violations = budget_violations(report)
+        if BUDGET_REPORT:
+            report['budgets'] = {
+                label: {'queries': queries, 'max_ms': time_budget(label)} for label, queries in QUERY_BUDGETS.items()
+            }
+            report['violations'] = violations
+            benchmarks.write_report(report, BUDGET_REPORT)
+        self.assertFalse(violations, 'Budget violations:\n' + '\n'.join(violations))
+
+
+@isolated_caches
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        self.admin = User.objects.create_user('test-admin', 'test-admin@livesure.test', 'x', is_staff=True)
+
+    def test_deactivation_revokes_tokens(self):
+        client = bearer_client(self.doctor.user)
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 200)
+        self.doctor.user.is_active = False
+        self.doctor.user.save()
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 401)
+
+    def test_demotion_revokes_tokens(self):
+        client = bearer_client(self.admin)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 401)
+        self.assertEqual(client.get(reverse('doctor-admin-list')).status_code, 401)
+        self.assertEqual(bearer_client(self.admin).get(reverse('metrics')).status_code, 403)
+
+    def test_deleting_a_user_revokes_tokens(self):
+        client = bearer_client(self.doctor.user)
+        self.doctor.user.delete()
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 401)
+
+    def test_unrelated_saves_keep_tokens(self):
+        client = bearer_client(self.doctor.user)
+        self.doctor.user.first_name = 'Renamed'
+        self.doctor.user.save()
+        User.objects.get(pk=self.doctor.user_id).save(update_fields=['last_login'])
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 200)
+
+    def test_tokens_issued_just_before_a_revocation_are_rejected(self):
+        client = bearer_client(self.doctor.user)
+        revoke_tokens(self.doctor.user_id)
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 401)
+        self.assertEqual(bearer_client(self.doctor.user).get(reverse('consent-list')).status_code, 200)
+
+    def test_revocations_survive_cache_eviction(self):
+        client = bearer_client(self.doctor.user)
+        revoke_tokens(self.doctor.user_id)
+        clear_caches()
+        self.assertTrue(is_revoked(self.doctor.user_id, time.time() - 1))
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 401)
+
+    def test_approval_revokes_and_refresh_picks_up_the_new_status(self):
+        pending = make_doctor(2, status='pending')
+        refresh = DoctorTokenObtainPairSerializer.get_token(pending.user)
+        client = bearer_client(pending.user)
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 403)
+        admin = APIClient()
+        admin.force_authenticate(user=self.admin)
+        response = admin.patch(reverse('doctor-admin', kwargs={'pk': pending.pk}), {'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 401)
+
+        response = APIClient().post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(client.get(reverse('consent-list')).status_code, 200)
+
+    def test_inactive_user_cannot_refresh(self):
+        refresh = DoctorTokenObtainPairSerializer.get_token(self.doctor.user)
+        User.objects.filter(pk=self.doctor.user_id).update(is_active=False)
+        response = APIClient().post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+@isolated_caches
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.doctor.user)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        uploads_dir = override_settings(MEDIA_ROOT=media.name, UPLOAD_SESSION_DIR=os.path.join(media.name, 'uploads'))
+        uploads_dir.enable()
+        self.addCleanup(uploads_dir.disable)
+
+    def book(self, key, days=3):
+        day = (timezone.localdate() + timedelta(days=days)).isoformat()
+        return self.client.post(reverse('appointment-list'), {'date': day, 'time': '10:00', 'mode': 'online'},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.book('booking-1')
+        retry = self.book('booking-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], first.data['id'])
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_reused_key_with_a_different_body_is_rejected(self):
+        self.assertEqual(self.book('booking-1', days=3).status_code, 201)
+        response = self.book('booking-1', days=4)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_multipart_retry_with_a_new_boundary_replays(self):
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, patient_id=uuid.uuid4(), date=timezone.localdate(), time='09:00', status='accepted',
+        )
+        responses = []
+        for boundary in ('BoundaryOfTheFirstAttempt0001', 'BoundaryOfTheSecondAttempt002'):
+            upload = SimpleUploadedFile('prescription.pdf', benchmarks.PDF_BYTES, content_type='application/pdf')
+            body = encode_multipart(boundary, {
+                'appointment': appointment.id, 'patient_id': str(appointment.patient_id), 'file': upload,
+            })
+            responses.append(self.client.post(
+                reverse('prescription-upload'), body, content_type=f'multipart/form-data; boundary={boundary}',
+                HTTP_IDEMPOTENCY_KEY='prescription-1',
+            ))
+        self.assertEqual(responses[0].status_code, 201)
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(appointment.prescriptions.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.assertEqual(self.book('booking-1').status_code, 201)
+        self.client.force_authenticate(user=make_doctor(2).user)
+        response = self.book('booking-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_anonymous_keys_must_be_random_uuids(self):
+        body = {'filename': 'report.pdf', 'size': 10, 'sha256': hashlib.sha256(b'0123456789').hexdigest()}
+        anonymous = APIClient()
+        for key in ('upload-1', str(uuid.uuid1())):
+            response = anonymous.post(reverse('upload-session-list'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+        key = str(uuid.uuid4())
+        first = anonymous.post(reverse('upload-session-list'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        retry = anonymous.post(reverse('upload-session-list'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.json()['id'], first.data['id'])
+        self.assertEqual(UploadSession.objects.count(), 1)
+
+
+@isolated_caches
+class UploadSessionTests(TestCase):
+    DATA = b'%PDF-1.4\n' + b'0123456789' * 20
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        uploads_dir = override_settings(UPLOAD_SESSION_DIR=media.name)
+        uploads_dir.enable()
+        self.addCleanup(uploads_dir.disable)
+
+    def create(self, client=None, data=DATA):
+        body = {'filename': 'report.pdf', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+        return (client or self.client).post(reverse('upload-session-list'), body, format='json')
+
+    def put(self, session_id, offset, chunk, **headers):
+        return self.client.put(
+            reverse('upload-session', kwargs={'pk': session_id}), chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **headers,
+        )
+
+    def test_chunks_resume_from_the_stored_offset(self):
+        session_id = self.create().data['id']
+        self.assertEqual(self.put(session_id, 0, self.DATA[:100]).status_code, 200)
+
+        response = self.client.get(reverse('upload-session', kwargs={'pk': session_id}))
+        self.assertEqual(response['Upload-Offset'], '100')
+        self.assertEqual(self.put(session_id, 100, self.DATA[100:]).status_code, 200)
+        complete = self.client.post(reverse('upload-session-complete', kwargs={'pk': session_id}))
+        self.assertEqual(complete.data['status'], 'complete')
+
+    def test_offset_mismatch_reports_the_current_offset(self):
+        session_id = self.create().data['id']
+        self.put(session_id, 0, self.DATA[:100])
+        response = self.put(session_id, 50, self.DATA[50:100])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '100')
+
+    def test_checksum_failure_releases_the_chunk(self):
+        session_id = self.create().data['id']
+        response = self.put(session_id, 0, self.DATA[:100], HTTP_UPLOAD_CHECKSUM=hashlib.sha256(b'other').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get(id=session_id).offset, 0)
+        checksum = hashlib.sha256(self.DATA[:100]).hexdigest()
+        self.assertEqual(self.put(session_id, 0, self.DATA[:100], HTTP_UPLOAD_CHECKSUM=checksum).status_code, 200)
+
+    def test_complete_rejects_a_file_that_does_not_match(self):
+        session_id = self.create(data=self.DATA).data['id']
+        self.put(session_id, 0, self.DATA[:-1] + b'!')
+        response = self.client.post(reverse('upload-session-complete', kwargs={'pk': session_id}))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(UploadSession.objects.get(id=session_id).status, 'open')
+
+    def test_delete_consumes_the_session_and_its_file(self):
+        session_id = self.create().data['id']
+        part = os.path.join(settings.UPLOAD_SESSION_DIR, f'{session_id}.part')
+        self.assertTrue(os.path.exists(part))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('upload-session', kwargs={'pk': session_id}))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(UploadSession.objects.get(id=session_id).status, 'consumed')
+        self.assertFalse(os.path.exists(part))
+
+    def test_sessions_of_a_user_are_hidden_from_others(self):
+        owner = APIClient()
+        owner.force_authenticate(user=make_doctor(1).user)
+        session_id = self.create(client=owner).data['id']
+        other = APIClient()
+        other.force_authenticate(user=make_doctor(2).user)
+        for client in (other, self.client):
+            url = reverse('upload-session', kwargs={'pk': session_id})
+            self.assertEqual(client.get(url).status_code, 404)
+            self.assertEqual(client.delete(url).status_code, 404)
+        self.assertEqual(owner.get(reverse('upload-session', kwargs={'pk': session_id})).status_code, 200)
+
+    @override_settings(UPLOAD_SESSION_RATE='2/hour')
+    def test_session_creation_is_throttled(self):
+        self.assertEqual([self.create().status_code for _ in range(3)], [201, 201, 429])
+
+    @override_settings(UPLOAD_ANONYMOUS_OPEN_MAX=1)
+    def test_open_anonymous_sessions_are_capped(self):
+        self.assertEqual(self.create().status_code, 201)
+        self.assertEqual(self.create().status_code, 429)
+        signed_in = APIClient()
+        signed_in.force_authenticate(user=make_doctor(1).user)
+        self.assertEqual(self.create(client=signed_in).status_code, 201)
+
+
+@isolated_caches
+class AuditTopViewersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('test-admin', is_staff=True))
+
+    def test_limit_is_clamped(self):
+        for limit in ('-1', '0', '1000'):
+            response = self.client.get(reverse('audit-top-viewers'), {'limit': limit})
+            self.assertEqual(response.status_code, 200, limit)
+        self.assertEqual(self.client.get(reverse('audit-top-viewers'), {'limit': 'all'}).status_code, 400)
+
+
+class SeedingTests(TestCase):
+    def test_flush_then_reseed_with_the_same_seed(self):
+        sizes = dict(doctors=3, appointments_per_doctor=5, patients_per_doctor=4, history_entries=3,
+                     access_logs_per_patient=1, prescriptions_per_doctor=1, file_size_kb=0, seed=7)
+        first = seed(**sizes)
+        list(archive.archive_appointments(timezone.localdate() + timedelta(days=365)))
+        self.assertTrue(ArchivedAppointment.objects.exists())
+
+        clear_seed_data()
+        self.assertFalse(PatientHistory.objects.exists())
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        second = seed(**sizes)
+        self.assertEqual(second['histories'], first['histories'])
+
+    def test_seed_load_refuses_to_reseed_without_flush(self):
+        options = dict(doctors=2, appointments=2, patients=2, history_entries=1, access_logs=1, prescriptions=1,
+                       file_kb=0, seed=3, stdout=io.StringIO())
+        call_command('seed_load', **options)
+        with self.assertRaisesMessage(CommandError, 'pass --flush'):
+            call_command('seed_load', **options)
+        call_command('seed_load', flush=True, **options)
+        self.assertEqual(Doctor.objects.count(), 2)
+
+
+@isolated_caches
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        for n in range(3):
+            DoctorProfile.objects.create(doctor=make_doctor(n), bio=f'Bio {n}')
+        self.client = APIClient()
+
+    def preview(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctor-public-preview-list') + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        return response.json(), queries[0]['sql']
+
+    def test_unknown_names_are_rejected(self):
+        for query in ('?fields=id,govt_id', '?include=history'):
+            response = self.client.get(reverse('doctor-public-preview-list') + query)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Unknown', response.json()['error'])
+
+    def test_fields_narrow_the_loaded_columns(self):
+        data, sql = self.preview('?fields=id,name')
+        self.assertEqual(set(data[0]), {'id', 'name'})
+        self.assertIn('"doctor_doctor"."name"', sql)
+        self.assertNotIn('clinic_address', sql)
+        self.assertNotIn('doctor_doctorprofile', sql)
+
+    def test_included_sections_are_joined(self):
+        data, sql = self.preview('?fields=id&include=profile')
+        self.assertEqual(sorted(row['profile']['bio'] for row in data), ['Bio 0', 'Bio 1', 'Bio 2'])
+        self.assertIn('JOIN "doctor_doctorprofile"', sql)
+        self.assertNotIn('clinic_address', sql)
+
+    def test_the_serializer_is_built_once(self):
+        get_fields = DoctorPublicPreviewSerializer.get_fields
+        with mock.patch.object(DoctorPublicPreviewSerializer, 'get_fields', autospec=True, side_effect=get_fields) as built:
+            DoctorPublicPreviewSerializer.fieldset({'fields': 'id,profile'})
+        self.assertEqual(built.call_count, 1)
+
+
+# A zone ahead of UTC, so uploads on either side of local midnight fall on different UTC and local days.
+@isolated_caches
+@override_settings(TIME_ZONE='Asia/Kolkata')
+class DoctorStatsTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+
+    def snapshot(self):
+        totals = list(DoctorStats.objects.values('doctor_id', *stats.COUNTERS))
+        daily = list(
+            DoctorDailyStats.objects.exclude(**{name: 0 for name in stats.COUNTERS})
+            .values('doctor_id', 'date', *stats.COUNTERS).order_by('doctor_id', 'date')
+        )
+        return totals, daily
+
+    def test_incremental_counters_match_a_rebuild(self):
+        today = timezone.localdate()
+        appointments = [
+            Appointment.objects.create(
+                doctor=self.doctor, patient_id=uuid.uuid4(), date=today + timedelta(days=i % 2), time='09:00',
+            )
+            for i in range(5)
+        ]
+        appointments[0].status = 'accepted'
+        appointments[0].save()
+        rescheduled = Appointment.objects.only('id').get(pk=appointments[1].pk)
+        rescheduled.status, rescheduled.date = 'rejected', today + timedelta(days=3)
+        rescheduled.save()
+        appointments[2].delete()
+        appointments[3].status = 'no-show'
+        appointments[3].save()
+
+        midnight = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        prescriptions = []
+        for offset in (timedelta(minutes=-1), timedelta(minutes=1), timedelta(minutes=2)):
+            with mock.patch('django.utils.timezone.now', return_value=midnight + offset):
+                prescriptions.append(PrescriptionUpload.objects.create(
+                    doctor=self.doctor, patient_id=appointments[0].patient_id, appointment=appointments[0],
+                    file='prescriptions/stats.pdf',
+                ))
+        prescriptions[2].delete()
+        archive.archive_batch([appointments[3].id])
+
+        incremental = self.snapshot()
+        days = {row['date']: row['prescriptions'] for row in incremental[1] if row['prescriptions']}
+        self.assertEqual(days, {today - timedelta(days=1): 1, today: 1})
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+
+@isolated_caches
+class BulkConsentTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+
+    def test_rows_created_elsewhere_are_not_reported_as_created(self):
+        new, old = uuid.uuid4(), uuid.uuid4()
+        # Stamped after this call starts, like a consent another request inserted concurrently.
+        Consent.objects.create(doctor=self.doctor, patient_id=old)
+        Consent.objects.filter(patient_id=old).update(created_at=timezone.now() + timedelta(minutes=5))
+        ChangeLog.objects.all().delete()
+
+        with mock.patch('doctor.consents.send_consent_requests') as notify, \
+                self.captureOnCommitCallbacks(execute=True):
+            created, existing = request_consents(self.doctor, [new, old, new])
+
+        self.assertEqual([row.patient_id for row in created], [new])
+        self.assertEqual([row.patient_id for row in existing], [old])
+        notify.assert_called_once_with(self.doctor, [new])
+        self.assertEqual(list(ChangeLog.objects.values_list('object_id', flat=True)), [created[0].id])
+
+    def test_batches_follow_the_backend_limit(self):
+        existing = Consent.objects.create(doctor=self.doctor, patient_id=uuid.uuid4())
+        patients = [uuid.uuid4() for _ in range(4)]
+        with mock.patch.object(connection.ops, 'bulk_batch_size', return_value=1), \
+                mock.patch('doctor.consents.send_consent_requests'):
+            created, found = request_consents(self.doctor, [existing.patient_id, *patients])
+        self.assertEqual([row.patient_id for row in created], patients)
+        self.assertEqual(found, [existing])
+
+    def test_backends_without_bulk_returning_compare_creation_times(self):
+        existing = Consent.objects.create(doctor=self.doctor, patient_id=uuid.uuid4())
+        new = uuid.uuid4()
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+            return_value=False,
+        ), \
+                mock.patch('doctor.consents.send_consent_requests'):
+            created, found = request_consents(self.doctor, [existing.patient_id, new])
+        self.assertEqual([row.patient_id for row in created], [new])
+        self.assertEqual(found, [existing])
+
+    def test_endpoint_reports_created_and_existing(self):
+        client = APIClient()
+        client.force_authenticate(user=self.doctor.user)
+        patients = [str(uuid.uuid4()) for _ in range(3)]
+        first = client.post(reverse('consent-bulk'), {'patient_ids': patients[:2]}, format='json')
+        second = client.post(reverse('consent-bulk'), {'patient_ids': patients}, format='json')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(len(first.data['created']), 2)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual([row['patient_id'] for row in second.data['created']], patients[2:])
+        self.assertEqual(len(second.data['existing']), 2)
+        self.assertEqual(Consent.objects.filter(doctor=self.doctor, status='pending').count(), 3)
+
+
+@isolated_caches
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminSearchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(User.objects.create_superuser('test-admin', 'test-admin@livesure.test', 'x'))
+        today = timezone.localdate()
+        self.ours = Appointment.objects.create(doctor=make_doctor(1), date=today, time='09:00')
+        self.theirs = Appointment.objects.create(doctor=make_doctor(2), date=today, time='10:00')
+        Doctor.objects.filter(pk=self.theirs.doctor_id).update(name='Another Name')
+
+    def test_doctor_name_prefix_is_resolved_before_touching_appointments(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('admin:doctor_appointment_changelist'), {'q': 'test doc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [self.ours])
+        appointment_queries = [query['sql'] for query in captured if 'FROM "doctor_appointment"' in query['sql']]
+        self.assertTrue(appointment_queries)
+        for sql in appointment_queries:
+            self.assertNotIn('LIKE', sql)
+
+    def test_id_and_uuid_search(self):
+        url = reverse('admin:doctor_appointment_changelist')
+        response = self.client.get(url, {'q': str(self.theirs.patient_id)})
+        self.assertEqual(list(response.context['cl'].result_list), [self.theirs])
+        response = self.client.get(url, {'q': str(self.ours.id)})
+        self.assertEqual(list(response.context['cl'].result_list), [self.ours])
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor(1)
+        self.patient_id = uuid.uuid4()
+        self.today = timezone.localdate()
+        for days in range(0, 18, 3):
+            Appointment.objects.create(
+                doctor=self.doctor, patient_id=self.patient_id, date=self.today - timedelta(days=days), time='09:30',
+            )
+        self.history = PatientHistory.objects.create(
+            patient_id=self.patient_id,
+            reports=self.entries(range(0, 20, 2), 'report'),
+            # Undated entries are left out; same-day entries of different sections tie-break on section.
+            visits=self.entries(range(0, 20, 4), 'visit') + [{'note': 'undated'}, 'not an entry'],
+            prescriptions=self.entries(range(0, 20, 5), 'prescription'),
+        )
+
+    def entries(self, days, label):
+        return [{'date': (self.today - timedelta(days=day)).isoformat(), 'label': f'{label} {day}'} for day in days]
+
+    def pages(self, limit):
+        items, cursor = [], None
+        while True:
+            page = patient_timeline(self.doctor, self.patient_id, cursor, limit)
+            items += page['results']
+            cursor = page['next_cursor']
+            if cursor is None:
+                return items
+
+    def test_pages_cover_every_entry_once_in_order(self):
+        everything = patient_timeline(self.doctor, self.patient_id, limit=100)['results']
+        self.assertEqual(len(everything), 6 + 10 + 5 + 4)
+        keys = [(item['timestamp'], item['type']) for item in everything]
+        self.assertEqual(keys, sorted(keys, key=lambda key: key[0], reverse=True))
+        for limit in (1, 3, 7):
+            self.assertEqual(self.pages(limit), everything)
+
+    def test_page_cost_does_not_grow_with_the_history(self):
+        with CaptureQueriesContext(connection) as small:
+            patient_timeline(self.doctor, self.patient_id, limit=5)
+        self.history.reports = self.entries(range(0, 2000), 'report')
+        self.history.save()
+        with CaptureQueriesContext(connection) as large:
+            page = patient_timeline(self.doctor, self.patient_id, limit=5)
+        self.assertEqual(len(large), len(small))
+        labels = [item['data'].get('label') for item in page['results'] if item['type'] != 'appointment']
+        self.assertEqual(labels[:3], ['prescription 0', 'visit 0', 'report 0'])
+
+    def test_saving_the_history_reindexes_it(self):
+        self.history.reports = []
+        self.history.save()
+        items = patient_timeline(self.doctor, self.patient_id, limit=100)['results']
+        self.assertNotIn('report', {item['type'] for item in items})
+        self.assertEqual(len(items), 6 + 5 + 4)
+
+
+@isolated_caches
+@override_settings(STREAMING_CHUNK_BYTES=4096)
+class AsgiStreamingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        Appointment.objects.bulk_create(
+            Appointment(doctor=self.doctor, date=timezone.localdate(), time='09:30', rejection_reason='rescheduled ' * 20)
+            for _ in range(500)
+        )
+        access = DoctorTokenObtainPairSerializer.get_token(self.doctor.user).access_token
+        self.headers = {'Authorization': f'Bearer {access}'}
+        self.url = reverse('doctor-export', kwargs={'resource': 'appointments', 'fmt': 'ndjson'})
+
+    def wsgi_body(self):
+        response = bearer_client(self.doctor.user).get(self.url)
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    async def test_large_export_is_sent_in_chunks(self):
+        response = await AsyncClient().get(self.url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 10)
+        self.assertLess(max(len(chunk) for chunk in chunks), 2 * 4096)
+        self.assertEqual(b''.join(chunks), await sync_to_async(self.wsgi_body)())
+
+    async def test_compressed_export_stays_async(self):
+        response = await AsyncClient().get(
+            self.url, headers={**self.headers, 'Accept-Encoding': 'gzip'},
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(gzip.decompress(body), await sync_to_async(self.wsgi_body)())
+
+    async def test_event_stream_is_async_and_uncompressed(self):
+        response = await AsyncClient().get(
+            reverse('event-stream'), headers={**self.headers, 'Accept-Encoding': 'gzip'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        await response.streaming_content.aclose()
+
+
+@isolated_caches
+@override_settings(COMPRESSION_MIN_BYTES=1024)
+class CompressionTests(SimpleTestCase):
+    BODY = b'{"results": [' + b'{"status": "accepted"}, ' * 200 + b'{}]}'
+
+    def respond(self, accept_encoding, body=BODY, content_type='application/json'):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type=content_type))
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_negotiation_follows_q_values_then_server_preference(self):
+        encodings = ['br', 'zstd', 'gzip']
+        self.assertEqual(compression.negotiate('gzip, br', encodings), 'br')
+        self.assertEqual(compression.negotiate('gzip;q=1.0, br;q=0.5', encodings), 'gzip')
+        self.assertEqual(compression.negotiate('*;q=0.2, gzip;q=0.1', encodings), 'br')
+        self.assertEqual(compression.negotiate('br;q=0, *', encodings), 'zstd')
+        self.assertEqual(compression.negotiate('identity;q=0, gzip;q=0.3', encodings), 'gzip')
+        self.assertIsNone(compression.negotiate('identity', encodings))
+        self.assertIsNone(compression.negotiate('gzip;q=0, identity;q=0', encodings))
+        self.assertIsNone(compression.negotiate('gzip;q=abc', encodings))
+
+    def test_large_bodies_are_compressed_and_vary_on_accept_encoding(self):
+        response = self.respond('gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.BODY)
+
+    def test_refused_encodings_send_the_body_as_is(self):
+        response = self.respond('gzip;q=0, identity;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response.content, self.BODY)
+
+    def test_small_and_binary_bodies_are_left_alone(self):
+        for response in (self.respond('gzip', body=self.BODY[:1023]), self.respond('gzip', content_type='image/png')):
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertFalse(response.has_header('Vary'))
+
+
+@isolated_caches
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=2)
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.doctor.user)
+
+    def test_query_count_is_reported_in_header_and_log(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('doctor.queries') as logs:
+            response = self.client.get(reverse('consent-list'))
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertEqual([log.levelname for log in logs.records], ['INFO'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], len(queries))
+        self.assertEqual(record['view'], 'consent-list')
+        self.assertEqual(record['status'], 200)
+
+    def test_repeated_lookups_are_flagged(self):
+        def view(request):
+            return HttpResponse(str([Doctor.objects.filter(pk=pk).exists() for pk in range(4)]))
+
+        with self.assertLogs('doctor.queries', 'WARNING') as logs:
+            response = QueryInstrumentationMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('n1;desc="1 repeated query shapes"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['n_plus_one'][0]['count'], 4)
+
+
+class MultiprocessMetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        metrics.clear_directory(self.directory)
+        os.rmdir(self.directory)
+
+    def registry(self):
+        registry = metrics.Registry(self.directory)
+        self.addCleanup(atexit.unregister, registry.flush)
+        return registry
+
+    def test_a_reused_pid_keeps_the_earlier_counters(self):
+        # Two registries in one process stand in for a worker whose pid was handed on.
+        first = self.registry()
+        first.observe('doctor-list', 'GET', 200, 0.01)
+        first.flush()
+        second = self.registry()
+        second.observe('doctor-list', 'GET', 200, 0.01)
+        second.flush()
+        self.assertEqual(second.collect()['requests'], {'doctor-list|GET|200': 2})
+
+    def test_clear_directory_drops_the_previous_run(self):
+        registry = self.registry()
+        registry.observe('doctor-list', 'GET', 200, 0.01)
+        registry.flush()
+        metrics.clear_directory(self.directory)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(self.registry().collect()['requests'], {})
+
+
+@isolated_caches
+class ArchiveReaderTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        self.client = bearer_client(self.doctor.user)
+        self.patient_id = uuid.uuid4()
+        self.token = self.client.get(reverse('sync')).data['token']
+        old, self.recent = [
+            Appointment.objects.create(
+                doctor=self.doctor, patient_id=self.patient_id, date=timezone.localdate() - timedelta(days=days),
+                time='09:30',
+            )
+            for days in (400, 1)
+        ]
+        self.note = MedicalNote.objects.create(appointment=old, notes='Persistent arrhythmia on review')
+        self.prescription = PrescriptionUpload.objects.create(
+            doctor=self.doctor, patient_id=self.patient_id, appointment=old, file='prescriptions/old.pdf',
+        )
+        self.changes = ChangeLog.objects.count()
+        archive.archive_batch([old.id])
+        self.old = ArchivedAppointment.objects.get(pk=old.id)
+
+    def test_archiving_moves_the_rows_without_change_log_entries(self):
+        self.assertFalse(Appointment.objects.filter(pk=self.old.id).exists())
+        self.assertTrue(ArchivedMedicalNote.objects.filter(pk=self.note.id).exists())
+        self.assertTrue(ArchivedPrescription.objects.filter(pk=self.prescription.id).exists())
+        self.assertEqual(ChangeLog.objects.count(), self.changes)
+
+    def test_exports_merge_archived_rows_by_id(self):
+        url = reverse('doctor-export', kwargs={'resource': 'appointments', 'fmt': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(self.client.get(url).streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.old.id, self.recent.id])
+        url = reverse('doctor-export', kwargs={'resource': 'prescriptions', 'fmt': 'csv'})
+        lines = b''.join(self.client.get(url).streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.prescription.id},'))
+
+    def test_timeline_includes_archived_rows(self):
+        results = patient_timeline(self.doctor, self.patient_id, limit=10)['results']
+        self.assertEqual(
+            [(item['type'], item['data']['id']) for item in results],
+            [
+                ('prescription', self.prescription.id), ('medical_note', self.note.id),
+                ('appointment', self.recent.id), ('appointment', self.old.id),
+            ],
+        )
+
+    def test_notes_search_finds_archived_notes(self):
+        response = self.client.get(reverse('medical-note-search'), {'q': 'arrhythm'})
+        self.assertEqual([result['id'] for result in response.data['results']], [self.note.id])
+
+    def test_archived_prescription_detail_and_download(self):
+        response = self.client.get(reverse('prescription-detail', args=[self.prescription.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['appointment'], self.old.id)
+        response = self.client.get(reverse('prescription-download', args=[self.prescription.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('prescriptions/old.pdf', response['Location'])
+
+    def test_archived_appointment_notes_are_listed_but_read_only(self):
+        url = reverse('appointment-notes', args=[self.old.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([note['id'] for note in response.data['results']], [self.note.id])
+        self.assertEqual(self.client.post(url, {'notes': 'Follow-up'}).status_code, 400)
+
+    def test_sync_reports_archived_rows_as_changes(self):
+        data = self.client.get(reverse('sync'), {'since': self.token}).data
+        self.assertEqual({row['id'] for row in data['changes']['appointments']}, {self.old.id, self.recent.id})
+        self.assertEqual([row['id'] for row in data['changes']['prescriptions']], [self.prescription.id])
+        self.assertEqual(data['deleted'], {'appointments': [], 'consents': [], 'prescriptions': []})
+
+
+@isolated_caches
+class SyncTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        self.client = bearer_client(self.doctor.user)
+        self.token = self.client.get(reverse('sync')).data['token']
+
+    def appointment(self, days=1):
+        return Appointment.objects.create(
+            doctor=self.doctor, patient_id=uuid.uuid4(), date=timezone.localdate() + timedelta(days=days), time='09:30',
+        )
+
+    def sync(self, since):
+        return self.client.get(reverse('sync'), {'since': since})
+
+    def test_returns_only_what_changed_since_the_token(self):
+        kept, moved, dropped = self.appointment(), self.appointment(), self.appointment()
+        consent = Consent.objects.create(doctor=self.doctor, patient_id=uuid.uuid4())
+        Appointment.objects.create(doctor=make_doctor(2), patient_id=uuid.uuid4(), date=kept.date, time='10:00')
+        data = self.sync(self.token).data
+        self.assertEqual([row['id'] for row in data['changes']['appointments']], [kept.id, moved.id, dropped.id])
+        self.assertEqual([row['id'] for row in data['changes']['consents']], [consent.id])
+        self.assertFalse(data['has_more'])
+
+        moved.time = '11:00'
+        moved.save()
+        dropped_id = dropped.id
+        dropped.delete()
+        data = self.sync(data['token']).data
+        self.assertEqual([row['id'] for row in data['changes']['appointments']], [moved.id])
+        self.assertEqual(data['deleted']['appointments'], [dropped_id])
+        self.assertEqual(data['changes']['consents'], [])
+        self.assertEqual(self.sync(data['token']).data['changes']['appointments'], [])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_follow_has_more_without_gaps(self):
+        ids = [self.appointment(days).id for days in range(1, 6)]
+        seen, token, pages = [], self.token, 0
+        while True:
+            data = self.sync(token).data
+            seen += [row['id'] for row in data['changes']['appointments']]
+            token, pages = data['token'], pages + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, ids)
+        self.assertEqual(pages, 3)
+
+    def test_a_row_deleted_after_its_page_was_cut_is_reported_deleted(self):
+        row = self.appointment()
+        row_id = row.id
+        row.delete()
+        with override_settings(SYNC_PAGE_SIZE=1):
+            data = self.sync(self.token).data
+        self.assertEqual(data['changes']['appointments'], [])
+        self.assertEqual(data['deleted']['appointments'], [row_id])
+        self.assertTrue(data['has_more'])
+
+    def test_pruned_tokens_must_resync(self):
+        self.appointment()
+        self.appointment()
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(sync.prune(30), 1)
+        self.assertEqual(self.sync(self.token).status_code, 410)
+        self.assertEqual(self.sync(self.client.get(reverse('sync')).data['token']).status_code, 200)
+
+    def test_invalid_tokens_are_rejected(self):
+        for since in ('abc', '-1'):
+            self.assertEqual(self.sync(since).status_code, 400)
+
+
+@isolated_caches
+class ProfilingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.admin = User.objects.create_user('test-admin', 'test-admin@livesure.test', 'x', is_staff=True)
+        self.token = profiling.make_token(self.admin)
+
+    def profile(self, client, token):
+        with override_settings(PROFILING_DIR=self.directory):
+            return client.get(reverse('metrics'), HTTP_X_PROFILE_TOKEN=token)
+
+    def test_the_token_owner_is_profiled_without_sql_params(self):
+        response = self.profile(bearer_client(self.admin), self.token)
+        self.assertEqual(response.status_code, 200)
+        with open(os.path.join(self.directory, f"{response['X-Profile-Id']}.sql.json")) as handle:
+            timeline = json.load(handle)
+        self.assertEqual(timeline['profiled_by'], 'test-admin')
+        self.assertTrue(all('params' not in query for query in timeline['sql']))
+
+    def test_rejected_tokens_are_not_profiled(self):
+        other = User.objects.create_user('test-admin-2', 'test-admin-2@livesure.test', 'x', is_staff=True)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() - 7200):
+            expired = profiling.make_token(self.admin)
+        cases = [
+            (APIClient(), self.token),
+            (bearer_client(other), self.token),
+            (bearer_client(self.admin), expired),
+            (bearer_client(self.admin), self.token[:-2] + ('AA' if self.token[-2:] != 'AA' else 'BB')),
+        ]
+        for client, token in cases:
+            self.assertNotIn('X-Profile-Id', self.profile(client, token))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_the_query_string_does_not_carry_tokens(self):
+        with override_settings(PROFILING_DIR=self.directory):
+            response = bearer_client(self.admin).get(reverse('metrics'), {'_profile': self.token})
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class MediaCleanupTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = FileSystemStorage(location=self.directory)
+        self.doctor = make_doctor(1)
+        self.appointment = Appointment.objects.create(
+            doctor=self.doctor, patient_id=uuid.uuid4(), date=timezone.localdate(), time='09:30',
+        )
+
+    def store(self, name, age=timedelta(days=2)):
+        self.storage.save(name, ContentFile(b'%PDF-1.4'))
+        stamp = (timezone.now() - age).timestamp()
+        os.utime(self.storage.path(name), (stamp, stamp))
+        return name
+
+    def prescription(self, name):
+        return PrescriptionUpload.objects.create(
+            doctor=self.doctor, patient_id=self.appointment.patient_id, appointment=self.appointment, file=name,
+        )
+
+    def test_tombstones_delete_unreferenced_files_and_keep_referenced_ones(self):
+        gone, reused = self.store('prescriptions/gone.pdf'), self.store('prescriptions/reused.pdf')
+        self.prescription(reused)
+        for name in (gone, reused):
+            MediaTombstone.objects.create(name=name)
+        self.assertEqual(storage.process_tombstones(storage=self.storage, dry_run=True), (1, 1, 0))
+        self.assertTrue(self.storage.exists(gone))
+        self.assertEqual(MediaTombstone.objects.count(), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(storage.process_tombstones(batch_size=10, storage=self.storage), (1, 1, 0))
+        self.assertLessEqual(len(queries), 3 + len(storage.FILE_REFERENCES))
+        self.assertFalse(self.storage.exists(gone))
+        self.assertTrue(self.storage.exists(reused))
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_failed_deletes_stay_queued(self):
+        MediaTombstone.objects.create(name=self.store('prescriptions/locked.pdf'))
+        with mock.patch.object(self.storage, 'delete', side_effect=OSError('read-only')):
+            self.assertEqual(storage.process_tombstones(storage=self.storage), (0, 0, 1))
+        tombstone = MediaTombstone.objects.get()
+        self.assertEqual((tombstone.attempts, tombstone.last_error), (1, 'read-only'))
+
+    def test_reconcile_removes_old_orphans_and_reports_missing_files(self):
+        kept = self.store('prescriptions/kept.pdf')
+        self.prescription(kept)
+        self.prescription('prescriptions/missing.pdf')
+        orphan = self.store('prescriptions/2026/orphan.pdf')
+        fresh = self.store('prescriptions/fresh.pdf', age=timedelta(minutes=5))
+        self.assertEqual(
+            list(storage.reconcile(storage=self.storage, dry_run=True)),
+            [('orphan', [orphan]), ('missing', ['prescriptions/missing.pdf'])],
+        )
+        self.assertTrue(self.storage.exists(orphan))
+        list(storage.reconcile(storage=self.storage))
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertTrue(self.storage.exists(kept))
+        self.assertTrue(self.storage.exists(fresh))
+
+
+class NormalizationTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(MEDIA_ROOT=directory, MEDIA_IMAGE_QUALITY=50))
+        self.storage = FileSystemStorage(location=directory)
+
+    def store(self, name, data):
+        name = self.storage.save(name, ContentFile(data))
+        normalization.queue_variants([name])
+        return name
+
+    def photo(self, orientation):
+        image = Image.linear_gradient('L').resize((320, 160)).convert('RGB')
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010F] = 'Scanner model'
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=100, exif=exif)
+        return out.getvalue()
+
+    def process(self):
+        return [normalization.process_variant(variant, self.storage) for variant in normalization.claim_pending(10)]
+
+    def test_photos_are_turned_upright_and_stripped_of_metadata(self):
+        name = self.store('prescriptions/scan.jpg', self.photo(orientation=6))
+        self.assertEqual(self.process(), ['done'])
+        variant = MediaVariant.objects.get(original=name)
+        self.assertEqual(variant.name, 'prescriptions/scan.opt.jpg')
+        self.assertLess(variant.size, variant.original_size)
+        with self.storage.open(variant.name) as handle, Image.open(handle) as image:
+            self.assertEqual(image.size, (160, 320))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_files_that_do_not_shrink_keep_the_original(self):
+        out = io.BytesIO()
+        Image.new('L', (1, 1)).save(out, 'PNG', optimize=True)
+        name = self.store('prescriptions/dot.png', out.getvalue())
+        self.assertEqual(self.process(), ['skipped'])
+        self.assertEqual(MediaVariant.objects.get(original=name).name, '')
+        self.assertFalse(self.storage.exists('prescriptions/dot.opt.png'))
+        doctor = make_doctor(1)
+        Doctor.objects.filter(pk=doctor.pk).update(govt_id=name)
+        doctor = normalization.with_served_names(Doctor.objects.all(), 'govt_id').get(pk=doctor.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(normalization.served_name(doctor.govt_id), name)
+
+    def test_failed_files_are_retried_on_request(self):
+        name = self.store('prescriptions/broken.jpg', b'not an image')
+        self.assertEqual(self.process(), ['failed'])
+        self.assertIn('UnidentifiedImageError', MediaVariant.objects.get(original=name).error)
+        self.assertEqual(self.process(), [])
+
+        self.storage.delete(name)
+        self.storage.save(name, ContentFile(self.photo(orientation=1)))
+        call_command('process_uploads', retry_failed=True, stdout=io.StringIO())
+        self.assertEqual(MediaVariant.objects.get(original=name).status, 'done')
+
+    @override_settings(MEDIA_PROCESSING_TIMEOUT_MINUTES=30)
+    def test_rows_left_processing_by_a_dead_worker_are_claimed_again(self):
+        stuck, busy = (self.store(f'prescriptions/{name}.jpg', self.photo(orientation=1)) for name in ('stuck', 'busy'))
+        MediaVariant.objects.update(status='processing')
+        MediaVariant.objects.filter(original=stuck).update(claimed_at=timezone.now() - timedelta(minutes=31))
+        MediaVariant.objects.filter(original=busy).update(claimed_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual([variant.original for variant in normalization.claim_pending(10)], [stuck])
+        self.assertEqual(normalization.claim_pending(10), [])
+
+
+@isolated_caches
+class DownloadUrlTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(MEDIA_ROOT=directory, MEDIA_URL='/media/', MEDIA_URL_EXPIRY=300))
+        self.doctor = make_doctor(1)
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, patient_id=uuid.uuid4(), date=timezone.localdate(), time='09:30',
+        )
+        self.prescription = PrescriptionUpload.objects.create(
+            doctor=self.doctor, patient_id=appointment.patient_id, appointment=appointment, file='prescriptions/rx.pdf',
+        )
+        MediaVariant.objects.filter(original='prescriptions/rx.pdf').update(status='done', name='prescriptions/rx.opt.pdf')
+
+    def test_local_storage_redirects_to_the_media_url_of_the_variant(self):
+        self.assertEqual(storage.download_url(self.prescription.file), '/media/prescriptions/rx.opt.pdf')
+        client = APIClient()
+        client.force_authenticate(user=self.doctor.user)
+        response = client.get(reverse('prescription-download', kwargs={'pk': self.prescription.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/media/prescriptions/rx.opt.pdf')
+
+    def test_object_storage_gets_a_presigned_url_that_expires(self):
+        # Presigning is local, so no bucket is contacted.
+        field_file = self.prescription.file
+        field_file.storage = S3Storage(
+            bucket_name='livesure-media', access_key='test', secret_key='test', region_name='us-east-1',
+            signature_version='s3v4',
+        )
+        for expire, expected in ((None, '300'), (60, '60')):
+            url = urlsplit(storage.download_url(field_file, expire=expire))
+            query = parse_qs(url.query)
+            self.assertEqual(url.path, '/prescriptions/rx.opt.pdf')
+            self.assertEqual(query['X-Amz-Expires'], [expected])
+            self.assertEqual(query['response-content-disposition'], ['attachment; filename="rx.opt.pdf"'])
+            self.assertIn('X-Amz-Signature', query)
+
+
+@isolated_caches
+class AccessLogArchiveTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(ACCESS_LOG_ARCHIVE_DIR=directory))
+        self.admin = User.objects.create_user('test-admin', 'test-admin@livesure.test', 'x', is_staff=True)
+        self.patient_id = uuid.uuid4()
+        self.period = timezone.make_aware(timezone.datetime(2026, 1, 1))
+        for day in (3, 17):
+            log = audit.record_access(self.admin, self.patient_id)
+            AccessLog.objects.filter(pk=log.pk).update(accessed_at=self.period.replace(day=day, hour=10))
+        audit.record_access(self.admin, self.patient_id)
+
+    def entries(self, start='2026-01-01', end='2026-01-31'):
+        return bearer_client(self.admin).get(
+            reverse('audit-patient-logs', args=[self.patient_id]), {'start': start, 'end': end},
+        )
+
+    def test_archived_months_stay_queryable_and_checksummed(self):
+        manifest = audit.archive_period(self.period)
+        path = os.path.join(settings.ACCESS_LOG_ARCHIVE_DIR, manifest.path)
+        with open(path, 'rb') as handle:
+            self.assertEqual(manifest.sha256, hashlib.sha256(handle.read()).hexdigest())
+        self.assertEqual(manifest.row_count, 2)
+        self.assertEqual(AccessLog.objects.count(), 1)
+        self.assertEqual(os.listdir(settings.ACCESS_LOG_ARCHIVE_DIR), [manifest.path])
+
+        response = self.entries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['accessed_at'].day for entry in response.data['entries']], [3, 17])
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self.entries(end=today).data['entries']), 3)
+
+    def test_a_missing_archive_file_is_reported(self):
+        manifest = audit.archive_period(self.period)
+        os.remove(os.path.join(settings.ACCESS_LOG_ARCHIVE_DIR, manifest.path))
+        response = self.entries()
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('is missing', response.data['error'])
+
+    def test_a_failed_archive_leaves_no_file(self):
+        with mock.patch('doctor.audit.AccessLogArchive.objects.create', side_effect=RuntimeError('disk')):
+            with self.assertRaises(RuntimeError):
+                audit.archive_period(self.period)
+        self.assertEqual(os.listdir(settings.ACCESS_LOG_ARCHIVE_DIR), [])
+        self.assertFalse(AccessLogArchive.objects.exists())
+        self.assertEqual(AccessLog.objects.count(), 3)
+        self.assertEqual(audit.archive_period(self.period).path, 'access_logs-2026-01-part1.ndjson.gz')
+
+
+@isolated_caches
+@override_settings(BATCH_MAX_WORKERS=1)
+class BatchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.doctor = make_doctor(1)
+        self.client = bearer_client(self.doctor.user)
+        self.appointments = reverse('appointment-list')
+
+    def run_batch(self, requests):
+        return self.client.post(reverse('batch'), {'requests': requests}, format='json')
+
+    def test_a_read_after_a_write_sees_it(self):
+        date = (timezone.localdate() + timedelta(days=1)).isoformat()
+        response = self.run_batch([
+            {'method': 'POST', 'path': self.appointments, 'body': {'doctor_id': self.doctor.id, 'date': date, 'time': '09:30'}},
+            {'path': self.appointments},
+        ])
+        created, listed = response.data['responses']
+        self.assertEqual(created['status'], 201)
+        self.assertEqual([row['id'] for row in listed['body']], [created['body']['id']])
+
+    @override_settings(BATCH_MAX_WORKERS=4)
+    def test_consecutive_reads_share_the_pool_and_writes_run_alone(self):
+        groups = []
+
+        class Pool:
+            def map(self, function, items):
+                items = list(items)
+                groups.append([item['method'] for item in items])
+                return [function(item) for item in items]
+
+        # Sub-requests run on this thread, inside the test transaction.
+        with mock.patch('doctor.batch._pool', return_value=Pool()), \
+                mock.patch('doctor.batch._execute_in_thread', side_effect=batch._execute_safely):
+            response = self.run_batch([
+                {'path': self.appointments}, {'path': self.appointments},
+                {'method': 'DELETE', 'path': self.appointments + '999/'},
+                {'path': self.appointments}, {'path': reverse('consent-list')}, {'path': self.appointments},
+            ])
+        self.assertEqual(groups, [['GET', 'GET'], ['GET', 'GET', 'GET']])
+        self.assertEqual([result['id'] for result in response.data['responses']], [0, 1, 2, 3, 4, 5])
+
+    def test_a_failing_item_does_not_lose_the_others(self):
+        with mock.patch('doctor.views.archive.appointments', side_effect=RuntimeError('boom')), \
+                self.assertLogs('doctor.batch', 'ERROR'):
+            response = self.run_batch([{'path': self.appointments}, {'path': reverse('consent-list')}])
+        self.assertEqual(response.status_code, 200)
+        failed, listed = response.data['responses']
+        self.assertEqual((failed['status'], failed['body']), (500, {'error': 'Internal server error.'}))
+        self.assertEqual(listed['status'], 200)
+
+    def test_the_item_limit_is_enforced(self):
+        response = self.run_batch([{'path': self.appointments}] * (settings.BATCH_MAX_REQUESTS + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.run_batch([{'path': self.appointments}] * settings.BATCH_MAX_REQUESTS).status_code, 200)
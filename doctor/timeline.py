@@ -0,0 +1,181 @@
+import base64
+import heapq
+import json
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedMedicalNote, ArchivedPrescription, MedicalNote, PatientHistoryEntry,
+    PrescriptionUpload,
+)
+from .serializers import AppointmentSerializer, PrescriptionUploadSerializer
+
+# Ties on timestamp are broken by source rank, then id, all descending.
+SOURCES = ['appointment', 'prescription', 'medical_note', 'report', 'visit', 'history_prescription']
+RANK = {name: rank for rank, name in enumerate(SOURCES)}
+HISTORY_SECTIONS = {'report': 'reports', 'visit': 'visits', 'history_prescription': 'prescriptions'}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key):
+    ts, rank, item_id = key
+    raw = json.dumps([ts.isoformat(), rank, item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        ts, rank, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        ts = parse_datetime(ts)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid timeline cursor.')
+    if ts is None or not isinstance(rank, int) or not isinstance(item_id, int):
+        raise InvalidCursor('Invalid timeline cursor.')
+    return ts, rank, item_id
+
+
+def _aware(day, at=time.min):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def _before(source, cursor, ts_lt, ts_eq, id_field='pk'):
+    """
+    Q for rows of ``source`` whose (timestamp, rank, id) key sorts before
+    ``cursor`` in descending order, given Qs for "timestamp < cursor" and
+    "timestamp == cursor".
+    """
+    if cursor is None:
+        return Q()
+    _, rank, item_id = cursor
+    if RANK[source] < rank:
+        return ts_lt | ts_eq
+    if RANK[source] == rank:
+        return ts_lt | (ts_eq & Q(**{f'{id_field}__lt': item_id}))
+    return ts_lt
+
+
+def _appointments(model, doctor, patient_id, cursor, limit):
+    condition = Q()
+    if cursor is not None:
+        local = timezone.localtime(cursor[0])
+        condition = _before(
+            'appointment', cursor,
+            Q(date__lt=local.date()) | Q(date=local.date(), time__lt=local.time()),
+            Q(date=local.date(), time=local.time()),
+        )
+    rows = (
+        model.objects.filter(condition, doctor=doctor, patient_id=patient_id)
+        .order_by('-date', '-time', '-id')[:limit]
+    )
+    for row in rows:
+        yield (_aware(row.date, row.time), RANK['appointment'], row.id), AppointmentSerializer(row).data
+
+
+def _prescriptions(model, doctor, patient_id, cursor, limit):
+    condition = Q()
+    if cursor is not None:
+        condition = _before('prescription', cursor, Q(timestamp__lt=cursor[0]), Q(timestamp=cursor[0]))
+    rows = (
+        model.objects.filter(condition, doctor=doctor, patient_id=patient_id)
+        .order_by('-timestamp', '-id')[:limit]
+    )
+    for row in rows:
+        yield (row.timestamp, RANK['prescription'], row.id), PrescriptionUploadSerializer(row).data
+
+
+def _medical_notes(model, doctor, patient_id, cursor, limit):
+    condition = Q()
+    if cursor is not None:
+        condition = _before('medical_note', cursor, Q(created_at__lt=cursor[0]), Q(created_at=cursor[0]))
+    rows = (
+        model.objects.filter(condition, appointment__doctor=doctor, appointment__patient_id=patient_id)
+        .order_by('-created_at', '-id')[:limit]
+    )
+    for row in rows:
+        yield (row.created_at, RANK['medical_note'], row.id), {
+            'id': row.id,
+            'appointment_id': row.appointment_id,
+            'notes': row.notes,
+            'created_at': row.created_at,
+        }
+
+
+def dated_entries(history):
+    """``(section, position, date, entry)`` for every dated entry in the list sections of ``history``."""
+    for section in HISTORY_SECTIONS.values():
+        for position, entry in enumerate(getattr(history, section) or []):
+            try:
+                day = parse_date(str(entry.get('date', ''))) if isinstance(entry, dict) else None
+            except ValueError:
+                day = None
+            if day is not None:
+                yield section, position, day, entry
+
+
+def index_histories(histories):
+    """Rebuild the ``PatientHistoryEntry`` rows the timeline reads for ``histories``."""
+    PatientHistoryEntry.objects.filter(history__in=[history.id for history in histories]).delete()
+    PatientHistoryEntry.objects.bulk_create([
+        PatientHistoryEntry(history=history, section=section, position=position, date=day, data=entry)
+        for history in histories
+        for section, position, day, entry in dated_entries(history)
+    ], batch_size=1000)
+
+
+def _history_entries(source, patient_id, cursor, limit):
+    section = HISTORY_SECTIONS[source]
+    condition = Q()
+    if cursor is not None:
+        local = timezone.localtime(cursor[0])
+        if local.time() == time.min:
+            condition = _before(source, cursor, Q(date__lt=local.date()), Q(date=local.date()), 'position')
+        else:
+            # Entries are stamped at midnight, so the whole day sorts before a later cursor.
+            condition = Q(date__lte=local.date())
+    rows = (
+        PatientHistoryEntry.objects.filter(condition, history__patient_id=patient_id, section=section)
+        .order_by('-date', '-position')[:limit]
+    )
+    for row in rows:
+        yield (_aware(row.date), RANK[source], row.position), {'section': section, **row.data}
+
+
+def patient_timeline(doctor, patient_id, cursor=None, limit=20):
+    """
+    One page of a patient's appointments, prescriptions, medical notes and
+    history entries, newest first. Each source is read with an indexed query
+    capped at ``limit + 1`` rows and the results are merged.
+    """
+    cursor = decode_cursor(cursor) if cursor else None
+    fetch = limit + 1
+    merged = heapq.merge(
+        _appointments(Appointment, doctor, patient_id, cursor, fetch),
+        _appointments(ArchivedAppointment, doctor, patient_id, cursor, fetch),
+        _prescriptions(PrescriptionUpload, doctor, patient_id, cursor, fetch),
+        _prescriptions(ArchivedPrescription, doctor, patient_id, cursor, fetch),
+        _medical_notes(MedicalNote, doctor, patient_id, cursor, fetch),
+        _medical_notes(ArchivedMedicalNote, doctor, patient_id, cursor, fetch),
+        *(_history_entries(source, patient_id, cursor, fetch) for source in HISTORY_SECTIONS),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+    results = []
+    last_key = None
+    next_cursor = None
+    for key, data in merged:
+        if len(results) == limit:
+            next_cursor = encode_cursor(last_key)
+            break
+        last_key = key
+        results.append({
+            'type': SOURCES[key[1]],
+            'timestamp': key[0],
+            'data': data,
+        })
+    return {'results': results, 'next_cursor': next_cursor}
@@ -0,0 +1,146 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+
+READ_BLOCK = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400, offset=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+def part_path(session):
+    return os.path.join(str(settings.UPLOAD_SESSION_DIR), f'{session.id}.part')
+
+
+def start(session):
+    """Create the empty temporary file chunks of ``session`` are written into."""
+    os.makedirs(str(settings.UPLOAD_SESSION_DIR), exist_ok=True)
+    with open(part_path(session), 'wb'):
+        pass
+
+
+def write_chunk(session, offset, length, stream, checksum=None):
+    """
+    Write ``length`` bytes read from ``stream`` at ``offset`` of the upload
+    and return the new offset. If the body is short or fails ``checksum``
+    (hex SHA-256 of the chunk), the offset is left where it was.
+    """
+    if session.status != 'open':
+        raise UploadError('Upload is already complete.', status_code=409, offset=session.offset)
+    if offset != session.offset:
+        raise UploadError('Upload-Offset does not match the current offset.', status_code=409, offset=session.offset)
+    if length <= 0 or length > settings.UPLOAD_CHUNK_MAX_BYTES:
+        raise UploadError(f'Chunks must be between 1 and {settings.UPLOAD_CHUNK_MAX_BYTES} bytes.')
+    if offset + length > session.size:
+        raise UploadError('Chunk runs past the declared upload size.', offset=session.offset)
+
+    end = offset + length
+    claimed = UploadSession.objects.filter(id=session.id, status='open', offset=offset).update(
+        offset=end, updated_at=timezone.now(),
+    )
+    if not claimed:
+        session.refresh_from_db(fields=['offset'])
+        raise UploadError('Upload-Offset does not match the current offset.', status_code=409, offset=session.offset)
+
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        with open(part_path(session), 'r+b') as handle:
+            handle.seek(offset)
+            while received < length:
+                block = stream.read(min(READ_BLOCK, length - received))
+                if not block:
+                    break
+                handle.write(block)
+                digest.update(block)
+                received += len(block)
+        if received != length:
+            raise UploadError('Chunk body is shorter than its Content-Length.')
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise UploadError('Chunk checksum mismatch.')
+    except Exception as exc:
+        UploadSession.objects.filter(id=session.id, offset=end).update(offset=offset, updated_at=timezone.now())
+        if isinstance(exc, UploadError):
+            exc.offset = offset
+            raise
+        raise UploadError('Chunk could not be stored.', status_code=500, offset=offset) from exc
+    session.offset = end
+    return end
+
+
+def complete(session):
+    """Verify the assembled file against the declared size and SHA-256 and mark the upload complete."""
+    if session.status != 'open':
+        raise UploadError('Upload is already complete.', status_code=409, offset=session.offset)
+    if session.offset != session.size or os.path.getsize(part_path(session)) != session.size:
+        raise UploadError('Upload is not finished.', status_code=409, offset=session.offset)
+    digest = hashlib.sha256()
+    with open(part_path(session), 'rb') as handle:
+        for block in iter(lambda: handle.read(READ_BLOCK), b''):
+            digest.update(block)
+    if digest.hexdigest() != session.sha256:
+        raise UploadError('Upload checksum mismatch; start a new upload.', status_code=422, offset=session.offset)
+    session.status = 'complete'
+    session.save(update_fields=['status', 'updated_at'])
+    return session
+
+
+def attach(data, field, upload_id, user):
+    """
+    Put the completed upload ``upload_id`` into ``data[field]`` as a file the
+    serializers accept like a multipart upload. Sessions created by a
+    signed-in user can only be attached by that user. Returns the session;
+    pass it to ``consume`` once the owning row is saved.
+    """
+    user_id = user.pk if user and user.is_authenticated else None
+    session = UploadSession.objects.filter(id=upload_id, status='complete').first()
+    if session is None or (session.user_id is not None and session.user_id != user_id):
+        raise UploadError(f'{field}: unknown or unfinished upload.')
+    # UploadedFile strips any directories from the name, exactly as for a multipart upload.
+    data[field] = UploadedFile(open(part_path(session), 'rb'), name=session.filename, size=session.size)
+    return session
+
+
+def consume(sessions):
+    """Mark attached uploads used and remove their temporary files after commit."""
+    sessions = [session for session in sessions if session is not None]
+    for session in sessions:
+        UploadSession.objects.filter(id=session.id).update(status='consumed', updated_at=timezone.now())
+    transaction.on_commit(lambda: [_remove(session) for session in sessions])
+
+
+def release(data):
+    """Close the temporary files ``attach`` opened for ``data``."""
+    for value in data.values():
+        if isinstance(value, File) and not value.closed:
+            value.close()
+
+
+def _remove(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def purge(max_age, now=None):
+    """Delete sessions idle for longer than ``max_age`` and consumed ones, with their temporary files."""
+    now = now or timezone.now()
+    stale = UploadSession.objects.filter(updated_at__lt=now - max_age) | UploadSession.objects.filter(status='consumed')
+    count = 0
+    for session in stale.iterator(chunk_size=500):
+        _remove(session)
+        count += 1
+    stale.delete()
+    return count
@@ -1,9 +1,13 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DoctorOnboardingView, DoctorAdminView, DoctorProfileView,
     DoctorPublicPreviewView, AppointmentViewSet, ConsentViewSet,
-    PatientHistoryView, PrescriptionUploadView, PrescriptionViewSet
+    PatientHistoryView, PrescriptionUploadView, PrescriptionViewSet,
+    MetricsView, AuditPatientView, AuditPatientLogView, AuditTopViewersView, DoctorExportView,
+    PatientTimelineView, MedicalNoteSearchView, DoctorDocumentView,
+    UploadSessionView, UploadSessionDetailView, UploadSessionCompleteView,
+    SyncView, event_stream_view, BatchView, DoctorStatsView
 )
 
 router = DefaultRouter()
@@ -15,10 +19,27 @@ urlpatterns = [
     path('onboard/', DoctorOnboardingView.as_view(), name='doctor-onboarding'),
     path('admin/<int:pk>/', DoctorAdminView.as_view(), name='doctor-admin'),
     path('admin/', DoctorAdminView.as_view(), name='doctor-admin-list'),
+    re_path(r'^documents/(?P<pk>\d+)/(?P<document>govt_id|medical_certificate)/$',
+            DoctorDocumentView.as_view(), name='doctor-document'),
     path('profile/', DoctorProfileView.as_view(), name='doctor-profile'),
     path('public/<int:pk>/', DoctorPublicPreviewView.as_view(), name='doctor-public-preview'),
     path('public/', DoctorPublicPreviewView.as_view(), name='doctor-public-preview-list'),
     path('history/<uuid:patient_id>/', PatientHistoryView.as_view(), name='patient-history'),
+    path('history/<uuid:patient_id>/timeline/', PatientTimelineView.as_view(), name='patient-timeline'),
+    path('notes/search/', MedicalNoteSearchView.as_view(), name='medical-note-search'),
+    path('uploads/', UploadSessionView.as_view(), name='upload-session-list'),
+    path('uploads/<uuid:pk>/', UploadSessionDetailView.as_view(), name='upload-session'),
+    path('uploads/<uuid:pk>/complete/', UploadSessionCompleteView.as_view(), name='upload-session-complete'),
     path('prescriptions/upload/', PrescriptionUploadView.as_view(), name='prescription-upload'),
+    re_path(r'^export/(?P<resource>appointments|consents|prescriptions)\.(?P<fmt>ndjson|csv)$',
+            DoctorExportView.as_view(), name='doctor-export'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('events/', event_stream_view, name='event-stream'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('stats/', DoctorStatsView.as_view(), name='doctor-stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('audit/patients/<uuid:patient_id>/', AuditPatientView.as_view(), name='audit-patient'),
+    path('audit/patients/<uuid:patient_id>/logs/', AuditPatientLogView.as_view(), name='audit-patient-logs'),
+    path('audit/viewers/', AuditTopViewersView.as_view(), name='audit-top-viewers'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,37 +1,91 @@
 from rest_framework.views import APIView
 from rest_framework.viewsets import ViewSet
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.throttling import ScopedRateThrottle
 from .serializers import (
     DoctorOnboardingSerializer, DoctorAdminSerializer,
     DoctorProfileSerializer, DoctorPublicPreviewSerializer,
     AppointmentSerializer, ConsentSerializer, PatientHistorySerializer,
-    PrescriptionUploadSerializer
+    PrescriptionUploadSerializer, MedicalNoteSerializer, UploadSessionSerializer,
+    BulkConsentSerializer
+)
+from .models import (
+    Doctor, DoctorProfile, Appointment, ArchivedAppointment, ArchivedPrescription, Consent, PatientHistory,
+    PrescriptionUpload, UploadSession,
 )
-from .models import Doctor, DoctorProfile, Appointment, Consent, PatientHistory, AccessLog, PrescriptionUpload
 from .notifications import send_notification
 from .permissions import IsDoctor
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
+from django.conf import settings
 from django.utils import timezone
 import uuid
 import os
-from django.core.files.storage import default_storage
-
-class DoctorOnboardingView(APIView):
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from django.utils.dateparse import parse_date
+from .audit import ArchiveIntegrityError, patient_entries, patient_report, record_access, top_viewers
+from .consents import request_consents
+from .authentication import DoctorJWTAuthentication, revoke_tokens
+from .events import event_stream
+from .exports import CONTENT_TYPES, export_stream
+from .idempotency import IdempotencyMixin
+from .metrics import get_registry, render_prometheus
+from .normalization import with_served_names
+from .pagination import MedicalNotePagination
+from .search import search_notes
+from .storage import download_url
+from .sync import ResyncRequired, changes_since, current_token
+from . import archive, batch, stats, uploads
+from .streaming import streaming_response
+from .timeline import patient_timeline
+
+def sparse_fieldset(serializer_class, request, *querysets):
+    """
+    Narrow each of ``querysets`` to the columns the fields picked by
+    ``?fields=`` and ``?include=`` read. Returns the ``fields`` to pass to
+    the serializer (``None`` for all) followed by the querysets; raises
+    ``ValueError`` for unknown names.
+    """
+    fields, columns, related = serializer_class.fieldset(request.query_params)
+    narrowed = []
+    for queryset in querysets:
+        if related:
+            queryset = queryset.select_related(*related)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        narrowed.append(queryset)
+    return fields, *narrowed
+
+class DoctorOnboardingView(IdempotencyMixin, APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        serializer = DoctorOnboardingSerializer(data=request.data)
-        if serializer.is_valid():
-            doctor = serializer.save()
-            return Response({
-                'message': 'Doctor onboarding submitted successfully.',
-                'doctor_id': doctor.id,
-                'status': 'pending'
-            }, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = dict(request.data.items())
+        sessions = []
+        try:
+            for field in ('govt_id', 'medical_certificate'):
+                upload_id = data.pop(f'{field}_upload_id', None)
+                if upload_id:
+                    sessions.append(uploads.attach(data, field, upload_id, request.user))
+            serializer = DoctorOnboardingSerializer(data=data)
+            if serializer.is_valid():
+                doctor = serializer.save()
+                uploads.consume(sessions)
+                return Response({
+                    'message': 'Doctor onboarding submitted successfully.',
+                    'doctor_id': doctor.id,
+                    'status': 'pending'
+                }, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except uploads.UploadError as exc:
+            return Response({'error': str(exc)}, status=exc.status_code)
+        finally:
+            uploads.release(data)
 
 class DoctorAdminView(APIView):
     permission_classes = [IsAdminUser]
@@ -52,6 +106,7 @@ class DoctorAdminView(APIView):
         serializer = DoctorAdminSerializer(doctor, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            revoke_tokens(doctor.user_id)
             send_notification(doctor, serializer.data['status'])
             return Response({
                 'message': f'Doctor {doctor.name} status updated to {serializer.data["status"]}.'
@@ -86,10 +141,14 @@ class DoctorPublicPreviewView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, pk=None):
+        try:
+            fields, queryset = sparse_fieldset(DoctorPublicPreviewSerializer, request, Doctor.objects.all())
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         if pk:
             try:
-                doctor = Doctor.objects.get(pk=pk)
-                serializer = DoctorPublicPreviewSerializer(doctor)
+                doctor = queryset.get(pk=pk)
+                serializer = DoctorPublicPreviewSerializer(doctor, fields=fields)
                 data = serializer.data
                 if not data:
                     return Response({
@@ -101,12 +160,31 @@ class DoctorPublicPreviewView(APIView):
                     'error': 'Doctor not found.'
                 }, status=status.HTTP_404_NOT_FOUND)
         else:
-            doctors = Doctor.objects.all()
-            serializer = DoctorPublicPreviewSerializer(doctors, many=True)
-            data = [item for item in serializer.data if item]
-            return Response(data, status=status.HTTP_200_OK)
+            serializer = DoctorPublicPreviewSerializer(queryset.filter(status='approved'), many=True, fields=fields)
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
-class AppointmentViewSet(ViewSet):
+def appointment_dates(request):
+    """
+    The ``date`` or ``start``/``end`` (YYYY-MM-DD) range of an appointment
+    listing; ``(None, None)`` when the listing is not limited by date.
+    """
+    params = request.query_params
+    if params.get('date'):
+        day = parse_date(params['date'])
+        if day is None:
+            raise ValueError('Dates must be in YYYY-MM-DD format.')
+        return day, day
+    bounds = []
+    for name in ('start', 'end'):
+        value = parse_date(params[name]) if params.get(name) else None
+        if params.get(name) and value is None:
+            raise ValueError('Dates must be in YYYY-MM-DD format.')
+        bounds.append(value)
+    if bounds[0] and bounds[1] and bounds[0] > bounds[1]:
+        raise ValueError('Start date must not be after end date.')
+    return tuple(bounds)
+
+class AppointmentViewSet(IdempotencyMixin, ViewSet):
     permission_classes = [IsDoctor]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['date', 'time', 'status']
@@ -119,11 +197,20 @@ class AppointmentViewSet(ViewSet):
             return Response({
                 'error': 'Only approved doctors can view appointments.'
             }, status=status.HTTP_403_FORBIDDEN)
-        queryset = Appointment.objects.filter(doctor=doctor)
+        filters = {'doctor': doctor}
         specialty = request.query_params.get('specialty')
         if specialty:
-            queryset = queryset.filter(doctor__specialty=specialty)
-        serializer = AppointmentSerializer(queryset, many=True)
+            filters['doctor__specialty'] = specialty
+        try:
+            fields, columns, _ = AppointmentSerializer.fieldset(request.query_params)
+            start, end = appointment_dates(request)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = archive.appointments(
+            start, end, hot_days=settings.APPOINTMENT_HOT_DAYS,
+            columns=columns if fields else None, **filters,
+        )
+        serializer = AppointmentSerializer(rows, many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request):
@@ -180,7 +267,45 @@ class AppointmentViewSet(ViewSet):
             'error': 'Only status update to no-show is allowed.'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-class ConsentViewSet(ViewSet):
+    @action(detail=True, methods=['get', 'post'], url_path='notes', url_name='notes')
+    def notes(self, request, pk=None):
+        doctor = request.user.doctor
+        if doctor.status != 'approved':
+            return Response({
+                'error': 'Only approved doctors can manage medical notes.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        try:
+            appointment = archive.get(
+                Appointment.objects.only('id'), ArchivedAppointment.objects.only('id'), pk=pk, doctor=doctor,
+            )
+        except ArchivedAppointment.DoesNotExist:
+            return Response({
+                'error': 'Appointment not found or not associated with this doctor.'
+            }, status=status.HTTP_404_NOT_FOUND)
+        notes = appointment.medical_notes.all()
+
+        # Notes are append-only: there is deliberately no update or delete route.
+        if request.method == 'POST':
+            if isinstance(appointment, ArchivedAppointment):
+                return Response({
+                    'error': 'Archived appointments are read-only.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            serializer = MedicalNoteSerializer(data=request.data)
+            if serializer.is_valid():
+                serializer.save(appointment=appointment)
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            fields, queryset = sparse_fieldset(MedicalNoteSerializer, request, notes)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = MedicalNotePagination()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = MedicalNoteSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+class ConsentViewSet(IdempotencyMixin, ViewSet):
     permission_classes = [IsAuthenticated]
 
     def create(self, request):
@@ -236,10 +361,35 @@ class ConsentViewSet(ViewSet):
                 'error': 'User is not a doctor.'
             }, status=status.HTTP_403_FORBIDDEN)
 
-        consents = Consent.objects.filter(doctor=doctor)
-        serializer = ConsentSerializer(consents, many=True)
+        try:
+            fields, consents = sparse_fieldset(ConsentSerializer, request, Consent.objects.filter(doctor=doctor))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ConsentSerializer(consents, many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    def bulk(self, request):
+        try:
+            doctor = request.user.doctor
+            if doctor.status != 'approved':
+                return Response({
+                    'error': 'Only approved doctors can request consent.'
+                }, status=status.HTTP_403_FORBIDDEN)
+        except Doctor.DoesNotExist:
+            return Response({
+                'error': 'User is not a doctor.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = BulkConsentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        created, existing = request_consents(doctor, serializer.validated_data['patient_ids'])
+        return Response({
+            'created': ConsentSerializer(created, many=True).data,
+            'existing': ConsentSerializer(existing, many=True).data,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
 class PatientHistoryView(APIView):
     permission_classes = [IsDoctor]
 
@@ -263,22 +413,47 @@ class PatientHistoryView(APIView):
             }, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            history = PatientHistory.objects.get(patient_id=patient_id)
+            fields, queryset = sparse_fieldset(PatientHistorySerializer, request, PatientHistory.objects.all())
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            history = queryset.get(patient_id=patient_id)
         except PatientHistory.DoesNotExist:
             return Response({
                 'error': 'Patient history not found.'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        AccessLog.objects.create(
-            user=request.user,
-            patient_id=patient_id,
-            action='viewed'
-        )
+        record_access(request.user, patient_id, action='viewed')
 
-        serializer = PatientHistorySerializer(history)
+        serializer = PatientHistorySerializer(history, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-class PrescriptionUploadView(APIView):
+class PatientTimelineView(APIView):
+    permission_classes = [IsDoctor]
+
+    def get(self, request, patient_id):
+        doctor = request.user.doctor
+        if doctor.status != 'approved':
+            return Response({
+                'error': 'Only approved doctors can view patient history.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        if not Consent.objects.filter(doctor=doctor, patient_id=patient_id, status='granted').exists():
+            return Response({
+                'error': 'No granted consent found for this patient.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            page = patient_timeline(doctor, patient_id, request.query_params.get('cursor'), limit)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        record_access(request.user, patient_id, action='viewed')
+        return Response(page, status=status.HTTP_200_OK)
+
+class PrescriptionUploadView(IdempotencyMixin, APIView):
     permission_classes = [IsDoctor]
 
     def post(self, request):
@@ -293,27 +468,127 @@ class PrescriptionUploadView(APIView):
                 'error': 'User is not a doctor.'
             }, status=status.HTTP_403_FORBIDDEN)
 
-        data = request.data.copy()
+        # A shallow copy: deep-copying would try to pickle uploads spooled to temporary files.
+        data = dict(request.data.items())
         data['doctor_id'] = doctor.id
 
-        # Generate unique filename
-        file = request.FILES.get('file')
-        if file:
-            ext = os.path.splitext(file.name)[1]
-            unique_filename = f"{uuid.uuid4()}{ext}"
-            data['file'] = file
-            data['file'].name = f"prescriptions/{doctor.id}/{unique_filename}"
+        session = None
+        upload_id = data.pop('upload_id', None)
+        try:
+            if upload_id:
+                session = uploads.attach(data, 'file', upload_id, request.user)
+
+            # Generate unique filename
+            file = data.get('file')
+            if file:
+                ext = os.path.splitext(file.name)[1]
+                unique_filename = f"{uuid.uuid4()}{ext}"
+                data['file'].name = f"prescriptions/{doctor.id}/{unique_filename}"
+
+            serializer = PrescriptionUploadSerializer(data=data, context={'request': request})
+            if serializer.is_valid():
+                serializer.save(doctor=doctor)
+                uploads.consume([session])
+                return Response({
+                    'message': 'Prescription uploaded successfully.',
+                    'prescription_id': serializer.data['id'],
+                    'file_url': serializer.data['file']
+                }, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except uploads.UploadError as exc:
+            return Response({'error': str(exc)}, status=exc.status_code)
+        finally:
+            uploads.release(data)
+
+class UploadSessionThrottle(ScopedRateThrottle):
+    def get_rate(self):
+        return settings.UPLOAD_SESSION_RATE
+
+class UploadSessionView(IdempotencyMixin, APIView):
+    permission_classes = [AllowAny]
+    throttle_classes = [UploadSessionThrottle]
+    throttle_scope = 'uploads'
 
-        serializer = PrescriptionUploadSerializer(data=data)
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            return Response({
-                'message': 'Prescription uploaded successfully.',
-                'prescription_id': serializer.data['id'],
-                'file_url': serializer.data['file']
-            }, status=status.HTTP_201_CREATED)
+            user = request.user if request.user.is_authenticated else None
+            if user is None and UploadSession.objects.filter(
+                    user__isnull=True, status='open').count() >= settings.UPLOAD_ANONYMOUS_OPEN_MAX:
+                return Response({
+                    'error': 'Too many uploads in progress; try again later.'
+                }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            session = serializer.save(user=user)
+            uploads.start(session)
+            data = dict(serializer.data, chunk_size=settings.UPLOAD_CHUNK_MAX_BYTES)
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class UploadSessionDetailView(APIView):
+    """
+    One resumable upload. GET reports the offset to resume from; PUT writes
+    the request body at the ``Upload-Offset`` header, optionally checked
+    against an ``Upload-Checksum`` header (hex SHA-256 of the chunk); DELETE
+    abandons the upload.
+    """
+    permission_classes = [AllowAny]
+
+    def get_session(self, request, pk):
+        session = UploadSession.objects.filter(pk=pk).first()
+        user_id = request.user.pk if request.user.is_authenticated else None
+        if session is None or (session.user_id is not None and session.user_id != user_id):
+            return None
+        return session
+
+    def respond(self, session, status_code=status.HTTP_200_OK):
+        response = Response(UploadSessionSerializer(session).data, status=status_code)
+        response['Upload-Offset'] = str(session.offset)
+        return response
+
+    def get(self, request, pk):
+        session = self.get_session(request, pk)
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return self.respond(session)
+
+    def put(self, request, pk):
+        session = self.get_session(request, pk)
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'Upload-Offset and Content-Length headers are required.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read the raw body from the Django request so no parser buffers the chunk.
+            uploads.write_chunk(session, offset, length, request._request, request.headers.get('Upload-Checksum'))
+        except uploads.UploadError as exc:
+            response = Response({'error': str(exc), 'offset': exc.offset}, status=exc.status_code)
+            response['Upload-Offset'] = str(exc.offset)
+            return response
+        return self.respond(session)
+
+    def delete(self, request, pk):
+        session = self.get_session(request, pk)
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        uploads.consume([session])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadSessionCompleteView(UploadSessionDetailView):
+    def post(self, request, pk):
+        session = self.get_session(request, pk)
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            uploads.complete(session)
+        except uploads.UploadError as exc:
+            return Response({'error': str(exc), 'offset': exc.offset}, status=exc.status_code)
+        return self.respond(session)
+
 class PrescriptionViewSet(ViewSet):
     permission_classes = [IsDoctor]
 
@@ -330,13 +605,20 @@ class PrescriptionViewSet(ViewSet):
             }, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            prescription = PrescriptionUpload.objects.get(pk=pk, doctor=doctor)
-        except PrescriptionUpload.DoesNotExist:
+            fields, queryset, archived = sparse_fieldset(
+                PrescriptionUploadSerializer, request, PrescriptionUpload.objects.all(), ArchivedPrescription.objects.all(),
+            )
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            prescription = archive.get(queryset, archived, pk=pk, doctor=doctor)
+        except ArchivedPrescription.DoesNotExist:
             return Response({
                 'error': 'Prescription not found or not associated with this doctor.'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = PrescriptionUploadSerializer(prescription)
+        serializer = PrescriptionUploadSerializer(prescription, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, pk=None):
@@ -358,11 +640,294 @@ class PrescriptionViewSet(ViewSet):
                 'error': 'Prescription not found or not associated with this doctor.'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Delete the file from storage
-        if default_storage.exists(prescription.file.path):
-            default_storage.delete(prescription.file.path)
-
+        # The file is queued for deletion by the post_delete signal and removed by reconcile_media.
         prescription.delete()
         return Response({
             'message': 'Prescription deleted successfully.'
-        }, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        }, status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['get'], url_path='download', url_name='download')
+    def download(self, request, pk=None):
+        doctor = request.user.doctor
+        if doctor.status != 'approved':
+            return Response({
+                'error': 'Only approved doctors can download prescriptions.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        try:
+            prescription = archive.get(
+                with_served_names(PrescriptionUpload.objects.only('file'), 'file'),
+                with_served_names(ArchivedPrescription.objects.only('file'), 'file'),
+                pk=pk, doctor=doctor,
+            )
+        except ArchivedPrescription.DoesNotExist:
+            return Response({
+                'error': 'Prescription not found or not associated with this doctor.'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponseRedirect(download_url(prescription.file))
+
+class DoctorDocumentView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, document):
+        if not request.user.is_staff:
+            try:
+                if request.user.doctor.id != int(pk):
+                    raise Doctor.DoesNotExist
+            except Doctor.DoesNotExist:
+                return Response({
+                    'error': 'Only admins and the doctor themselves can download these documents.'
+                }, status=status.HTTP_403_FORBIDDEN)
+        try:
+            doctor = with_served_names(Doctor.objects.only(document), document).get(pk=pk)
+        except Doctor.DoesNotExist:
+            return Response({
+                'error': 'Doctor not found.'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponseRedirect(download_url(getattr(doctor, document)))
+
+class DoctorExportView(APIView):
+    permission_classes = [IsDoctor]
+
+    def get(self, request, resource, fmt):
+        doctor = request.user.doctor
+        if doctor.status != 'approved':
+            return Response({
+                'error': 'Only approved doctors can export records.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        after = request.query_params.get('after')
+        if after is not None:
+            try:
+                after = int(after)
+            except ValueError:
+                return Response({
+                    'error': 'The after cursor must be an integer id.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        response = streaming_response(
+            request, export_stream(resource, fmt, doctor, after), content_type=CONTENT_TYPES[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{resource}.{fmt}"'
+        return response
+
+class MedicalNoteSearchView(APIView):
+    permission_classes = [IsDoctor]
+
+    def get(self, request):
+        doctor = request.user.doctor
+        if doctor.status != 'approved':
+            return Response({
+                'error': 'Only approved doctors can search medical notes.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({
+                'error': 'A search query (q) is required.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({
+                'error': 'Limit must be an integer.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [
+            {**MedicalNoteSerializer(note).data, 'snippet': snippet}
+            for note, snippet in search_notes(doctor, query, limit)
+        ]
+        return Response({'query': query, 'results': results}, status=status.HTTP_200_OK)
+
+class SyncView(APIView):
+    """
+    Delta sync for offline clients. Without ``since`` it returns a token to
+    keep before downloading the full lists; with it, the appointments,
+    consents and prescriptions changed since that token and the next token.
+    Follow ``has_more`` until it is false.
+    """
+    permission_classes = [IsDoctor]
+
+    def get(self, request):
+        doctor = request.user.doctor
+        if doctor.status != 'approved':
+            return Response({
+                'error': 'Only approved doctors can sync records.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'token': current_token()}, status=status.HTTP_200_OK)
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'error': 'The since token is invalid.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(changes_since(doctor, since), status=status.HTTP_200_OK)
+        except ResyncRequired as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_410_GONE)
+
+class BatchView(APIView):
+    """
+    Run several API calls in one round trip. The batch is authenticated and
+    the doctor checked once; every sub-request reuses that principal.
+    """
+    permission_classes = [IsDoctor]
+
+    def post(self, request):
+        try:
+            items = batch.parse(request.data)
+        except batch.BatchError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'responses': batch.run(request, items, request.user)}, status=status.HTTP_200_OK)
+
+def _stream_doctor(request):
+    """The approved doctor a bearer token on ``request`` belongs to, or an error response."""
+    try:
+        authenticated = DoctorJWTAuthentication().authenticate(request)
+    except AuthenticationFailed as exc:
+        return None, JsonResponse({'error': str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if authenticated is None:
+        return None, JsonResponse({
+            'error': 'Authentication credentials were not provided.'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        doctor = authenticated[0].doctor
+    except Doctor.DoesNotExist:
+        doctor = None
+    if doctor is None or doctor.status != 'approved':
+        return None, JsonResponse({
+            'error': 'Only approved doctors can subscribe to events.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    return doctor, None
+
+async def event_stream_view(request):
+    """
+    Server-sent events pushing the authenticated doctor's appointment and
+    consent changes, replacing dashboard polling. Needs the ASGI server;
+    under WSGI the stream would hold a worker thread.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    doctor, error = await sync_to_async(_stream_doctor)(request)
+    if error is not None:
+        return error
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return JsonResponse({
+                'error': 'Last-Event-ID is invalid.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(event_stream(doctor.id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(get_registry().collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+def audit_period(request, default=None):
+    """Parse ``start``/``end`` (YYYY-MM-DD) query params; defaults to ``default`` or the current quarter."""
+    today = timezone.localdate()
+    start, end = default or (today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1), today)
+    period = {'start': start, 'end': end}
+    for name in period:
+        if request.query_params.get(name):
+            period[name] = parse_date(request.query_params[name])
+            if period[name] is None:
+                raise ValueError('Dates must be in YYYY-MM-DD format.')
+    if period['start'] > period['end']:
+        raise ValueError('Start date must not be after end date.')
+    return period['start'], period['end']
+
+class AuditPatientView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, patient_id):
+        try:
+            start, end = audit_period(request)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(patient_report(patient_id, start, end), status=status.HTTP_200_OK)
+
+class AuditPatientLogView(APIView):
+    """Each access to a patient's history in the period, archived months included."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, patient_id):
+        try:
+            start, end = audit_period(request)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            entries = patient_entries(patient_id, start, end)
+        except ArchiveIntegrityError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({
+            'patient_id': patient_id,
+            'start': start,
+            'end': end,
+            'entries': entries,
+        }, status=status.HTTP_200_OK)
+
+class AuditTopViewersView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            start, end = audit_period(request)
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'start': start,
+            'end': end,
+            'viewers': top_viewers(start, end, limit=limit),
+        }, status=status.HTTP_200_OK)
+
+class DoctorStatsView(APIView):
+    """
+    Appointment and prescription statistics for the requesting doctor, or
+    for ``?doctor=<id>`` when called by staff, read from the incrementally
+    maintained stats tables.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.is_staff and request.query_params.get('doctor'):
+            try:
+                doctor_id = int(request.query_params['doctor'])
+            except ValueError:
+                return Response({'error': 'Doctor must be an id.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            try:
+                doctor = request.user.doctor
+            except Doctor.DoesNotExist:
+                return Response({
+                    'error': 'User is not a doctor.'
+                }, status=status.HTTP_403_FORBIDDEN)
+            if doctor.status != 'approved':
+                return Response({
+                    'error': 'Only approved doctors can view statistics.'
+                }, status=status.HTTP_403_FORBIDDEN)
+            doctor_id = doctor.id
+        try:
+            start, end = audit_period(request, default=stats.default_range())
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= settings.DOCTOR_STATS_MAX_DAYS:
+            return Response({
+                'error': f'Date range must be at most {settings.DOCTOR_STATS_MAX_DAYS} days.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats.doctor_stats(doctor_id, start, end), status=status.HTTP_200_OK)
@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+from doctor.metrics import clear_directory
+
+# Workers are separate processes, so without a shared directory a scrape only sees the worker that served it.
+os.environ.setdefault('METRICS_MULTIPROCESS_DIR', os.path.join(tempfile.gettempdir(), 'livesure-metrics'))
+
+
+def on_starting(server):
+    # Counters restart with the server; files from the previous run would otherwise be summed in forever.
+    clear_directory(os.environ['METRICS_MULTIPROCESS_DIR'])